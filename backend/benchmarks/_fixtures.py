@@ -0,0 +1,49 @@
+"""Shared helpers for benchmarks: in-memory database and synthetic quotes."""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import main  # noqa: F401  (registers every model on Base.metadata)
+from src.models.db import Base
+from src.models_quote import Quote, QuoteDay, QuoteLine
+
+LINES_PER_DAY = 10
+
+
+def make_session():
+    """Fresh in-memory SQLite session with all tables created."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def make_quote(db, n_lines: int, title: str = None) -> int:
+    """Insert a quote with n_lines lines spread over days of LINES_PER_DAY lines."""
+    n_days = max(1, (n_lines + LINES_PER_DAY - 1) // LINES_PER_DAY)
+    q = Quote(title=title or f"Bench {n_lines} lines", pax=4, start_date=date(2026, 5, 1),
+              end_date=date(2026, 5, 1) + timedelta(days=n_days - 1), fx_rate=Decimal("1.08"))
+    db.add(q)
+    remaining = n_lines
+    for d_idx in range(n_days):
+        day = QuoteDay(position=d_idx, date=date(2026, 5, 1) + timedelta(days=d_idx),
+                       destination=f"City {d_idx // 3}", decorative_images=[])
+        q.days.append(day)
+        for l_idx in range(min(LINES_PER_DAY, remaining)):
+            day.lines.append(QuoteLine(
+                position=l_idx, category="Activity", title=f"Service {d_idx}-{l_idx}",
+                supplier_name="Supplier", visibility="client",
+                achat_eur=Decimal("120.50"), achat_usd=Decimal("130.14"), vente_usd=Decimal("15.00"),
+                fx_rate=Decimal("0.925926"), currency="EUR",
+                raw_json={"description": "<p>Guided visit with <b>skip-the-line</b> tickets.</p>",
+                          "start_time": "09:00", "buff_pct": None},
+            ))
+        remaining -= LINES_PER_DAY
+    db.commit()
+    return q.id
@@ -0,0 +1,44 @@
+"""
+Consolidated workbook (Summary + one sheet per quote) for 50/200/400 quotes
+of 30 lines.
+
+Quotes are loaded in bulk by chunks of EXPORT_CONSOLIDATED_CHUNK and released
+once their sheets are written, and each write-only sheet is closed as soon as
+it is complete: time per quote should stay flat, and peak memory grow only
+by the worksheet object openpyxl keeps per sheet until the save (~12 KB),
+not by the quotes' ORM graphs or rows.
+
+Usage (from backend/): python -m benchmarks.bench_excel_consolidated
+"""
+import tempfile
+import time
+import tracemalloc
+
+from src.exports.excel import build_xlsx_for_quotes
+
+from ._fixtures import make_session, make_quote
+
+SIZES = (50, 200, 400)
+LINES = 30
+
+
+def main():
+    db = make_session()
+    ids = []
+    print(f"{'quotes':>6} {'export (s)':>11} {'ms/quote':>9} {'peak (MB)':>10}")
+    for n_quotes in SIZES:
+        while len(ids) < n_quotes:
+            ids.append(make_quote(db, LINES))
+        db.expunge_all()
+        with tempfile.TemporaryFile() as out:  # the workbook itself is not counted
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            build_xlsx_for_quotes(db, ids, out=out)
+            elapsed = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        print(f"{n_quotes:>6} {elapsed:>11.2f} {elapsed * 1000 / n_quotes:>9.1f} {peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Excel export time and memory on 50/800/5000-line quotes.
+
+build_xlsx_for_quote used a regular openpyxl Workbook: every cell of the sheet
+(with its own Font/Border/Alignment assignments) stayed in memory until the
+file was saved, so memory grew with the number of cells. The sheet is now
+written in write-only mode with shared named styles: rows go to the file as
+they are appended, and the memory used to write the sheet (the quote itself
+already loaded) should stay about the same whatever the size.
+
+Usage (from backend/): python -m benchmarks.bench_excel_export
+"""
+import time
+import tracemalloc
+from io import BytesIO
+
+from openpyxl import Workbook
+
+from src.api.quotes import load_quote
+from src.exports.excel.exporter import QuoteSheetStyles, build_xlsx_for_quote, write_quote_sheet
+
+from ._fixtures import make_session, make_quote
+
+SIZES = (50, 800, 5000)
+
+
+def _write_sheet(q) -> None:
+    wb = Workbook(write_only=True)
+    write_quote_sheet(wb.create_sheet("Quote"), q, QuoteSheetStyles(wb))
+    wb.save(BytesIO())
+
+
+def main():
+    db = make_session()
+    print(f"{'lines':>6} {'export (ms)':>12} {'ms/line':>8} {'sheet peak (MB)':>16}")
+    for n_lines in SIZES:
+        quote_id = make_quote(db, n_lines)
+        build_xlsx_for_quote(db, quote_id)  # warm-up
+        runs = max(1, 800 // n_lines)
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            build_xlsx_for_quote(db, quote_id)
+        elapsed = (time.perf_counter() - t0) / runs
+
+        q = load_quote(db, quote_id)
+        tracemalloc.start()
+        _write_sheet(q)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{n_lines:>6} {elapsed * 1000:>12.1f} {elapsed * 1000 / n_lines:>8.2f} {peak / 1e6:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
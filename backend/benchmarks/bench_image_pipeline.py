@@ -0,0 +1,135 @@
+"""
+Export image pipeline: full-resolution decode + LANCZOS (before) versus JPEG
+draft decoding + integer reduce() + LANCZOS (after).
+
+Each photo of the corpus goes through what an export does with it: the hero
+half (cover-crop to 869x531 px, 300 DPI) and the column crop (7.3 x 5.14 cm at
+150 DPI, compressed under MAX_IMAGE_BYTES). Each variant runs in its own
+process so that its peak RSS is measured on its own.
+
+Usage (from backend/):
+    python -m benchmarks.bench_image_pipeline [--corpus DIR_OF_JPEGS]
+
+Without --corpus, a corpus of 12 synthetic 4000x3000 "supplier" JPEGs is
+generated in a temporary directory.
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+from src.exports.word.image_utils import _compress_to_jpeg_bytes, _cover_to_px
+from src.exports.word.settings import COL_H_CM, COL_W_CM, DPI, HERO_DPI, HERO_H_CM, HERO_W_CM, cm_to_px
+
+HERO_HALF = (cm_to_px(HERO_W_CM, HERO_DPI) // 2, cm_to_px(HERO_H_CM, HERO_DPI))
+COLUMN = (cm_to_px(COL_W_CM, DPI), cm_to_px(COL_H_CM, DPI))
+
+
+# --- before: the previous pipeline, kept here for comparison -----------------
+
+def _legacy_cover(buf, tw, th):
+    buf.seek(0)
+    img = Image.open(buf)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    scale = max(tw / img.width, th / img.height)
+    new_w, new_h = int(round(img.width * scale)), int(round(img.height * scale))
+    img = img.resize((new_w, new_h), Image.LANCZOS)
+    left = max(0, (new_w - tw) // 2)
+    top = max(0, (new_h - th) // 2)
+    return img.crop((left, top, left + tw, top + th))
+
+
+def _legacy_compress(img, quality=80, max_bytes=900_000):
+    q = quality
+    out = BytesIO()
+    while True:
+        out.seek(0)
+        out.truncate(0)
+        img.save(out, format="JPEG", quality=q, optimize=True, progressive=True)
+        if out.tell() <= max_bytes or q <= 50:
+            break
+        q -= 5
+    return out
+
+
+VARIANTS = {
+    "before": (_legacy_cover, _legacy_compress),
+    "after": (_cover_to_px, _compress_to_jpeg_bytes),
+}
+
+
+def _make_corpus(directory: Path, n: int = 12) -> None:
+    rnd = random.Random(42)
+    for i in range(n):
+        w, h = (4000, 3000) if i % 3 else (3000, 4000)
+        base = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+        tint = Image.new("RGB", (w, h), (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+        noise = Image.effect_noise((w, h), 40).convert("RGB")
+        img = Image.blend(Image.blend(base, tint, 0.4), noise, 0.2)
+        img.save(directory / f"photo_{i:02d}.jpg", format="JPEG", quality=90)
+
+
+def _run_variant(name: str, corpus: Path) -> dict:
+    cover, compress = VARIANTS[name]
+    files = sorted(p for p in corpus.iterdir() if p.suffix.lower() in (".jpg", ".jpeg"))
+    elapsed = 0.0
+    for path in files:
+        data = path.read_bytes()  # one at a time: the peak RSS is the pipeline's, not the corpus'
+        t0 = time.perf_counter()
+        cover(BytesIO(data), *HERO_HALF)
+        compress(cover(BytesIO(data), *COLUMN))
+        elapsed += time.perf_counter() - t0
+    return {
+        "images": len(files),
+        "ms_per_image": elapsed * 1000 / max(1, len(files)),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM is reset by exec (ru_maxrss is not: it would report the parent's peak)
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", type=Path)
+    parser.add_argument("--variant", choices=sorted(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(_run_variant(args.variant, args.corpus)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = Path(tmp)
+            _make_corpus(corpus)
+        print(f"corpus: {corpus}")
+        for name in ("before", "after"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_image_pipeline", "--variant", name, "--corpus", str(corpus)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{name:>6}: {r['images']} images, {r['ms_per_image']:.0f} ms/image, peak RSS {r['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Compare quote serialization paths on 10/100/1000-line quotes.
+
+- _to_out + model_dump_json: QuoteOut construction/validation, then JSON
+- response_model: what GET /quotes/{id} did before, i.e. _to_out, then FastAPI
+  dumping, re-validating against QuoteOut and rendering with json.dumps
+- _to_json_bytes: ORM rows straight to JSON bytes
+
+Usage (from backend/): python -m benchmarks.bench_quote_serialization
+"""
+import json
+import timeit
+
+from src.api.quotes import load_quote, _to_out, _to_json_bytes
+from src.api.schemas_quote import QuoteOut
+
+from ._fixtures import make_session, make_quote
+
+SIZES = (10, 100, 1000)
+
+
+def _response_model_path(q):
+    out = _to_out(q)
+    validated = QuoteOut.model_validate(out.model_dump())
+    return json.dumps(validated.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    db = make_session()
+    print(f"{'lines':>6} {'response_model (ms)':>20} {'_to_out (ms)':>14} {'fast (ms)':>11} {'speedup':>8}")
+    for n_lines in SIZES:
+        q = load_quote(db, make_quote(db, n_lines))
+        number = max(3, 2000 // n_lines)
+        endpoint = timeit.timeit(lambda: _response_model_path(q), number=number) / number
+        slow = timeit.timeit(lambda: _to_out(q).model_dump_json(), number=number) / number
+        fast = timeit.timeit(lambda: _to_json_bytes(q), number=number) / number
+        print(f"{n_lines:>6} {endpoint * 1000:>20.3f} {slow * 1000:>14.3f} {fast * 1000:>11.3f} "
+              f"{endpoint / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
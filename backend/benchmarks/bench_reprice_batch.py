@@ -0,0 +1,55 @@
+"""
+Batch reprice of many quotes (set-based SQL) versus one reprice per quote.
+
+- per quote: load the graph and recompute (what N calls of the old
+  POST /quotes/{id}/reprice amounted to), then store the totals
+- batch: reprice_quotes(), GROUP BY aggregates and one bulk UPDATE per chunk
+
+Usage (from backend/): python -m benchmarks.bench_reprice_batch
+"""
+import time
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from src.api.quotes import load_quote
+from src.models_quote import Quote
+from src.services.quote_pricing import apply_totals
+from src.services.quote_reprice import reprice_quotes
+
+from ._fixtures import make_session, make_quote
+
+N_QUOTES = 2000
+LINES_PER_QUOTE = 30
+
+
+def _change_margin(db, margin):
+    db.execute(update(Quote).values(margin_pct=Decimal(margin)))
+    db.commit()
+
+
+def main():
+    db = make_session()
+    ids = [make_quote(db, LINES_PER_QUOTE) for _ in range(N_QUOTES)]
+
+    _change_margin(db, "0.18")
+    t0 = time.perf_counter()
+    for quote_id in ids:
+        apply_totals(load_quote(db, quote_id))
+    db.commit()
+    per_quote = time.perf_counter() - t0
+
+    _change_margin(db, "0.19")
+    db.expire_all()
+    t0 = time.perf_counter()
+    for progress in reprice_quotes(db):
+        pass
+    batch = time.perf_counter() - t0
+
+    print(f"{N_QUOTES} quotes x {LINES_PER_QUOTE} lines")
+    print(f"per quote: {per_quote:.2f} s")
+    print(f"batch:     {batch:.2f} s ({progress.updated} updated)")
+
+
+if __name__ == "__main__":
+    main()
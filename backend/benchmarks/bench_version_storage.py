@@ -0,0 +1,127 @@
+"""
+Storage of a quote's version history.
+
+A quote of LINES lines with varied content (categories, titles, HTML
+descriptions, hotel/flight details) gets VERSIONS versions, one line edited
+between two versions (the usual export/restore history). Reports the size of
+the history stored as:
+
+- full JSON snapshots (one per version, the original storage)
+- JSON keyframes + deltas (VERSION_KEYFRAME_INTERVAL)
+- compressed full snapshots (models/types.py, without deltas)
+- compressed keyframes + deltas: the bytes actually stored in quote_versions
+
+and the time to write a version, to rebuild every version, and to list pages
+of the history (snapshot columns deferred).
+
+Usage (from backend/): python -m benchmarks.bench_version_storage
+"""
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from src.api.quotes import load_quote
+from src.config import VERSION_KEYFRAME_INTERVAL
+from src.models_quote import Quote, QuoteDay, QuoteLine, QuoteVersion
+from src.services.quote_versioning import build_quote_snapshot, load_version_snapshot, snapshot_columns
+from src.models.types import encode_snapshot
+
+from ._fixtures import make_session
+
+LINES = 60
+VERSIONS = 100
+
+_WORDS = ("guided visit old town harbour cathedral museum tasting lunch dinner private "
+          "transfer airport hotel breakfast sea view terrace wine cellar local guide "
+          "walking tour boat sunset market tickets included pickup lobby").split()
+_CATEGORIES = ("Activity", "Hotel", "Flight", "Private Transfer", "Small Group", "Train", "Trip info")
+
+
+def _realistic_quote(db, rnd):
+    start = date(2026, 5, 1)
+    q = Quote(title="Portugal & Spain discovery", pax=4, start_date=start, fx_rate=Decimal("1.08"),
+              travel_agency="Globe Travel", client_name="Martin family")
+    for d_idx in range(LINES // 6):
+        day = QuoteDay(position=d_idx, date=start + timedelta(days=d_idx),
+                       destination=rnd.choice(("Lisbon", "Porto", "Seville", "Madrid")), decorative_images=[])
+        q.days.append(day)
+        for l_idx in range(6):
+            category = rnd.choice(_CATEGORIES)
+            text = " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(20, 80)))
+            raw = {"description": f"<p>{text}</p>", "start_time": f"{rnd.randint(7, 20):02d}:00",
+                   "buff_pct": rnd.choice((None, 5, 8, 10))}
+            if category == "Hotel":
+                raw.update(hotel_name=f"Hotel {rnd.choice(_WORDS).title()}", hotel_url="https://hotel.example")
+            elif category == "Flight":
+                raw.update({"from": "LIS", "to": "MAD", "dep_time": "10:05", "arr_time": "12:20"})
+            achat = Decimal(rnd.randint(2000, 90000)) / 100
+            day.lines.append(QuoteLine(
+                position=l_idx, category=category,
+                title=" ".join(rnd.choice(_WORDS) for _ in range(4)).capitalize(),
+                supplier_name=f"Supplier {rnd.randint(1, 30)}", visibility="client",
+                achat_eur=achat, achat_usd=achat * Decimal("1.08"), vente_usd=Decimal(rnd.randint(0, 40)),
+                fx_rate=Decimal("0.925926"), currency="EUR", raw_json=raw,
+            ))
+    db.add(q)
+    db.commit()
+    return q.id
+
+
+def main():
+    rnd = random.Random(0)
+    db = make_session()
+    quote_id = _realistic_quote(db, rnd)
+
+    full_json = full_compressed = 0
+    t0 = time.perf_counter()
+    for i in range(VERSIONS):
+        q = load_quote(db, quote_id)
+        line = rnd.choice(rnd.choice(q.days).lines)
+        line.vente_usd = Decimal(rnd.randint(0, 40))
+        db.commit()
+        snapshot = build_quote_snapshot(q, db=db)
+        full_json += len(json.dumps(snapshot))
+        full_compressed += len(encode_snapshot(snapshot))
+        db.add(QuoteVersion(quote_id=quote_id, label=f"v{i + 1}", type="manual",
+                            **snapshot_columns(db, quote_id, snapshot)))
+        db.commit()
+    write = time.perf_counter() - t0
+
+    versions = db.query(QuoteVersion).filter(QuoteVersion.quote_id == quote_id).all()
+    delta_json = sum(len(json.dumps(v.snapshot_json if v.snapshot_json is not None else v.snapshot_delta))
+                     for v in versions)
+    stored = db.query(
+        func.sum(func.coalesce(func.length(QuoteVersion.snapshot_json), 0)
+                 + func.coalesce(func.length(QuoteVersion.snapshot_delta), 0))
+    ).scalar()
+
+    db.expunge_all()
+    t0 = time.perf_counter()
+    for v in db.query(QuoteVersion).filter(QuoteVersion.quote_id == quote_id):
+        load_version_snapshot(db, v)
+    read = time.perf_counter() - t0
+
+    db.expunge_all()
+    t0 = time.perf_counter()
+    for offset in range(0, VERSIONS, 10):
+        db.query(QuoteVersion).filter(QuoteVersion.quote_id == quote_id).offset(offset).limit(10).all()
+    listing = time.perf_counter() - t0
+
+    def report(name, size):
+        print(f"{name:<28}{size / 1e3:8.0f} KB  ({full_json / size:5.1f}x smaller)")
+
+    print(f"{VERSIONS} versions of a {LINES}-line quote, keyframe every {VERSION_KEYFRAME_INTERVAL}")
+    print(f"{'full JSON snapshots':<28}{full_json / 1e3:8.0f} KB")
+    report("JSON keyframes + deltas", delta_json)
+    report("compressed full snapshots", full_compressed)
+    report("compressed keyframes+deltas", stored)
+    print(f"write {write / VERSIONS * 1e3:.1f} ms/version, rebuild {read / VERSIONS * 1e3:.2f} ms/version, "
+          f"list {listing / (VERSIONS // 10) * 1e3:.2f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
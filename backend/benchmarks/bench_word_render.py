@@ -0,0 +1,39 @@
+"""
+Word export time on 50/200/800-line quotes.
+
+_render_service used to locate the paragraphs it had just written through
+doc.paragraphs, which rebuilds the list of every paragraph of the document on
+each access: rendering a line cost O(paragraphs so far) and a whole quote
+O(n^2). With paragraphs tracked as they are created, ms/line should stay flat
+as the quote grows.
+
+Usage (from backend/): python -m benchmarks.bench_word_render
+"""
+import time
+
+from src.exports.word.exporter import build_docx_for_quote
+
+from ._fixtures import make_session, make_quote
+
+SIZES = (50, 200, 800)
+
+
+def main():
+    db = make_session()
+    print(f"{'lines':>6} {'export (ms)':>12} {'ms/line':>8}")
+    base = None
+    for n_lines in SIZES:
+        quote_id = make_quote(db, n_lines)
+        build_docx_for_quote(db, quote_id)  # warm-up (template, imports)
+        runs = max(1, 800 // n_lines)
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            build_docx_for_quote(db, quote_id)
+        elapsed = (time.perf_counter() - t0) / runs
+        per_line = elapsed * 1000 / n_lines
+        base = base or per_line
+        print(f"{n_lines:>6} {elapsed * 1000:>12.1f} {per_line:>8.2f}  ({per_line / base:.2f}x the 50-line cost)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Load test: /health latency while magic-link emails go through a slow SMTP server.
+
+SMTP is simulated by a send_magic_link_email that sleeps SMTP_DELAY seconds.
+/health is probed continuously, first alone (baseline) then for as long as
+CONCURRENT_LOGINS /auth/request-link calls are in flight; p50/p99/max are reported.
+
+Usage (from backend/): python -m benchmarks.load_health_slow_smtp
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main  # noqa: F401
+from main import app
+from src.auth import email as email_module
+from src.db import get_db
+from src.models.db import Base
+
+SMTP_DELAY = 0.5
+CONCURRENT_LOGINS = 40
+LOGIN_INTERVAL = 0.02  # arrivals spread over 0.8 s
+PROBES = 300  # baseline
+PROBE_INTERVAL = 0.005
+
+
+def _slow_send(to_email, token):
+    time.sleep(SMTP_DELAY)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def _probe_health(client, n=None, until=None):
+    """
+    Probe /health every PROBE_INTERVAL, n times or until all `until` tasks are done.
+
+    Latency is measured from the time the probe was scheduled, so a stalled
+    event loop shows up in the numbers (no coordinated omission).
+    """
+    latencies = []
+    next_at = time.perf_counter()
+    while (len(latencies) < n) if until is None else not all(t.done() for t in until):
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        r = await client.get("/health")
+        assert r.status_code == 200
+        latencies.append((time.perf_counter() - next_at) * 1000)
+        next_at += PROBE_INTERVAL
+    return latencies
+
+
+async def _run():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # Warm-up (first-call imports and validators are not what we measure)
+        await client.post("/auth/request-link", json={"email": "warmup@eetvl.com"})
+        await _probe_health(client, 50)
+        baseline = await _probe_health(client, PROBES)
+
+        t0 = time.perf_counter()
+        async def _login(i):
+            await asyncio.sleep(i * LOGIN_INTERVAL)
+            return await client.post("/auth/request-link", json={"email": f"agent{i}@eetvl.com"})
+
+        logins = [asyncio.create_task(_login(i)) for i in range(CONCURRENT_LOGINS)]
+        loaded = await _probe_health(client, until=logins)
+        statuses = [r.status_code for r in await asyncio.gather(*logins)]
+        elapsed = time.perf_counter() - t0
+
+    for name, lat in (("baseline", baseline), ("slow SMTP", loaded)):
+        print(f"/health {name:>10}: {len(lat):4d} probes   p50 {statistics.median(lat):7.2f} ms   "
+              f"p99 {_percentile(lat, 99):7.2f} ms   max {max(lat):7.2f} ms")
+    print(f"{CONCURRENT_LOGINS} request-link calls ({SMTP_DELAY}s SMTP each): "
+          f"{statuses.count(200)} x 200 in {elapsed:.2f} s")
+
+
+def main_():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'load.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def _get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = _get_db
+        email_module.send_magic_link_email = _slow_send
+        try:
+            asyncio.run(_run())
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main_()
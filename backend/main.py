@@ -1,7 +1,9 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -11,12 +13,15 @@ from src.models_quote import Quote, QuoteDay, QuoteLine
 from src.models_geo import Destination, DestinationPhoto
 from src.models.prod_models import ServiceCatalog, ServicePopularity, Supplier, ServiceImage
 from src.models.auth_models import User, LoginToken
+from src.models_export import ExportJob
 
 # Import routers after models
 from src.api.quotes import router as quotes_router
 from src.api.destinations import router as destinations_router
 from src.api.services import router as services_router
 from src.api.auth import router as auth_router
+from src.api.export_jobs import router as export_jobs_router
+from src.services.export_jobs import resume_pending_jobs
 
 # Configure logging
 logging.basicConfig(
@@ -25,7 +30,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Magalia API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Export jobs left queued/running by a previous process are picked up again
+    try:
+        resume_pending_jobs()
+    except Exception as e:
+        logger.warning(f"Could not resume pending export jobs: {e}")
+    yield
+
+
+app = FastAPI(title="Magalia API", lifespan=lifespan)
 
 # Allow all origins in development (for debugging CORS issues)
 # In production, restrict to specific domains
@@ -63,7 +78,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     return make_cors_response(
         request,
         422,
-        {"detail": exc.errors(), "body": exc.body}
+        # jsonable_encoder as FastAPI's default handler: validator errors carry the exception in ctx
+        jsonable_encoder({"detail": exc.errors(), "body": exc.body})
     )
 
 @app.exception_handler(StarletteHTTPException)
@@ -86,13 +102,26 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True, "origins": ALLOWED_ORIGINS}
 
+@app.get("/health/image-cache")
+def image_cache_stats():
+    """Hit/miss counters and size of the export image cache (monitoring)."""
+    from src.exports.word.image_cache import get_image_cache
+    return get_image_cache().stats()
+
+@app.get("/health/export-cache")
+def export_cache_stats():
+    """Hit/miss counters and size of the rendered export cache (monitoring)."""
+    from src.services.export_cache import get_export_cache
+    return get_export_cache().stats()
+
 app.include_router(quotes_router)
 app.include_router(destinations_router)
 app.include_router(services_router)
 app.include_router(auth_router)
+app.include_router(export_jobs_router)
 
 
 
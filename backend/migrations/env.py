@@ -36,7 +36,7 @@ sys.path.insert(0, str(backend_src.parent))
 
 from src.models.db import Base
 from src.models import staging_models, prod_models, auth_models
-from src import models_quote, models_geo, models_audit
+from src import models_quote, models_geo, models_audit, models_export
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,160 @@
+"""backfill_quote_totals
+
+Revision ID: a3c1d9e7b2f4
+Revises: 5e54260b39c6
+Create Date: 2026-10-16 10:12:41.508112
+
+The quote total columns (onspot_total, hassle_total, commissionable_net,
+commission_total, sell_total, grand_total) existed but were never written.
+They are now maintained by the pricing engine on every write; this fills them
+for existing quotes, using SQL aggregates. The pricing rules are copied here
+as they stood at this revision (src.services.quote_pricing), so later changes
+to the models or the engine do not affect this migration.
+"""
+import math
+from datetime import date as dt_date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1d9e7b2f4'
+down_revision: Union[str, Sequence[str], None] = '5e54260b39c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+quotes = sa.table(
+    'quotes',
+    sa.column('id', sa.Integer()),
+    sa.column('pax', sa.Integer()),
+    sa.column('start_date', sa.Date()),
+    sa.column('end_date', sa.Date()),
+    sa.column('margin_pct', sa.Numeric(12, 6)),
+    sa.column('onspot_manual', sa.Numeric(12, 2)),
+    sa.column('hassle_manual', sa.Numeric(12, 2)),
+    sa.column('onspot_total', sa.Numeric(12, 2)),
+    sa.column('hassle_total', sa.Numeric(12, 2)),
+    sa.column('commissionable_net', sa.Numeric(12, 2)),
+    sa.column('commission_total', sa.Numeric(12, 2)),
+    sa.column('sell_total', sa.Numeric(12, 2)),
+    sa.column('grand_total', sa.Numeric(12, 2)),
+)
+quote_days = sa.table('quote_days', sa.column('id', sa.Integer()), sa.column('quote_id', sa.Integer()))
+quote_lines = sa.table(
+    'quote_lines',
+    sa.column('quote_day_id', sa.Integer()),
+    sa.column('category', sa.String()),
+    sa.column('achat_usd', sa.Numeric(12, 2)),
+    sa.column('vente_usd', sa.Numeric(12, 2)),
+)
+
+# Pricing rules frozen at this revision
+DEFAULT_MARGIN_PCT = Decimal('0.1627')
+HASSLE_PER_PAX = Decimal('150')
+ONSPOT_PER_CARD_DAY = 9
+ONSPOT_PAX_PER_CARD = 6
+ONSPOT_MIN_DAYS = 3
+UNPAID_CATEGORIES = ('trip info', 'internal')
+
+_CENT = Decimal('0.01')
+
+
+def _money(v):
+    return v.quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _dec(v):
+    if v is None:
+        return Decimal('0')
+    return v if isinstance(v, Decimal) else Decimal(str(v))
+
+
+def days_count(n_days, start_date=None, end_date=None):
+    if n_days:
+        return n_days
+    try:
+        d0 = start_date if isinstance(start_date, dt_date) else dt_date.fromisoformat(str(start_date))
+        d1 = end_date if isinstance(end_date, dt_date) else dt_date.fromisoformat(str(end_date))
+        return max(0, (d1 - d0).days + 1)
+    except Exception:
+        return 0
+
+
+def totals_from_sums(*, pax, trip_days, margin_pct, onspot_manual, hassle_manual, achats_sum, ventes_sum):
+    """Values of the quote total columns from the sums of the paid lines."""
+    margin = _dec(margin_pct) if margin_pct is not None else DEFAULT_MARGIN_PCT
+    if onspot_manual is not None:
+        onspot = _dec(onspot_manual)
+    else:
+        cards = max(1, math.ceil((pax or 1) / ONSPOT_PAX_PER_CARD))
+        onspot = Decimal(cards * ONSPOT_PER_CARD_DAY * max(trip_days, ONSPOT_MIN_DAYS))
+    hassle = _dec(hassle_manual) if hassle_manual is not None else (pax or 0) * HASSLE_PER_PAX
+
+    achats_total = _money(onspot + _dec(achats_sum))
+    commission_total = _money(achats_total * margin)
+    ventes_total = _money(_dec(ventes_sum) + hassle)
+    return {
+        'onspot_total': _money(onspot),
+        'hassle_total': _money(hassle),
+        'commissionable_net': achats_total,
+        'commission_total': commission_total,
+        'sell_total': ventes_total,
+        'grand_total': _money(achats_total + commission_total + ventes_total),
+    }
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    conn = op.get_bind()
+
+    day_counts = dict(conn.execute(
+        sa.select(quote_days.c.quote_id, sa.func.count(quote_days.c.id))
+        .group_by(quote_days.c.quote_id)
+    ).all())
+
+    sums = {
+        row.quote_id: row for row in conn.execute(
+            sa.select(
+                quote_days.c.quote_id,
+                sa.func.sum(quote_lines.c.achat_usd).label('achats'),
+                sa.func.sum(quote_lines.c.vente_usd).label('ventes'),
+            )
+            .select_from(quote_lines.join(quote_days, quote_lines.c.quote_day_id == quote_days.c.id))
+            .where(sa.func.lower(sa.func.coalesce(quote_lines.c.category, '')).notin_(UNPAID_CATEGORIES))
+            .group_by(quote_days.c.quote_id)
+        )
+    }
+
+    updates = []
+    for q in conn.execute(sa.select(
+        quotes.c.id, quotes.c.pax, quotes.c.start_date, quotes.c.end_date,
+        quotes.c.margin_pct, quotes.c.onspot_manual, quotes.c.hassle_manual,
+    )):
+        line_sums = sums.get(q.id)
+        totals = totals_from_sums(
+            pax=q.pax,
+            trip_days=days_count(day_counts.get(q.id, 0), q.start_date, q.end_date),
+            margin_pct=q.margin_pct,
+            onspot_manual=q.onspot_manual,
+            hassle_manual=q.hassle_manual,
+            achats_sum=line_sums.achats if line_sums else None,
+            ventes_sum=line_sums.ventes if line_sums else None,
+        )
+        updates.append({'qid': q.id, **totals})
+
+    if updates:
+        conn.execute(
+            quotes.update().where(quotes.c.id == sa.bindparam('qid')),
+            updates,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Data-only migration: the stored totals are simply left in place
+    pass
@@ -0,0 +1,150 @@
+"""add_quote_version_content_hash
+
+Revision ID: a7d3e9f1c245
+Revises: f6c2d8a5e013
+Create Date: 2026-10-17 16:38:52.160447
+
+Content hash of each version's snapshot (quote_versioning.snapshot_hash),
+indexed with quote_id. Existing versions are hashed from their rebuilt
+snapshots, quote by quote.
+
+The snapshot decoding (format 1), delta application and hash are copied here
+as they stood at this revision, so later changes to the models or services do
+not affect this migration.
+"""
+import hashlib
+import json
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f1c245'
+down_revision: Union[str, Sequence[str], None] = 'f6c2d8a5e013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+quote_versions = sa.table(
+    'quote_versions',
+    sa.column('id', sa.Integer()),
+    sa.column('quote_id', sa.Integer()),
+    sa.column('snapshot_json', sa.LargeBinary()),
+    sa.column('snapshot_delta', sa.LargeBinary()),
+    sa.column('base_version_id', sa.Integer()),
+    sa.column('content_hash', sa.String(64)),
+)
+
+
+# --- frozen at this revision ---------------------------------------------------
+
+_DICTIONARY_1 = (
+    '{"set": {}, "unset": [], "days": [{"id": 1, "set": {}, "lines": [{"new": {}}]}]}'
+    '"Trip info""Private Transfer""Train""Ferry""Flight""Small Group""Private""New Hotel"'
+    '"Hotel""Car rental""Cost""Internal""Activity""USD""EUR"'
+    '{"id": 1, "title": "", "display_title": null, "hero_photo_1": null, "hero_photo_2": null, '
+    '"pax": 2, "start_date": "2026-01-01", "end_date": "2026-01-01", "travel_agency": null, '
+    '"travel_advisor": null, "client_name": null, "fx_rate": 1.0, "internal_note": null, '
+    '"margin_pct": 0.1627, "onspot_manual": null, "hassle_manual": null, "onspot_total": 0.0, '
+    '"hassle_total": 0.0, "commissionable_net": 0.0, "commission_total": 0.0, "sell_total": 0.0, '
+    '"grand_total": 0.0, '
+    '"days": [{"id": 1, "position": 0, "date": "2026-01-01", "destination": "", '
+    '"decorative_images": [], "lines": ['
+    '{"id": 1, "position": 0, "service_id": null, "category": "Activity", "title": "", '
+    '"supplier_name": null, "visibility": "client", "achat_eur": null, "achat_usd": null, '
+    '"vente_usd": null, "fx_rate": null, "currency": "EUR", "base_net_amount": null, '
+    '"raw_json": {"description": "<p></p>", "full_description": "", "start_time": "", '
+    '"activity_duration": "", "hotel_name": "", "hotel_url": "", "provider_service_url": "", '
+    '"internal_note": "", "buff_pct": null, "fields": {}}}, '
+    '{"id": 2, "position": 1, "service_id": null, "category": "Hotel", "title": "", '
+    '"supplier_name": null, "visibility": "client", "achat_eur": null, "achat_usd": null, '
+    '"vente_usd": null, "fx_rate": null, "currency": "EUR", "base_net_amount": null, "raw_json": {}}]}]}'
+).encode()
+
+
+def decode_snapshot(data):
+    data = bytes(data)
+    if data[:1] != b'\x01':
+        raise ValueError(f'Unknown snapshot format {data[:1]!r}')
+    decompressor = zlib.decompressobj(-15, zdict=_DICTIONARY_1)
+    return json.loads(decompressor.decompress(data[1:]) + decompressor.flush())
+
+
+def _apply_fields(base, entry):
+    out = {k: v for k, v in base.items() if k not in entry.get('unset', ())}
+    out.update(entry.get('set', {}))
+    return out
+
+
+def _apply_list(base_items, entries, children):
+    base_index = {item['id']: item for item in base_items}
+    out = []
+    for entry in entries:
+        if isinstance(entry, dict) and 'new' in entry:
+            out.append(entry['new'])
+            continue
+        if not isinstance(entry, dict):
+            out.append(base_index[entry])
+            continue
+        base = base_index[entry['id']]
+        item = _apply_fields(base, entry)
+        if children is not None and children in entry:
+            item[children] = _apply_list(base.get(children) or [], entry[children], None)
+        out.append(item)
+    return out
+
+
+def apply_snapshot_delta(base, delta):
+    out = _apply_fields(base, delta)
+    if 'days' in delta:
+        out['days'] = _apply_list(base.get('days') or [], delta['days'], 'lines')
+    return out
+
+
+def snapshot_hash(snapshot):
+    """SHA-256 of the canonical JSON of the snapshot, concurrency token ("version") left out."""
+    content = {k: v for k, v in snapshot.items() if k != 'version'}
+    text = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# --- migration -----------------------------------------------------------------
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_quote_versions_quote_content_hash', ['quote_id', 'content_hash'], unique=False)
+
+    conn = op.get_bind()
+    quote_ids = list(conn.execute(sa.select(quote_versions.c.quote_id).distinct()).scalars())
+    for quote_id in quote_ids:
+        rows = conn.execute(
+            sa.select(quote_versions.c.id, quote_versions.c.snapshot_json,
+                      quote_versions.c.snapshot_delta, quote_versions.c.base_version_id)
+            .where(quote_versions.c.quote_id == quote_id)
+            .order_by(quote_versions.c.id)
+        ).all()
+        snapshots = {}
+        for row in rows:
+            # Deltas only refer to earlier versions: their base is already rebuilt
+            if row.snapshot_json is not None:
+                snapshot = decode_snapshot(row.snapshot_json)
+            else:
+                snapshot = apply_snapshot_delta(snapshots[row.base_version_id], decode_snapshot(row.snapshot_delta))
+            snapshots[row.id] = snapshot
+            conn.execute(
+                quote_versions.update().where(quote_versions.c.id == row.id)
+                .values(content_hash=snapshot_hash(snapshot))
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.drop_index('ix_quote_versions_quote_content_hash')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,85 @@
+"""quote_version_counter
+
+Revision ID: b8e4f2a6d317
+Revises: a7d3e9f1c245
+Create Date: 2026-10-17 19:05:44.731902
+
+Per-quote version counter (quotes.last_version_number) and a unique
+(quote_id, label) constraint on quote_versions. The counter starts at the
+highest "v<n>" label of the quote's versions, archived ones included.
+Versions that share a label (allocated concurrently, or reused after an
+archive) keep the label on the oldest one; the others are renumbered after
+the highest one.
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f2a6d317'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e9f1c245'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+quotes = sa.table(
+    'quotes',
+    sa.column('id', sa.Integer()),
+    sa.column('last_version_number', sa.Integer()),
+)
+
+quote_versions = sa.table(
+    'quote_versions',
+    sa.column('id', sa.Integer()),
+    sa.column('quote_id', sa.Integer()),
+    sa.column('label', sa.String(50)),
+)
+
+_LABEL_NUMBER = re.compile(r'v(\d+)')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('quotes') as batch_op:
+        batch_op.add_column(sa.Column('last_version_number', sa.Integer(), nullable=False, server_default='0'))
+
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(quote_versions.c.id, quote_versions.c.quote_id, quote_versions.c.label)
+        .order_by(quote_versions.c.quote_id, quote_versions.c.id)
+    ).all()
+    by_quote = {}
+    for row in rows:
+        by_quote.setdefault(row.quote_id, []).append(row)
+
+    for quote_id, versions in by_quote.items():
+        numbers = [int(m.group(1)) for m in (_LABEL_NUMBER.match(v.label) for v in versions) if m]
+        last = max(numbers, default=0)
+        seen = set()
+        for v in versions:
+            if v.label not in seen:
+                seen.add(v.label)
+                continue
+            last += 1
+            while f'v{last}' in seen:
+                last += 1
+            seen.add(f'v{last}')
+            conn.execute(
+                quote_versions.update().where(quote_versions.c.id == v.id).values(label=f'v{last}')
+            )
+        conn.execute(quotes.update().where(quotes.c.id == quote_id).values(last_version_number=last))
+
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.create_unique_constraint('uq_quote_versions_quote_label', ['quote_id', 'label'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.drop_constraint('uq_quote_versions_quote_label', type_='unique')
+
+    with op.batch_alter_table('quotes') as batch_op:
+        batch_op.drop_column('last_version_number')
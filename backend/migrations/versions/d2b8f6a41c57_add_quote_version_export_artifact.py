@@ -0,0 +1,29 @@
+"""add_quote_version_export_artifact
+
+Revision ID: d2b8f6a41c57
+Revises: c7e2a4f19d03
+Create Date: 2026-10-16 23:52:10.418209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b8f6a41c57'
+down_revision: Union[str, Sequence[str], None] = 'c7e2a4f19d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('quote_versions', sa.Column('export_artifact', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.drop_column('export_artifact')
@@ -0,0 +1,214 @@
+"""delta_encode_quote_versions
+
+Revision ID: e4b7c1d92a36
+Revises: d2b8f6a41c57
+Create Date: 2026-10-17 09:41:27.903114
+
+Quote versions are now stored as a full snapshot every
+VERSION_KEYFRAME_INTERVAL versions of a quote and, in between, as a delta
+against the previous version (services/version_delta.py). This adds the
+columns and compacts the existing history quote by quote, with the same rule
+as new versions (version_storage). Downgrade writes the full snapshots back.
+
+The delta format and storage rule are copied here as they stood at this
+revision, so later changes to services/version_delta.py do not affect it.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7c1d92a36'
+down_revision: Union[str, Sequence[str], None] = 'd2b8f6a41c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+quote_versions = sa.table(
+    'quote_versions',
+    sa.column('id', sa.Integer()),
+    sa.column('quote_id', sa.Integer()),
+    sa.column('snapshot_json', sa.JSON(none_as_null=True)),
+    sa.column('snapshot_delta', sa.JSON(none_as_null=True)),
+    sa.column('base_version_id', sa.Integer()),
+    sa.column('delta_depth', sa.Integer()),
+)
+
+# Same setting as src.config.VERSION_KEYFRAME_INTERVAL
+KEYFRAME_INTERVAL = max(1, int(os.getenv('VERSION_KEYFRAME_INTERVAL', '10')))
+
+
+# --- delta format, frozen at this revision -------------------------------------
+
+_MISSING = object()
+
+
+def _field_changes(base: Dict[str, Any], new: Dict[str, Any], skip: str) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    changed = {k: v for k, v in new.items() if k != skip and base.get(k, _MISSING) != v}
+    if changed:
+        changes['set'] = changed
+    removed = [k for k in base if k != skip and k not in new]
+    if removed:
+        changes['unset'] = removed
+    return changes
+
+
+def _by_id(items: List[Dict[str, Any]]) -> Optional[Dict[Any, Dict[str, Any]]]:
+    index = {}
+    for item in items:
+        item_id = item.get('id')
+        if item_id is None or item_id in index:
+            return None
+        index[item_id] = item
+    return index
+
+
+def _list_delta(base_items, new_items, children):
+    base_index = _by_id(base_items)
+    if base_index is None or _by_id(new_items) is None:
+        return None
+    entries = []
+    for item in new_items:
+        base = base_index.get(item['id'])
+        if base is None:
+            entries.append({'new': item})
+            continue
+        entry = _field_changes(base, item, skip=children)
+        if children is not None:
+            base_children = base.get(children) or []
+            new_children = item.get(children) or []
+            if base_children != new_children:
+                child_entries = _list_delta(base_children, new_children, None)
+                if child_entries is None:
+                    return None
+                entry[children] = child_entries
+        entries.append({'id': item['id'], **entry} if entry else item['id'])
+    return entries
+
+
+def snapshot_delta(base: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    delta = _field_changes(base, new, skip='days')
+    base_days = base.get('days') or []
+    new_days = new.get('days') or []
+    if base_days != new_days:
+        days = _list_delta(base_days, new_days, 'lines')
+        if days is None:
+            return None
+        delta['days'] = days
+    return delta
+
+
+def _apply_fields(base: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: v for k, v in base.items() if k not in entry.get('unset', ())}
+    out.update(entry.get('set', {}))
+    return out
+
+
+def _apply_list(base_items, entries, children):
+    base_index = {item['id']: item for item in base_items}
+    out = []
+    for entry in entries:
+        if isinstance(entry, dict) and 'new' in entry:
+            out.append(entry['new'])
+            continue
+        if not isinstance(entry, dict):
+            out.append(base_index[entry])
+            continue
+        base = base_index[entry['id']]
+        item = _apply_fields(base, entry)
+        if children is not None and children in entry:
+            item[children] = _apply_list(base.get(children) or [], entry[children], None)
+        out.append(item)
+    return out
+
+
+def apply_snapshot_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    out = _apply_fields(base, delta)
+    if 'days' in delta:
+        out['days'] = _apply_list(base.get('days') or [], delta['days'], 'lines')
+    return out
+
+
+def version_storage(snapshot, keyframe_interval, base_snapshot=None, base_id=None, base_depth=0):
+    """Storage columns: a delta against the previous version, or the full snapshot."""
+    keyframe = {'snapshot_json': snapshot, 'snapshot_delta': None, 'base_version_id': None, 'delta_depth': 0}
+    if base_snapshot is None or base_depth + 1 >= keyframe_interval:
+        return keyframe
+    delta = snapshot_delta(base_snapshot, snapshot)
+    if delta is None or len(json.dumps(delta, default=str)) >= len(json.dumps(snapshot, default=str)):
+        return keyframe
+    return {'snapshot_json': None, 'snapshot_delta': delta, 'base_version_id': base_id, 'delta_depth': base_depth + 1}
+
+
+# --- migration -----------------------------------------------------------------
+
+def _quote_ids(conn):
+    return list(conn.execute(sa.select(quote_versions.c.quote_id).distinct()).scalars())
+
+
+def _versions(conn, quote_id):
+    return conn.execute(
+        sa.select(quote_versions)
+        .where(quote_versions.c.quote_id == quote_id)
+        .order_by(quote_versions.c.id)
+    ).all()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.add_column(sa.Column('snapshot_delta', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('base_version_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('delta_depth', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.alter_column('snapshot_json', existing_type=sa.JSON(), nullable=True)
+        batch_op.create_foreign_key(
+            'fk_quote_versions_base_version_id', 'quote_versions', ['base_version_id'], ['id']
+        )
+
+    # One quote at a time: only its history is held in memory
+    conn = op.get_bind()
+    for quote_id in _quote_ids(conn):
+        previous = None  # (id, full snapshot, depth)
+        for v in _versions(conn, quote_id):
+            snapshot = v.snapshot_json or {}
+            if previous is None:
+                columns = version_storage(snapshot, KEYFRAME_INTERVAL)
+            else:
+                columns = version_storage(
+                    snapshot, KEYFRAME_INTERVAL,
+                    base_snapshot=previous[1], base_id=previous[0], base_depth=previous[2],
+                )
+            if columns['snapshot_json'] is None:
+                conn.execute(
+                    quote_versions.update().where(quote_versions.c.id == v.id).values(**columns)
+                )
+            previous = (v.id, snapshot, columns['delta_depth'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    for quote_id in _quote_ids(conn):
+        snapshots = {}
+        for v in _versions(conn, quote_id):
+            # Versions only refer to earlier ones: their base is already rebuilt
+            if v.snapshot_json is not None:
+                snapshots[v.id] = v.snapshot_json
+                continue
+            snapshots[v.id] = apply_snapshot_delta(snapshots[v.base_version_id], v.snapshot_delta)
+            conn.execute(
+                quote_versions.update().where(quote_versions.c.id == v.id)
+                .values(snapshot_json=snapshots[v.id])
+            )
+
+    with op.batch_alter_table('quote_versions') as batch_op:
+        batch_op.drop_constraint('fk_quote_versions_base_version_id', type_='foreignkey')
+        batch_op.alter_column('snapshot_json', existing_type=sa.JSON(), nullable=False)
+        batch_op.drop_column('delta_depth')
+        batch_op.drop_column('base_version_id')
+        batch_op.drop_column('snapshot_delta')
@@ -0,0 +1,129 @@
+"""compress_quote_version_snapshots
+
+Revision ID: f6c2d8a5e013
+Revises: e4b7c1d92a36
+Create Date: 2026-10-17 14:12:05.518270
+
+quote_versions.snapshot_json / snapshot_delta go from JSON text to compressed
+blobs (src/models/types.py). The blobs are written to new columns,
+which then replace the JSON ones; downgrade decodes them back.
+
+The codec (format 1 and its dictionary) is copied here as it stood at this
+revision, so later changes to the models do not affect this migration.
+"""
+import json
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c2d8a5e013'
+down_revision: Union[str, Sequence[str], None] = 'e4b7c1d92a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK = 500
+
+_COLUMNS = ('snapshot_json', 'snapshot_delta')
+
+# --- codec, frozen at this revision (format 1) -------------------------------
+
+_DICTIONARY_1 = (
+    '{"set": {}, "unset": [], "days": [{"id": 1, "set": {}, "lines": [{"new": {}}]}]}'
+    '"Trip info""Private Transfer""Train""Ferry""Flight""Small Group""Private""New Hotel"'
+    '"Hotel""Car rental""Cost""Internal""Activity""USD""EUR"'
+    '{"id": 1, "title": "", "display_title": null, "hero_photo_1": null, "hero_photo_2": null, '
+    '"pax": 2, "start_date": "2026-01-01", "end_date": "2026-01-01", "travel_agency": null, '
+    '"travel_advisor": null, "client_name": null, "fx_rate": 1.0, "internal_note": null, '
+    '"margin_pct": 0.1627, "onspot_manual": null, "hassle_manual": null, "onspot_total": 0.0, '
+    '"hassle_total": 0.0, "commissionable_net": 0.0, "commission_total": 0.0, "sell_total": 0.0, '
+    '"grand_total": 0.0, '
+    '"days": [{"id": 1, "position": 0, "date": "2026-01-01", "destination": "", '
+    '"decorative_images": [], "lines": ['
+    '{"id": 1, "position": 0, "service_id": null, "category": "Activity", "title": "", '
+    '"supplier_name": null, "visibility": "client", "achat_eur": null, "achat_usd": null, '
+    '"vente_usd": null, "fx_rate": null, "currency": "EUR", "base_net_amount": null, '
+    '"raw_json": {"description": "<p></p>", "full_description": "", "start_time": "", '
+    '"activity_duration": "", "hotel_name": "", "hotel_url": "", "provider_service_url": "", '
+    '"internal_note": "", "buff_pct": null, "fields": {}}}, '
+    '{"id": 2, "position": 1, "service_id": null, "category": "Hotel", "title": "", '
+    '"supplier_name": null, "visibility": "client", "achat_eur": null, "achat_usd": null, '
+    '"vente_usd": null, "fx_rate": null, "currency": "EUR", "base_net_amount": null, "raw_json": {}}]}]}'
+).encode()
+
+_FORMAT = 1
+_LEVEL = 6
+_WBITS = -15
+
+
+def encode_snapshot(value):
+    text = json.dumps(value, ensure_ascii=False).encode()
+    compressor = zlib.compressobj(_LEVEL, zlib.DEFLATED, _WBITS, zdict=_DICTIONARY_1)
+    return bytes([_FORMAT]) + compressor.compress(text) + compressor.flush()
+
+
+def decode_snapshot(data):
+    data = bytes(data)
+    if data[:1] != bytes([_FORMAT]):
+        raise ValueError(f'Unknown snapshot format {data[:1]!r}')
+    decompressor = zlib.decompressobj(_WBITS, zdict=_DICTIONARY_1)
+    return json.loads(decompressor.decompress(data[1:]) + decompressor.flush())
+
+
+# --- migration -----------------------------------------------------------------
+
+
+def _convert(from_type, to_type, convert):
+    """Copy each column into <column>_new through convert, by chunks of ids."""
+    from_cols = [sa.column(name, from_type) for name in _COLUMNS]
+    to_cols = [sa.column(f'{name}_new', to_type) for name in _COLUMNS]
+    quote_versions = sa.table('quote_versions', sa.column('id', sa.Integer()), *from_cols, *to_cols)
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(quote_versions.c.id, *from_cols)
+            .where(quote_versions.c.id > last_id)
+            .order_by(quote_versions.c.id)
+            .limit(CHUNK)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            values = {
+                f'{name}_new': None if value is None else convert(value)
+                for name, value in zip(_COLUMNS, row[1:])
+            }
+            conn.execute(quote_versions.update().where(quote_versions.c.id == row.id).values(**values))
+        last_id = rows[-1].id
+
+
+def _swap_columns(new_type, nullable=True):
+    with op.batch_alter_table('quote_versions') as batch_op:
+        for name in _COLUMNS:
+            batch_op.drop_column(name)
+        for name in _COLUMNS:
+            batch_op.alter_column(f'{name}_new', new_column_name=name, existing_type=new_type,
+                                  existing_nullable=nullable)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        for name in _COLUMNS:
+            batch_op.add_column(sa.Column(f'{name}_new', sa.LargeBinary(), nullable=True))
+    _convert(sa.JSON(none_as_null=True), sa.LargeBinary(), encode_snapshot)
+    _swap_columns(sa.LargeBinary())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('quote_versions') as batch_op:
+        for name in _COLUMNS:
+            batch_op.add_column(sa.Column(f'{name}_new', sa.JSON(), nullable=True))
+    _convert(sa.LargeBinary(), sa.JSON(none_as_null=True), decode_snapshot)
+    _swap_columns(sa.JSON())
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
 from fastapi.responses import RedirectResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from pydantic import BaseModel, EmailStr
@@ -13,7 +14,7 @@ from pydantic import BaseModel, EmailStr
 from ..db import get_db
 from ..models.auth_models import User, LoginToken
 from ..auth.session import create_session, get_session, clear_session
-from ..auth.email import send_magic_link_email
+from ..auth.email import send_magic_link_email_async
 
 logger = logging.getLogger(__name__)
 
@@ -49,12 +50,12 @@ def get_current_user(
 @router.get("/test-smtp")
 async def test_smtp():
     """Test endpoint to verify SMTP configuration."""
-    from ..auth.email import send_magic_link_email
+    from ..auth.email import send_magic_link_email_async
     from ..config import SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_FROM_EMAIL
     
     try:
         # Test sending to SMTP_USER
-        send_magic_link_email(SMTP_USER or "test@eetvl.com", "test-token")
+        await send_magic_link_email_async(SMTP_USER or "test@eetvl.com", "test-token")
         return {
             "status": "success",
             "message": "SMTP test successful",
@@ -80,21 +81,8 @@ async def test_smtp():
         }
 
 
-@router.post("/request-link")
-async def request_link(
-    payload: RequestLinkRequest,
-    db: Session = Depends(get_db)
-):
-    """Request a magic link for email authentication."""
-    email = payload.email.lower().strip()
-    
-    # Validate @eetvl.com domain
-    if not email.endswith("@eetvl.com"):
-        raise HTTPException(
-            status_code=400,
-            detail="Only @eetvl.com email addresses are allowed."
-        )
-    
+def _issue_login_token(db: Session, email: str):
+    """Rate-limit, find or create the user and store a new login token (blocking DB work)."""
     # Rate limiting: max 5 requests per hour per email
     # First check if user exists to get user_id
     existing_user = db.query(User).filter(User.email == email).first()
@@ -142,16 +130,41 @@ async def request_link(
     db.add(login_token)
     db.commit()
     
+    return user.email, raw_token
+
+
+@router.post("/request-link")
+async def request_link(
+    payload: RequestLinkRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Request a magic link for email authentication.
+
+    The handler stays async but never blocks the event loop: the DB work runs
+    in the threadpool and the SMTP session in the dedicated email pool.
+    """
+    email = payload.email.lower().strip()
+    
+    # Validate @eetvl.com domain
+    if not email.endswith("@eetvl.com"):
+        raise HTTPException(
+            status_code=400,
+            detail="Only @eetvl.com email addresses are allowed."
+        )
+    
+    user_email, raw_token = await run_in_threadpool(_issue_login_token, db, email)
+    
     # Send email
     # Domain validation already passed, so if SMTP fails, return a 5xx error
     try:
-        send_magic_link_email(user.email, raw_token)
+        await send_magic_link_email_async(user_email, raw_token)
     except Exception as e:
         # Log the actual error for debugging (with full traceback)
         import traceback
         error_trace = traceback.format_exc()
         error_msg = str(e)
-        logger.error(f"Failed to send magic link email to {user.email}")
+        logger.error(f"Failed to send magic link email to {user_email}")
         logger.error(f"Error: {error_msg}")
         logger.error(f"Full traceback:\n{error_trace}")
         # Return 500 with generic message (don't expose SMTP details in production)
@@ -171,7 +184,7 @@ async def request_link(
 
 
 @router.get("/magic")
-async def magic_link(
+def magic_link(
     token: str = Query(..., description="Magic link token"),
     db: Session = Depends(get_db)
 ):
@@ -253,7 +266,7 @@ async def magic_link(
 
 
 @router.get("/me")
-async def get_me(
+def get_me(
     request: Request,
     db: Session = Depends(get_db)
 ):
@@ -7,6 +7,7 @@ from pydantic import BaseModel, constr
 from ..db import get_db
 from ..models_geo import Destination, DestinationPhoto
 from .schemas_geo import DestinationIn, DestinationOut
+from ..services.image_prewarm import enqueue_prewarm
 
 router = APIRouter(prefix="/destinations", tags=["destinations"])
 
@@ -107,6 +108,8 @@ def upsert_destination_photo(payload: DestinationPhotoIn, db: Session = Depends(
         row.usage_count = int(row.usage_count or 0) + 1
     db.commit()
     db.refresh(row)
+    # Download and prepare the photo now rather than at the first export using it
+    enqueue_prewarm(urls=[row.photo_url])
     return DestinationPhotoOut(
         id=row.id, dest_id=row.dest_id, photo_url=row.photo_url, usage_count=row.usage_count
     )
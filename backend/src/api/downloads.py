@@ -0,0 +1,46 @@
+"""
+Streaming of generated files (Word/Excel exports).
+
+Exports are written to a spooled temporary file (in memory up to
+EXPORT_SPOOL_MAX_BYTES, on disk beyond) and sent back in chunks, so a request
+never holds the whole document as one bytes object, let alone the BytesIO plus
+its getvalue() copy. The file is closed (and deleted) once the response is sent.
+"""
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterator
+
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from ..config import EXPORT_SPOOL_MAX_BYTES
+
+CHUNK_BYTES = 64 * 1024
+
+
+def spooled_file() -> SpooledTemporaryFile:
+    """Temporary file to build an export into."""
+    return SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES, mode="w+b")
+
+
+def _iter_file(f: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = f.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+
+def file_download(f: BinaryIO, filename: str, media_type: str) -> StreamingResponse:
+    """Attachment response streaming f from its start; f is closed after sending."""
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(0)
+    return StreamingResponse(
+        _iter_file(f),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(size),
+        },
+        background=BackgroundTask(f.close),
+    )
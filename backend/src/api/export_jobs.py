@@ -0,0 +1,66 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..db import get_db
+from ..models_export import ExportJob
+from ..models_quote import Quote
+from ..api.auth import get_current_user
+from ..services.export_jobs import MEDIA_TYPES, STATUS_DONE, enqueue_export, job_to_dict
+from .schemas_quote import ExportJobIn
+
+
+router = APIRouter(prefix="/quotes", tags=["export-jobs"])
+
+
+def _get_job(db: Session, quote_id: int, job_id: str) -> ExportJob:
+    job = db.get(ExportJob, job_id)
+    if not job or job.quote_id != quote_id:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.post("/{quote_id}/export-jobs", status_code=202)
+def create_export_job(quote_id: int, payload: ExportJobIn, request: Request, db: Session = Depends(get_db)):
+    """
+    Queue a Word/Excel export of the quote and return the job right away.
+    Poll GET /quotes/{id}/export-jobs/{job_id}, then download .../result.
+    """
+    from ..services.quote_versioning import get_user_display_name
+
+    if not db.query(Quote.id).filter(Quote.id == quote_id).first():
+        raise HTTPException(status_code=404, detail="Quote not found")
+    user = get_current_user(request, db)
+    job = enqueue_export(
+        db,
+        quote_id,
+        payload.kind,
+        # The worker opens its own sessions on the same database as the request
+        session_factory=sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind()),
+        created_by=get_user_display_name(user.email if user else None),
+        create_version=payload.create_version,
+    )
+    return job_to_dict(job)
+
+
+@router.get("/{quote_id}/export-jobs/{job_id}")
+def get_export_job(quote_id: int, job_id: str, db: Session = Depends(get_db)):
+    """Status and progress of an export job (days rendered, images fetched)."""
+    job = _get_job(db, quote_id, job_id)
+    # The worker commits from its own session: do not serve a stale identity map
+    db.refresh(job)
+    return job_to_dict(job)
+
+
+@router.get("/{quote_id}/export-jobs/{job_id}/result")
+def download_export_job(quote_id: int, job_id: str, db: Session = Depends(get_db)):
+    """Stream the built file of a finished job (409 while it is not done)."""
+    job = _get_job(db, quote_id, job_id)
+    db.refresh(job)
+    if job.status != STATUS_DONE:
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    return FileResponse(job.file_path, media_type=MEDIA_TYPES[job.kind], filename=job.file_name)
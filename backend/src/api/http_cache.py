@@ -0,0 +1,55 @@
+"""
+Conditional GET helpers (ETag / If-None-Match).
+
+Read endpoints compute a cheap validator before building their payload; when the
+client already holds that representation they answer 304 with no body. Responses
+carry Cache-Control: no-cache so browsers keep the body but revalidate on every
+use, which makes fetch() send If-None-Match on its own.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+CACHE_CONTROL = "no-cache"
+
+
+def strong_etag(value: str) -> str:
+    """Quote an opaque value as a strong ETag."""
+    return f'"{value}"'
+
+
+def hashed_etag(*parts: Any) -> str:
+    """Strong ETag from a content hash of the given values (repr-based)."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return strong_etag(digest)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    True if an If-None-Match header value matches etag.
+
+    If-None-Match uses the weak comparison (RFC 9110 13.1.2): W/ prefixes are
+    ignored, the header may list several tags, and "*" matches anything.
+    """
+    if not if_none_match:
+        return False
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the validator again."""
+    return Response(status_code=304, headers=cache_headers(etag))
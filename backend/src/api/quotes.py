@@ -1,33 +1,46 @@
+import json
 import logging
-from datetime import date as dt_date
+import re
+from datetime import date as dt_date, datetime
 import math
 from decimal import Decimal, ROUND_HALF_UP
 
 from math import ceil
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 
 from ..db import get_db
 
-from ..models_quote import Quote, QuoteDay, QuoteLine, QuoteVersion
+from ..models_quote import Quote, QuoteDay, QuoteLine, QuoteVersion, utcnow
 
 from .schemas_quote import QuoteIn, QuoteOut, DestinationRangePatch, QuoteDayOut, QuoteVersionIn, QuoteVersionOut, QuoteVersionDetailOut, QuoteVersionListOut, QuoteVersionPatch
+from .schemas_quote import QuoteVersionChangedOut, QuoteVersionDiffOut
+from .schemas_quote import QuoteConsolidatedExportIn, QuoteExportBatchIn, QuoteRepriceBatchIn
+from .schemas_quote import QuoteLineIn, QuoteHeaderPatch, QuoteDayPatch, QuoteLinePatch, QuoteDayFieldsOut, QuotePatchOut
 from typing import List, Optional, Dict
 
-from ..models.prod_models import ServiceImage
-
 from ..api.auth import get_current_user
+from .downloads import file_download, spooled_file
+from .http_cache import cache_headers, etag_matches, hashed_etag, not_modified, strong_etag
+from ..services.quote_sync import sync_quote_days, line_values
+from ..services.quote_pricing import apply_line_delta, apply_totals, line_contribution, stored_totals
+from ..services.quote_reprice import parse_updated_since, reprice_quotes, select_quote_ids
+from ..services.version_diff import diff_snapshots, get_diff_cache
 from ..services.quote_versioning import (
     build_quote_snapshot,
     compute_total_price,
-    get_next_version_label,
+    allocate_version_label,
     apply_snapshot_to_quote,
     create_before_restore_version,
+    load_version_snapshot,
+    snapshot_columns,
+    snapshot_hash,
+    version_content_hash,
     VERSION_TYPE_MANUAL
 )
 
@@ -58,88 +71,115 @@ def _date_str(v):
     return v.isoformat() if isinstance(v, dt_date) else (v or None)
 
 
-def _days_count(q):
-    """Calcule le nombre de jours à partir de la liste des jours ou de la différence de dates."""
-    if q.days:
-        return len(q.days)
-    # sinon on tombe sur le diff de dates inclusif
-    try:
-        d0 = q.start_date if isinstance(q.start_date, dt_date) else dt_date.fromisoformat(q.start_date)
-        d1 = q.end_date   if isinstance(q.end_date,   dt_date) else dt_date.fromisoformat(q.end_date)
-        return max(0, (d1 - d0).days + 1)
-    except Exception:
-        return 0
+def _format_version(updated_at: Optional[datetime]) -> Optional[str]:
+    if updated_at is None:
+        return None
+    return updated_at.replace(tzinfo=None).isoformat()
 
 
-def compute_onspot(q):
-    """Calcule le montant Onspot avec minimum 3 jours par carte."""
-    pax = q.pax or 0
-    cards = max(1, math.ceil((pax or 1) / 6))
-    trip_days = _days_count(q)
-    effective_days = max(trip_days, 3)  # **minimum 3 jours par carte**
-    auto_val = cards * 9 * effective_days
-    return q.onspot_manual if q.onspot_manual is not None else Decimal(str(auto_val))
+def _version_token(q: Quote) -> Optional[str]:
+    """Optimistic concurrency token of a quote (its updated_at, as stored)."""
+    return _format_version(q.updated_at)
 
 
+def _quote_etag(updated_at: Optional[datetime]) -> Optional[str]:
+    """ETag of GET /quotes/{id}: the version token, so it can be sent back as If-Match."""
+    token = _format_version(updated_at)
+    return strong_etag(token) if token else None
 
-def _to_out(q: Quote, db: Optional[Session] = None, include_first_image: bool = False) -> QuoteOut:
 
-    days = []
+def _claim_quote_version(db: Session, q: Quote, token: Optional[str]) -> None:
+    """
+    Reject stale writes: the token must match the current version of the quote.
 
-    # Optional enrichment: prefetch first image URL per service_id in one pass
-    first_img_by_service: Dict[int, str] = {}
-    if include_first_image and db is not None:
-        try:
-            service_ids = []
-            for d in q.days or []:
-                for l in d.lines or []:
-                    if getattr(l, "service_id", None):
-                        service_ids.append(int(l.service_id))
-            # dedupe to limit query
-            service_ids = list({sid for sid in service_ids})
-            if service_ids:
-                imgs = (
-                    db.query(ServiceImage)
-                    .filter(ServiceImage.service_id.in_(service_ids))
-                    .order_by(ServiceImage.service_id.asc(), ServiceImage.id.asc())
-                    .all()
-                )
-                for img in imgs:
-                    sid = getattr(img, "service_id", None)
-                    url = getattr(img, "url", None)
-                    if sid and url and sid not in first_img_by_service:
-                        first_img_by_service[sid] = url
-        except Exception:
-            # Fail silently; exporter will tolerate missing images
-            first_img_by_service = {}
+    The check is done with a conditional UPDATE (WHERE updated_at = <read value>)
+    so two concurrent PATCH requests carrying the same token cannot both win.
+    """
+    if token:
+        # Accept ETag-style values from If-Match: W/"..." or "..."
+        token = token.strip()
+        if token.startswith("W/"):
+            token = token[2:]
+        token = token.strip('"')
+    if not token:
+        raise HTTPException(status_code=428, detail="Missing version token (If-Match header or 'version' field)")
+    if token != _version_token(q):
+        raise HTTPException(status_code=409, detail="Quote was modified elsewhere; reload it before saving")
+    claimed = (
+        db.query(Quote)
+        .filter(Quote.id == q.id, Quote.updated_at == q.updated_at)
+        .update({Quote.updated_at: utcnow()}, synchronize_session=False)
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Quote was modified elsewhere; reload it before saving")
+    db.expire(q, ["updated_at"])
 
-    for d in sorted(q.days, key=lambda x: x.position or 0):
 
-        lines = []
+def _line_to_dict(l: QuoteLine) -> dict:
 
-        for l in sorted(d.lines, key=lambda x: x.position or 0):
-            # Optional first image url per line
-            first_image_url = None
-            if include_first_image and first_img_by_service and getattr(l, "service_id", None):
-                first_image_url = first_img_by_service.get(int(l.service_id))
+    return dict(
 
-            lines.append(dict(
+        id=l.id, position=l.position, service_id=l.service_id, category=l.category,
+
+        title=l.title, supplier_name=l.supplier_name, visibility=l.visibility,
 
-                id=l.id, position=l.position, service_id=l.service_id, category=l.category,
+        achat_eur=float(l.achat_eur) if l.achat_eur is not None else None,
 
-                title=l.title, supplier_name=l.supplier_name, visibility=l.visibility,
+        achat_usd=float(l.achat_usd) if l.achat_usd is not None else None,
 
-                achat_eur=float(l.achat_eur) if l.achat_eur is not None else None,
+        vente_usd=float(l.vente_usd) if l.vente_usd is not None else None,
 
-                achat_usd=float(l.achat_usd) if l.achat_usd is not None else None,
+        fx_rate=float(l.fx_rate) if l.fx_rate is not None else None,
 
-                vente_usd=float(l.vente_usd) if l.vente_usd is not None else None,
+        currency=l.currency, base_net_amount=float(l.base_net_amount) if l.base_net_amount is not None else None,
 
-                fx_rate=float(l.fx_rate) if l.fx_rate is not None else None,
+        raw_json=l.raw_json,
 
-                currency=l.currency, base_net_amount=float(l.base_net_amount) if l.base_net_amount is not None else None,
+    )
 
-                raw_json=l.raw_json,
+
+def load_quote(db: Session, quote_id: int, include_first_image: bool = False) -> Optional[Quote]:
+    """
+    Load a quote with its whole Quote -> QuoteDay -> QuoteLine graph in a fixed
+    number of queries (one per level, whatever the number of days/lines).
+
+    With include_first_image, the catalog images of the linked services are
+    fetched in the same pass (used by _to_out(..., include_first_image=True)).
+    Every read path (API, exports, snapshots) should load quotes through here.
+    """
+    lines_opt = selectinload(Quote.days).selectinload(QuoteDay.lines)
+    if include_first_image:
+        lines_opt = lines_opt.selectinload(QuoteLine.service_images)
+    return db.query(Quote).options(lines_opt).filter(Quote.id == quote_id).first()
+
+
+def load_quotes(db: Session, quote_ids: List[int]) -> List[Quote]:
+    """
+    Load several quotes with their days and lines in the same fixed number of
+    queries as load_quote (one per level for the whole list), in quote_ids order.
+    """
+    lines_opt = selectinload(Quote.days).selectinload(QuoteDay.lines)
+    by_id = {q.id: q for q in db.query(Quote).options(lines_opt).filter(Quote.id.in_(quote_ids))}
+    return [by_id[i] for i in quote_ids if i in by_id]
+
+
+def _to_out(q: Quote, db: Optional[Session] = None, include_first_image: bool = False) -> QuoteOut:
+
+    days = []
+
+    for d in sorted(q.days, key=lambda x: x.position or 0):
+
+        lines = []
+
+        for l in sorted(d.lines, key=lambda x: x.position or 0):
+            # Optional first image url per line (service_images is eager-loaded by load_quote)
+            first_image_url = None
+            if include_first_image and l.service_id and l.service_images:
+                first_image_url = l.service_images[0].url
+
+            lines.append(dict(
+
+                _line_to_dict(l),
 
                 **({"first_image_url": first_image_url} if include_first_image else {})
 
@@ -193,62 +233,160 @@ def _to_out(q: Quote, db: Optional[Session] = None, include_first_image: bool =
 
         grand_total=float(q.grand_total) if q.grand_total is not None else None,
 
+        version=_version_token(q),
+
     )
 
 
 
-def _upd_line(l: QuoteLine, li):
+# --------- Fast serialization path ----------
+# GET/PUT/POST responses and version snapshots go straight from ORM rows to JSON
+# bytes: no QuoteOut construction/validation and no per-field float() calls
+# (Decimals are converted by the JSON encoder). The shape is identical to QuoteOut.
 
-    l.service_id = li.service_id
+def _json_default(v):
 
-    l.category = li.category
+    if isinstance(v, Decimal):
 
-    l.title = li.title
+        return float(v)
 
-    l.supplier_name = li.supplier_name
+    if isinstance(v, (dt_date, datetime)):
 
-    l.visibility = li.visibility or "client"
+        return v.isoformat()
 
-    l.achat_eur = Decimal(str(li.achat_eur)) if li.achat_eur is not None else None
+    raise TypeError(f"Object of type {type(v).__name__} is not JSON serializable")
 
-    l.achat_usd = Decimal(str(li.achat_usd)) if li.achat_usd is not None else None
 
-    l.vente_usd = Decimal(str(li.vente_usd)) if li.vente_usd is not None else None
+_PLAIN_LINE_FIELDS = (
+    "id", "position", "service_id", "category", "title", "supplier_name", "visibility",
+    "achat_eur", "achat_usd", "vente_usd", "fx_rate", "currency", "base_net_amount", "raw_json",
+)
 
-    # Preserve raw_json first to check for buff_pct
-    raw_json = li.raw_json if li.raw_json is not None else {}
-    
-    # Check if buff_pct is present - if so, don't auto-recalculate FX
-    has_buff_pct = raw_json and isinstance(raw_json, dict) and raw_json.get("buff_pct") is not None
-    
-    # compute fx if both provided (>0) AND no buff_pct is present
-    # If buff_pct is present, preserve the fx_rate from input (or existing value)
-    if has_buff_pct:
-        # Preserve fx_rate from input if provided, otherwise keep existing
-        if li.fx_rate is not None:
-            l.fx_rate = Decimal(str(li.fx_rate)).quantize(Decimal("0.000001"))
-        # else: keep existing fx_rate (don't overwrite)
-    elif l.achat_eur and l.achat_usd and l.achat_usd != 0:
-        # Only auto-calculate FX if no buff_pct and both values provided
-        l.fx_rate = (l.achat_eur / l.achat_usd).quantize(Decimal("0.000001"))
-    else:
-        # Use fx_rate from input if provided, otherwise None
-        if li.fx_rate is not None:
-            l.fx_rate = Decimal(str(li.fx_rate)).quantize(Decimal("0.000001"))
-        else:
-            l.fx_rate = None
+_PLAIN_LINE_DECIMALS = ("achat_eur", "achat_usd", "vente_usd", "fx_rate", "base_net_amount")
+
+
+def _line_plain(l: QuoteLine) -> dict:
+
+    # Lecture directe de l'état chargé (évite le descripteur SQLAlchemy par champ);
+    # repli sur getattr si un attribut est expiré / non chargé
+    state = l.__dict__
+
+    try:
+
+        out = {k: state[k] for k in _PLAIN_LINE_FIELDS}
+
+    except KeyError:
+
+        out = {k: getattr(l, k) for k in _PLAIN_LINE_FIELDS}
+
+    for k in _PLAIN_LINE_DECIMALS:
+
+        v = out[k]
+
+        if v is not None:
+
+            out[k] = float(v)
+
+    return out
+
+
+def _to_plain(q: Quote, include_version: bool = True) -> dict:
+
+    days = []
+
+    for d in sorted(q.days, key=lambda x: x.position or 0):
+
+        lines = [_line_plain(l) for l in sorted(d.lines, key=lambda x: x.position or 0)]
+
+        days.append({
+
+            "id": d.id, "position": d.position, "date": _date_str(d.date), "destination": d.destination,
+
+            "decorative_images": (d.decorative_images or []), "lines": lines,
+
+        })
 
-    l.currency = li.currency
+    out = {
 
-    l.base_net_amount = Decimal(str(li.base_net_amount)) if li.base_net_amount is not None else None
+        "id": q.id, "title": q.title,
 
-    # PRESERVE raw_json exactly as received (don't replace with {} if None)
-    # This ensures all fields from frontend are preserved
-    if li.raw_json is not None:
-        l.raw_json = li.raw_json
-    else:
-        l.raw_json = {}
+        "display_title": q.display_title,
 
+        "hero_photo_1": q.hero_photo_1,
+
+        "hero_photo_2": q.hero_photo_2,
+
+        "pax": q.pax,
+
+        "start_date": _date_str(q.start_date), "end_date": _date_str(q.end_date),
+
+        "travel_agency": q.travel_agency,
+        "travel_advisor": q.travel_advisor,
+        "client_name": q.client_name,
+        "fx_rate": q.fx_rate,
+        "internal_note": q.internal_note,
+
+        "days": days,
+
+        # Forcer le fallback pour margin_pct si null (pour d'anciens enregistrements)
+        "margin_pct": q.margin_pct if q.margin_pct is not None else Decimal("0.1627"),
+
+        "onspot_manual": q.onspot_manual,
+
+        "hassle_manual": q.hassle_manual,
+
+        "onspot_total": q.onspot_total,
+
+        "hassle_total": q.hassle_total,
+
+        "commissionable_net": q.commissionable_net,
+
+        "commission_total": q.commission_total,
+
+        "sell_total": q.sell_total,
+
+        "grand_total": q.grand_total,
+
+    }
+
+    if include_version:
+
+        out["version"] = _version_token(q)
+
+    return out
+
+
+def _to_json_bytes(q: Quote, include_version: bool = True) -> bytes:
+
+    return json.dumps(
+
+        _to_plain(q, include_version=include_version),
+
+        default=_json_default, ensure_ascii=False, separators=(",", ":"),
+
+    ).encode("utf-8")
+
+
+def _quote_response(q: Quote) -> Response:
+    """Raw JSON response for a quote (bypasses response_model validation)."""
+    etag = _quote_etag(q.updated_at)
+    return Response(
+        content=_to_json_bytes(q), media_type="application/json",
+        headers=cache_headers(etag) if etag else None,
+    )
+
+
+
+def _hero_pairs(q: Quote) -> list:
+    """Hero image pairs the Word export will stitch for q (global, then per day)."""
+    from ..exports.word.exporter import hero_image_pairs
+    return hero_image_pairs(q)
+
+
+def _prewarm_new_heroes(before: list, q: Quote) -> None:
+    """Queue the background preparation of hero pairs a save added (services/image_prewarm.py)."""
+    from ..services.image_prewarm import enqueue_prewarm, new_pairs
+    enqueue_prewarm(pairs=new_pairs(before, _hero_pairs(q)))
 
 
 @router.post("", response_model=QuoteOut)
@@ -282,27 +420,13 @@ def create_quote(payload: QuoteIn, db: Session = Depends(get_db)):
 
     )
 
-    db.add(q); db.flush()
-
-    for idx, d in enumerate(payload.days or []):
+    db.add(q)
 
-        day = QuoteDay(quote_id=q.id, position=idx, date=_to_date(d.date),
+    sync_quote_days(q, payload.days, db)
 
-                       destination=d.destination, decorative_images=d.decorative_images or [])
-
-        db.add(day); db.flush()
-
-        for li_idx, li in enumerate(d.lines or []):
-            # DEBUG: Log raw_json before saving
-            if li.raw_json and li.category in ("Flight", "Train", "Ferry", "Car Rental", "Trip info"):
-                logger.debug(f"[create_quote] Line {li_idx} ({li.category}): raw_json keys = {list(li.raw_json.keys())}")
-                logger.debug(f"[create_quote] Full raw_json: {li.raw_json}")
-            
-            line = QuoteLine(quote_day_id=day.id, position=li_idx)
-
-            _upd_line(line, li); db.add(line)
+    db.commit()
 
-    db.commit(); db.refresh(q)
+    q = load_quote(db, q.id)
     
     # Create initial automatic version
     try:
@@ -321,7 +445,106 @@ def create_quote(payload: QuoteIn, db: Session = Depends(get_db)):
         logger.warning(f"Failed to create initial version for quote {q.id}: {e}")
         db.rollback()  # Rollback only the version creation attempt
 
-    return _to_out(q)
+    q = load_quote(db, q.id)
+    _prewarm_new_heroes([], q)
+    return _quote_response(q)
+
+
+
+@router.post("/reprice-batch")
+def reprice_batch(payload: QuoteRepriceBatchIn, db: Session = Depends(get_db)):
+    """
+    Recompute the stored totals of many quotes (set-based SQL, bulk writes).
+    Streams one NDJSON progress object per chunk; the last one has done=true.
+    """
+    try:
+        parse_updated_since(payload.updated_since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The stream outlives the request dependency: use a session of its own
+    session = Session(bind=db.get_bind())
+
+    def _progress():
+        try:
+            for progress in reprice_quotes(session, payload.ids, payload.updated_since, payload.travel_agency):
+                yield json.dumps(progress.as_dict()) + "\n"
+        finally:
+            session.close()
+
+    return StreamingResponse(_progress(), media_type="application/x-ndjson")
+
+
+@router.post("/export-batch")
+def export_batch_zip(payload: QuoteExportBatchIn, db: Session = Depends(get_db)):
+    """
+    Export the matching quotes (Word or Excel) into one ZIP, rendered in parallel
+    by worker processes. The ZIP is streamed as the files complete; it ends with
+    export_report.json (files, failed quotes).
+    """
+    from ..services.export_batch import ChunkSink, export_batch
+
+    try:
+        quote_ids = select_quote_ids(db, payload.ids, payload.updated_since, payload.travel_agency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not quote_ids:
+        raise HTTPException(status_code=404, detail="No quote matches the filter")
+
+    # The stream outlives the request dependency: use a session of its own
+    session = Session(bind=db.get_bind())
+    sink = ChunkSink()
+
+    def _zip():
+        try:
+            for progress in export_batch(session, payload.kind, quote_ids, sink):
+                logger.debug(f"[export_batch] {progress.as_dict()}")
+                data = sink.drain()
+                if data:
+                    yield data
+            yield sink.drain()
+        finally:
+            session.close()
+
+    filename = f"quotes_{payload.kind}_{utcnow():%Y%m%d_%H%M}.zip"
+    return StreamingResponse(
+        _zip(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+
+@router.post("/export-consolidated")
+def export_consolidated_excel(payload: QuoteConsolidatedExportIn, db: Session = Depends(get_db)):
+    """
+    Export the matching quotes (e.g. a departure season) into one Excel workbook:
+    a Summary sheet of their stored totals, then one sheet per quote.
+    """
+    from ..exports.excel import build_xlsx_for_quotes
+
+    try:
+        quote_ids = select_quote_ids(
+            db, payload.ids, payload.updated_since, payload.travel_agency,
+            departure_from=payload.departure_from, departure_to=payload.departure_to,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not quote_ids:
+        raise HTTPException(status_code=404, detail="No quote matches the filter")
+
+    buf = spooled_file()
+    try:
+        build_xlsx_for_quotes(db, quote_ids, out=buf)
+    except Exception as e:
+        buf.close()
+        logger.exception(f"ERROR in export_consolidated_excel: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    return file_download(
+        buf,
+        f"quotes_consolidated_{utcnow():%Y%m%d_%H%M}.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
 
 
 
@@ -383,30 +606,67 @@ def search_quotes(
     ]
 
 
+def export_file_name(q: Quote, ext: str) -> str:
+    """Download name of an export: the quote title only (no date), made filesystem-safe."""
+    base_name = q.title or f"quote_{q.id}"
+    # Clean filename: remove invalid characters
+    safe_name = re.sub(r'[<>:"/\\|?*]', '_', base_name)
+    safe_name = safe_name.strip()[:200]  # Limit length
+    return f"{safe_name}.{ext}"
+
+
+def _render_export(db: Session, q: Quote, kind: str, build) -> tuple:
+    """
+    Export file of q (services/export_cache.py): the stored file when the same
+    content was already rendered with the same template, else built into a
+    spooled file by build(db, quote_id, out=...) and stored, unless a Word
+    export is missing photos that could not be downloaded (the next export
+    tries again). Returns (file, artifact key, snapshot); the caller closes the file.
+    """
+    from ..services.export_cache import export_cache_key, get_export_cache
+    from ..services.quote_versioning import build_quote_snapshot, EXPORT_TYPE_WORD
+
+    snapshot = build_quote_snapshot(q, db=db)
+    key = export_cache_key(kind, snapshot)
+    cache = get_export_cache()
+    f = cache.open(key)
+    if f is None:
+        f = spooled_file()
+        progress: Dict[str, int] = {}
+        try:
+            if kind == EXPORT_TYPE_WORD:
+                build(db, q.id, on_progress=progress.update, out=f)
+            else:
+                build(db, q.id, out=f)
+        except Exception:
+            f.close()
+            raise
+        if not progress.get("images_failed"):
+            cache.put(key, f)
+        f.seek(0)
+    return f, key, snapshot
+
+
 @router.get("/{quote_id}/export/word")
 def export_quote_word(quote_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Export a quote to Word format (.docx).
-    Returns the Word document as a downloadable file.
+    Returns the Word document as a downloadable file (served from the export
+    cache when the quote has not changed since it was last rendered).
     Automatically creates a version after successful export.
     """
     # Import here to avoid circular import
     from ..exports.word import build_docx_for_quote
     from ..services.quote_versioning import create_auto_version, VERSION_TYPE_AUTO_EXPORT_WORD, EXPORT_TYPE_WORD
-    import re
     
-    q = db.query(Quote).filter(Quote.id == quote_id).first()
+    q = load_quote(db, quote_id, include_first_image=True)
     if not q:
         raise HTTPException(status_code=404, detail="Quote not found")
     
+    buf = None
     try:
-        buf = build_docx_for_quote(db, quote_id)
-        # Generate filename from quote title only (no date)
-        base_name = q.title or f"quote_{quote_id}"
-        # Clean filename: remove invalid characters
-        safe_name = re.sub(r'[<>:"/\\|?*]', '_', base_name)
-        safe_name = safe_name.strip()[:200]  # Limit length
-        filename = f"{safe_name}.docx"
+        buf, artifact, snapshot = _render_export(db, q, EXPORT_TYPE_WORD, build_docx_for_quote)
+        filename = export_file_name(q, "docx")
         
         # Create automatic version after successful export
         try:
@@ -419,7 +679,9 @@ def export_quote_word(quote_id: int, request: Request, db: Session = Depends(get
                 db=db,
                 created_by=created_by,
                 export_type=EXPORT_TYPE_WORD,
-                export_file_name=filename
+                export_file_name=filename,
+                export_artifact=artifact,
+                snapshot_json=snapshot,
             )
             db.commit()
         except Exception as e:
@@ -427,14 +689,16 @@ def export_quote_word(quote_id: int, request: Request, db: Session = Depends(get
             logger.warning(f"Failed to create auto version after Word export for quote {quote_id}: {e}")
             db.rollback()
         
-        return Response(
-            content=buf.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        return file_download(
+            buf, filename, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
         )
     except ValueError as e:
+        if buf is not None:
+            buf.close()
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
+        if buf is not None:
+            buf.close()
         import traceback
         error_detail = traceback.format_exc()
         logger.error(f"ERROR in export_quote_word: {e}\n{error_detail}")
@@ -450,25 +714,21 @@ def export_quote_excel(
 ):
     """
     Export a quote to Excel format (.xlsx).
-    Returns the Excel file as a downloadable file.
+    Returns the Excel file as a downloadable file (served from the export cache
+    when the quote has not changed since it was last rendered).
     Optionally creates a version if create_version=true.
     """
     from ..exports.excel import build_xlsx_for_quote
     from ..services.quote_versioning import create_auto_version, VERSION_TYPE_AUTO_EXPORT_EXCEL, EXPORT_TYPE_EXCEL
-    import re
     
-    q = db.query(Quote).filter(Quote.id == quote_id).first()
+    q = load_quote(db, quote_id)
     if not q:
         raise HTTPException(status_code=404, detail="Quote not found")
     
+    buf = None
     try:
-        buf = build_xlsx_for_quote(db, quote_id)
-        # Generate filename from quote title only (no date)
-        base_name = q.title or f"quote_{quote_id}"
-        # Clean filename: remove invalid characters
-        safe_name = re.sub(r'[<>:"/\\|?*]', '_', base_name)
-        safe_name = safe_name.strip()[:200]  # Limit length
-        filename = f"{safe_name}.xlsx"
+        buf, artifact, snapshot = _render_export(db, q, EXPORT_TYPE_EXCEL, build_xlsx_for_quote)
+        filename = export_file_name(q, "xlsx")
         
         # Create automatic version if requested
         if create_version:
@@ -482,7 +742,9 @@ def export_quote_excel(
                     db=db,
                     created_by=created_by,
                     export_type=EXPORT_TYPE_EXCEL,
-                    export_file_name=filename
+                    export_file_name=filename,
+                    export_artifact=artifact,
+                    snapshot_json=snapshot,
                 )
                 db.commit()
             except Exception as e:
@@ -490,14 +752,16 @@ def export_quote_excel(
                 logger.warning(f"Failed to create auto version after Excel export for quote {quote_id}: {e}")
                 db.rollback()
         
-        return Response(
-            content=buf.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        return file_download(
+            buf, filename, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     except ValueError as e:
+        if buf is not None:
+            buf.close()
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
+        if buf is not None:
+            buf.close()
         import traceback
         error_detail = traceback.format_exc()
         logger.error(f"ERROR in export_quote_excel: {e}\n{error_detail}")
@@ -506,14 +770,31 @@ def export_quote_excel(
 
 @router.get("/{quote_id}", response_model=QuoteOut)
 
-def get_quote(quote_id: int, db: Session = Depends(get_db)):
+def get_quote(
+    quote_id: int,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+):
+
+    # Validateur d'abord (une seule colonne) : 304 sans charger ni sérialiser le devis
+    if if_none_match:
+
+        row = db.query(Quote.updated_at).filter(Quote.id == quote_id).first()
+
+        if not row: raise HTTPException(status_code=404, detail="Quote not found")
+
+        etag = _quote_etag(row.updated_at)
 
-    q = db.query(Quote).filter(Quote.id==quote_id).first()
+        if etag and etag_matches(if_none_match, etag):
+
+            return not_modified(etag)
+
+    q = load_quote(db, quote_id)
 
     if not q: raise HTTPException(status_code=404, detail="Quote not found")
 
     # Preserve current API shape: do NOT include first_image_url here
-    return _to_out(q, db=None, include_first_image=False)
+    return _quote_response(q)
 
 
 
@@ -521,12 +802,14 @@ def get_quote(quote_id: int, db: Session = Depends(get_db)):
 
 def upsert_quote(quote_id: int, payload: QuoteIn, db: Session = Depends(get_db)):
 
-    q = db.query(Quote).filter(Quote.id==quote_id).first()
+    q = load_quote(db, quote_id)
 
     if not q:
 
         q = Quote(id=quote_id); db.add(q); db.flush()
 
+    heroes_before = _hero_pairs(q)
+
     q.title = payload.title
 
     # Header fields
@@ -562,104 +845,163 @@ def upsert_quote(quote_id: int, payload: QuoteIn, db: Session = Depends(get_db))
 
 
 
-    # replace days/lines
+    # reconcile days/lines with the stored rows (only real changes are written)
 
-    for d in list(q.days): db.delete(d)
+    summary = sync_quote_days(q, payload.days, db)
 
-    db.flush()
+    if summary.changed:
 
-    for idx, d in enumerate(payload.days or []):
+        db.commit()
 
-        day = QuoteDay(quote_id=q.id, position=idx, date=_to_date(d.date),
+        q = load_quote(db, quote_id)
 
-                       destination=d.destination, decorative_images=d.decorative_images or [])
+        _prewarm_new_heroes(heroes_before, q)
 
-        db.add(day); db.flush()
+    return _quote_response(q)
 
-        for li_idx, li in enumerate(d.lines or []):
-            # DEBUG: Log raw_json before saving
-            if li.raw_json and li.category in ("Flight", "Train", "Ferry", "Car Rental", "Trip info"):
-                logger.debug(f"[upsert_quote] Line {li_idx} ({li.category}): raw_json keys = {list(li.raw_json.keys())}")
-                logger.debug(f"[upsert_quote] Full raw_json: {li.raw_json}")
-            
-            line = QuoteLine(quote_day_id=day.id, position=li_idx)
 
-            _upd_line(line, li); db.add(line)
 
+# --------- Field-targeted PATCH endpoints (optimistic concurrency) ----------
 
+_HEADER_DECIMALS = ("fx_rate", "margin_pct", "onspot_manual", "hassle_manual")
+
+
+def _day_fields_out(d: QuoteDay) -> QuoteDayFieldsOut:
+    return QuoteDayFieldsOut(
+        id=d.id, position=d.position, date=_date_str(d.date),
+        destination=d.destination, decorative_images=(d.decorative_images or []),
+    )
+
+
+@router.patch("/{quote_id}", response_model=QuotePatchOut)
+def patch_quote_header(
+    quote_id: int,
+    payload: QuoteHeaderPatch,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Update only the header fields present in the payload.
+    Requires the current version token (body 'version' or If-Match header).
+    """
+    q = load_quote(db, quote_id)
+    if not q:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    _claim_quote_version(db, q, payload.version or if_match)
+    heroes_before = _hero_pairs(q)
+
+    changes = payload.model_dump(exclude_unset=True, exclude={"version"})
+    changed = {}
+    for field, value in changes.items():
+        if field == "margin_pct" and value is None:
+            continue  # NOT NULL column: keep the stored margin
+        if field in ("start_date", "end_date"):
+            new_value = _to_date(value)
+        elif field in _HEADER_DECIMALS:
+            new_value = Decimal(str(value)) if value is not None else None
+        else:
+            new_value = value
+        if getattr(q, field) != new_value:
+            setattr(q, field, new_value)
+            changed[field] = value
+
+    # pax, margin, manual Onspot/Hassle or dates may move the stored totals
+    apply_totals(q)
 
     db.commit(); db.refresh(q)
-    
-    # DEBUG: Log what we're returning
-    result = _to_out(q)
-    for day in (result.days or []):
-        for line in (day.lines or []):
-            if line.category in ("Flight", "Train", "Ferry", "Car Rental", "Trip info"):
-                logger.debug(f"[upsert_quote] Returning line ({line.category}): raw_json keys = {list(line.raw_json.keys()) if line.raw_json else []}")
-    
-    return result
+    if "hero_photo_1" in changed or "hero_photo_2" in changed:
+        _prewarm_new_heroes(heroes_before, q)
 
+    return QuotePatchOut(quote_id=q.id, version=_version_token(q), quote=changed)
 
 
-# --------- Reprice endpoint (applies your business rules) ----------
+@router.patch("/{quote_id}/days/{day_id}", response_model=QuotePatchOut)
+def patch_quote_day(
+    quote_id: int,
+    day_id: int,
+    payload: QuoteDayPatch,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Update only the fields present in the payload on a single day."""
+    q = db.query(Quote).filter(Quote.id == quote_id).first()
+    if not q:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    day = db.query(QuoteDay).filter(QuoteDay.id == day_id, QuoteDay.quote_id == quote_id).first()
+    if not day:
+        raise HTTPException(status_code=404, detail=f"Day with ID {day_id} not found in quote {quote_id}")
+    _claim_quote_version(db, q, payload.version or if_match)
+
+    changes = payload.model_dump(exclude_unset=True, exclude={"version"})
+    if "date" in changes:
+        changes["date"] = _to_date(changes["date"])
+    heroes_before = _hero_pairs(q) if "decorative_images" in changes else None
+    if "decorative_images" in changes:
+        changes["decorative_images"] = changes["decorative_images"] or []
+    for field, value in changes.items():
+        setattr(day, field, value)
 
-@router.post("/{quote_id}/reprice")
-async def reprice_quote(quote_id: int, db: Session = Depends(get_db)):
-    import math
-    from datetime import date
+    db.commit(); db.refresh(q)
+    if heroes_before is not None:
+        _prewarm_new_heroes(heroes_before, q)
 
-    def _to_date(v):
-        if not v: return None
-        if isinstance(v, date): return v
-        try: return date.fromisoformat(str(v))
-        except: return None
+    return QuotePatchOut(quote_id=q.id, version=_version_token(q), days=[_day_fields_out(day)])
 
+
+@router.patch("/{quote_id}/lines/{line_id}", response_model=QuotePatchOut)
+def patch_quote_line(
+    quote_id: int,
+    line_id: int,
+    payload: QuoteLinePatch,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Update only the fields present in the payload on a single line.
+    FX derivation follows the same rules as a full save.
+    """
     q = db.query(Quote).filter(Quote.id == quote_id).first()
     if not q:
         raise HTTPException(status_code=404, detail="Quote not found")
+    line = (
+        db.query(QuoteLine)
+        .join(QuoteDay, QuoteLine.quote_day_id == QuoteDay.id)
+        .filter(QuoteLine.id == line_id, QuoteDay.quote_id == quote_id)
+        .first()
+    )
+    if not line:
+        raise HTTPException(status_code=404, detail=f"Line with ID {line_id} not found in quote {quote_id}")
+    _claim_quote_version(db, q, payload.version or if_match)
+
+    # Merge the patch over the stored line, then apply the regular line rules
+    current = _line_to_dict(line)
+    current.update(payload.model_dump(exclude_unset=True, exclude={"version"}))
+    values = line_values(QuoteLineIn(**current), current_fx=line.fx_rate)
+    before = line_contribution(line)
+    for field, value in values.items():
+        if getattr(line, field) != value:
+            setattr(line, field, value)
+    # Only this line changed: adjust the stored totals without loading the others
+    apply_line_delta(q, before, line_contribution(line))
+
+    db.commit(); db.refresh(q); db.refresh(line)
+
+    return QuotePatchOut(quote_id=q.id, version=_version_token(q), lines=[_line_to_dict(line)])
 
-    # Compute onspot using new logic
-    onspot_total = compute_onspot(q)
-    
-    # Calculate total_days and cards for response
-    total_days = _days_count(q)
-    pax = q.pax or 0
-    cards = max(1, math.ceil((pax or 1) / 6))
-
-    hassle_auto = pax * 150
-    hassle_total = float(q.hassle_manual) if q.hassle_manual is not None else hassle_auto
-
-    # paid lines only
-    paid_lines = []
-    for d in q.days:
-        for l in d.lines:
-            c = (l.category or "").lower()
-            if c in ("trip info","internal"): 
-                continue
-            paid_lines.append(l)
-
-    achats_sum = sum(float(l.achat_usd or 0) for l in paid_lines)
-    ventes_sum = sum(float(l.vente_usd or 0) for l in paid_lines)
-
-    achats_total = round(float(onspot_total) + achats_sum, 2)
-    margin = float(q.margin_pct) if q.margin_pct is not None else 0.1627
-    commission_total = round(achats_total * margin, 2)
-    ventes_total = round(ventes_sum + hassle_total, 2)
-    grand_total = round(achats_total + commission_total + ventes_total, 2)
-
-    return {
-        "quote_id": q.id,
-        "pax": pax,
-        "days": total_days,
-        "onspot_cards": cards,
-        "margin_pct": margin,
-        "onspot_total": float(onspot_total),
-        "hassle_total": hassle_total,
-        "achats_total": achats_total,
-        "commission_total": commission_total,
-        "ventes_total": ventes_total,
-        "grand_total": grand_total
-    }
+
+# --------- Reprice endpoint (applies your business rules) ----------
+
+@router.post("/{quote_id}/reprice")
+def reprice_quote(quote_id: int, db: Session = Depends(get_db)):
+    """
+    Totals of a quote. They are maintained by the pricing engine on every write
+    (services/quote_pricing.py), so this is a read of the stored columns.
+    """
+    q = db.query(Quote).filter(Quote.id == quote_id).first()
+    if not q:
+        raise HTTPException(status_code=404, detail="Quote not found")
+
+    return stored_totals(q).as_response(q.id)
 
 
 @router.patch("/{quote_id}/days", response_model=List[QuoteDayOut])
@@ -754,6 +1096,10 @@ def patch_days_by_range(
                 logger.error(f"ERROR updating day {day.id}: {e}")
                 raise
         
+        if payload.overwrite and updated_days:
+            # Day edits change the quote representation: move its version/ETag
+            q.updated_at = utcnow()
+
         db.commit()
         
         # Refresh and return as QuoteDayOut
@@ -762,16 +1108,7 @@ def patch_days_by_range(
             db.refresh(day)
             lines = []
             for l in sorted(day.lines, key=lambda x: x.position or 0):
-                lines.append(dict(
-                    id=l.id, position=l.position, service_id=l.service_id, category=l.category,
-                    title=l.title, supplier_name=l.supplier_name, visibility=l.visibility,
-                    achat_eur=float(l.achat_eur) if l.achat_eur is not None else None,
-                    achat_usd=float(l.achat_usd) if l.achat_usd is not None else None,
-                    vente_usd=float(l.vente_usd) if l.vente_usd is not None else None,
-                    fx_rate=float(l.fx_rate) if l.fx_rate is not None else None,
-                    currency=l.currency, base_net_amount=float(l.base_net_amount) if l.base_net_amount is not None else None,
-                    raw_json=l.raw_json
-                ))
+                lines.append(_line_to_dict(l))
             result.append(QuoteDayOut(
                 id=day.id,
                 position=day.position,
@@ -795,19 +1132,41 @@ def patch_days_by_range(
 @router.get("/{quote_id}/versions", response_model=QuoteVersionListOut)
 def list_quote_versions(
     quote_id: int,
+    response: Response,
     limit: int = Query(10, ge=1, le=100, description="Number of versions per page"),
     offset: int = Query(0, ge=0, description="Offset for pagination"),
     include_archived: bool = Query(False, description="Include archived versions"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     List versions for a quote (paginated, sorted by newest first).
     By default, excludes archived versions.
+
+    The ETag hashes every field a listed version returns (not the snapshots), so
+    a matching If-None-Match gets a 304 before the page is loaded.
     """
     # Verify quote exists
-    quote = db.query(Quote).filter(Quote.id == quote_id).first()
+    quote = db.query(Quote.id).filter(Quote.id == quote_id).first()
     if not quote:
         raise HTTPException(status_code=404, detail="Quote not found")
+
+    fingerprint = (
+        db.query(
+            # Every column of QuoteVersionOut: export_artifact is rewritten on re-export
+            QuoteVersion.id, QuoteVersion.label, QuoteVersion.comment,
+            QuoteVersion.created_at, QuoteVersion.created_by, QuoteVersion.type,
+            QuoteVersion.export_type, QuoteVersion.export_file_name, QuoteVersion.export_artifact,
+            QuoteVersion.total_price, QuoteVersion.archived_at,
+        )
+        .filter(QuoteVersion.quote_id == quote_id)
+        .order_by(QuoteVersion.id)
+        .all()
+    )
+    etag = hashed_etag(quote_id, limit, offset, include_archived, [tuple(r) for r in fingerprint])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
     
     # Build query
     query = db.query(QuoteVersion).filter(QuoteVersion.quote_id == quote_id)
@@ -816,8 +1175,8 @@ def list_quote_versions(
     if not include_archived:
         query = query.filter(QuoteVersion.archived_at.is_(None))
     
-    # Get total count
-    total = query.count()
+    # Get total count (a plain COUNT: query.count() would select every column in a subquery)
+    total = query.with_entities(func.count(QuoteVersion.id)).scalar()
     
     # Get paginated results (newest first)
     versions = (
@@ -841,6 +1200,7 @@ def list_quote_versions(
             type=v.type,
             export_type=v.export_type,
             export_file_name=v.export_file_name,
+            export_artifact=v.export_artifact,
             total_price=float(v.total_price) if v.total_price is not None else None,
             archived_at=v.archived_at.isoformat() if v.archived_at else None
         ))
@@ -892,10 +1252,116 @@ def get_quote_version(
         type=version.type,
         export_type=version.export_type,
         export_file_name=version.export_file_name,
+        export_artifact=version.export_artifact,
         total_price=float(version.total_price) if version.total_price is not None else None,
         archived_at=version.archived_at.isoformat() if version.archived_at else None,
-        snapshot_json=version.snapshot_json or {}
+        snapshot_json=load_version_snapshot(db, version)
+    )
+
+
+@router.get("/{quote_id}/versions/{version_id}/export")
+def download_version_export(quote_id: int, version_id: int, db: Session = Depends(get_db)):
+    """
+    Download the file exported with a version (auto export versions), as long
+    as it is still in the export cache: 404 if the version has no export file,
+    410 once it has been evicted (export the quote again instead).
+    """
+    from ..services.export_cache import get_export_cache
+    from ..services.export_jobs import MEDIA_TYPES
+
+    version = (
+        db.query(QuoteVersion)
+        .filter(QuoteVersion.id == version_id, QuoteVersion.quote_id == quote_id)
+        .first()
+    )
+    if not version:
+        raise HTTPException(status_code=404, detail="Version not found")
+    if not version.export_artifact or version.export_type not in MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="No export file for this version")
+    f = get_export_cache().open(version.export_artifact)
+    if f is None:
+        raise HTTPException(status_code=410, detail="Export file no longer available")
+    return file_download(f, version.export_file_name or f"quote_{quote_id}", MEDIA_TYPES[version.export_type])
+
+
+@router.get("/{quote_id}/versions/{version_id}/changed", response_model=QuoteVersionChangedOut)
+def quote_changed_since_version(quote_id: int, version_id: int, db: Session = Depends(get_db)):
+    """
+    Has the quote changed since a version? Compares the content hash of the
+    current quote with the one stored on the version (no snapshot is rebuilt
+    or compared).
+    """
+    quote = load_quote(db, quote_id)
+    if not quote:
+        raise HTTPException(status_code=404, detail="Quote not found")
+
+    version = (
+        db.query(QuoteVersion)
+        .filter(QuoteVersion.id == version_id, QuoteVersion.quote_id == quote_id)
+        .first()
+    )
+    if not version:
+        raise HTTPException(status_code=404, detail="Version not found")
+
+    version_hash = version_content_hash(db, version)
+    current_hash = snapshot_hash(build_quote_snapshot(quote, db=db))
+    return QuoteVersionChangedOut(
+        version_id=version.id,
+        label=version.label,
+        changed=current_hash != version_hash,
+        version_hash=version_hash,
+        current_hash=current_hash,
+    )
+
+
+def _quote_version_or_404(db: Session, quote_id: int, version_id: int) -> QuoteVersion:
+    version = (
+        db.query(QuoteVersion)
+        .filter(QuoteVersion.id == version_id, QuoteVersion.quote_id == quote_id)
+        .first()
+    )
+    if not version:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return version
+
+
+@router.get("/{quote_id}/versions/{version_id}/diff/current", response_model=QuoteVersionDiffOut)
+def diff_version_with_current(quote_id: int, version_id: int, db: Session = Depends(get_db)):
+    """
+    Diff from a version to the current state of the quote (same format as
+    /versions/{version_id}/diff/{other_id}).
+    """
+    quote = load_quote(db, quote_id)
+    if not quote:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    version = _quote_version_or_404(db, quote_id, version_id)
+
+    snapshot = build_quote_snapshot(quote, db=db)
+    diff = get_diff_cache().get_or_compute(
+        (version_content_hash(db, version), snapshot_hash(snapshot)),
+        lambda: diff_snapshots(load_version_snapshot(db, version), snapshot),
     )
+    return QuoteVersionDiffOut(quote_id=quote_id, from_version_id=version.id, **diff)
+
+
+@router.get("/{quote_id}/versions/{version_id}/diff/{other_id}", response_model=QuoteVersionDiffOut)
+def diff_quote_versions(quote_id: int, version_id: int, other_id: int, db: Session = Depends(get_db)):
+    """
+    Diff from version version_id to version other_id, computed server-side:
+    the quote fields, days and lines that changed, and the grand total delta
+    (services/version_diff.py). Only the changes are returned, never the
+    snapshots. Diffs are cached by the content hashes of the two versions.
+    """
+    if not db.query(Quote.id).filter(Quote.id == quote_id).first():
+        raise HTTPException(status_code=404, detail="Quote not found")
+    old = _quote_version_or_404(db, quote_id, version_id)
+    new = _quote_version_or_404(db, quote_id, other_id)
+
+    diff = get_diff_cache().get_or_compute(
+        (version_content_hash(db, old), version_content_hash(db, new)),
+        lambda: diff_snapshots(load_version_snapshot(db, old), load_version_snapshot(db, new)),
+    )
+    return QuoteVersionDiffOut(quote_id=quote_id, from_version_id=old.id, to_version_id=new.id, **diff)
 
 
 @router.post("/{quote_id}/versions", response_model=QuoteVersionOut)
@@ -910,7 +1376,7 @@ def create_quote_version(
     Requires a comment and creates a full snapshot of the current quote state.
     """
     # Verify quote exists
-    quote = db.query(Quote).filter(Quote.id == quote_id).first()
+    quote = load_quote(db, quote_id)
     if not quote:
         raise HTTPException(status_code=404, detail="Quote not found")
     
@@ -925,8 +1391,8 @@ def create_quote_version(
     # Compute total price
     total_price = compute_total_price(quote)
     
-    # Get next version label
-    label = get_next_version_label(db, quote_id)
+    # Allocate the next version label
+    label = allocate_version_label(db, quote_id)
     
     # Create version
     version = QuoteVersion(
@@ -936,7 +1402,7 @@ def create_quote_version(
         created_by=created_by,
         type=VERSION_TYPE_MANUAL,
         total_price=Decimal(str(total_price)) if total_price is not None else None,
-        snapshot_json=snapshot_json
+        **snapshot_columns(db, quote_id, snapshot_json)
     )
     
     db.add(version)
@@ -954,6 +1420,7 @@ def create_quote_version(
         type=version.type,
         export_type=version.export_type,
         export_file_name=version.export_file_name,
+        export_artifact=version.export_artifact,
         total_price=float(version.total_price) if version.total_price is not None else None,
         archived_at=version.archived_at.isoformat() if version.archived_at else None
     )
@@ -989,6 +1456,17 @@ def update_quote_version(
     
     # Update fields if provided
     if payload.label is not None:
+        taken = (
+            db.query(QuoteVersion.id)
+            .filter(
+                QuoteVersion.quote_id == quote_id,
+                QuoteVersion.label == payload.label,
+                QuoteVersion.id != version_id
+            )
+            .first()
+        )
+        if taken:
+            raise HTTPException(status_code=409, detail="Label already used by another version of this quote")
         version.label = payload.label
     if payload.comment is not None:
         version.comment = payload.comment
@@ -1007,6 +1485,7 @@ def update_quote_version(
         type=version.type,
         export_type=version.export_type,
         export_file_name=version.export_file_name,
+        export_artifact=version.export_artifact,
         total_price=float(version.total_price) if version.total_price is not None else None,
         archived_at=version.archived_at.isoformat() if version.archived_at else None
     )
@@ -1058,6 +1537,7 @@ def archive_quote_version(
         type=version.type,
         export_type=version.export_type,
         export_file_name=version.export_file_name,
+        export_artifact=version.export_artifact,
         total_price=float(version.total_price) if version.total_price is not None else None,
         archived_at=version.archived_at.isoformat() if version.archived_at else None
     )
@@ -1081,7 +1561,7 @@ def restore_quote_version(
     The "before restore" version ensures you can always undo the restore.
     """
     # Verify quote exists
-    quote = db.query(Quote).filter(Quote.id == quote_id).first()
+    quote = load_quote(db, quote_id)
     if not quote:
         raise HTTPException(status_code=404, detail="Quote not found")
     
@@ -1112,7 +1592,7 @@ def restore_quote_version(
     )
     
     # Step 2: Apply snapshot to quote
-    snapshot_json = version.snapshot_json or {}
+    snapshot_json = load_version_snapshot(db, version)
     if not snapshot_json:
         raise HTTPException(status_code=400, detail="Version snapshot is empty or invalid")
     
@@ -1120,8 +1600,7 @@ def restore_quote_version(
     
     # Commit all changes
     db.commit()
-    db.refresh(quote)
     
     # Return restored quote
-    return _to_out(quote, db=db, include_first_image=False)
+    return _quote_response(load_quote(db, quote_id))
 
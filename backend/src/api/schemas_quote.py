@@ -1,11 +1,14 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from datetime import date
-from pydantic import BaseModel, conint, constr
+from pydantic import BaseModel, conint, constr, field_validator
 
 
 
 class QuoteLineIn(BaseModel):
 
+    # Existing line id (optional): lets the save reuse the row even if it moved
+    id: Optional[int] = None
+
     position: Optional[int] = None
 
     service_id: Optional[int] = None
@@ -40,6 +43,9 @@ class QuoteLineIn(BaseModel):
 
 class QuoteDayIn(BaseModel):
 
+    # Existing day id (optional): lets the save reuse the row even if it moved
+    id: Optional[int] = None
+
     position: Optional[int] = None
 
     date: Optional[str] = None
@@ -192,6 +198,9 @@ class QuoteOut(BaseModel):
 
     grand_total: Optional[float] = None
 
+    # optimistic concurrency token (derived from updated_at), sent back on PATCH
+    version: Optional[str] = None
+
 
 class DestinationRangePatch(BaseModel):
     start_date: Optional[str] = None  # Accept ISO string, will be converted to date in endpoint
@@ -202,6 +211,80 @@ class DestinationRangePatch(BaseModel):
 
 
 
+# Field-targeted PATCH schemas (only the fields sent are applied)
+
+class QuoteHeaderPatch(BaseModel):
+    """Partial update of quote header fields."""
+    version: Optional[str] = None  # token from QuoteOut.version (or If-Match header)
+    title: Optional[str] = None
+    display_title: Optional[str] = None
+    hero_photo_1: Optional[str] = None
+    hero_photo_2: Optional[str] = None
+    pax: Optional[int] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    travel_agency: Optional[str] = None
+    travel_advisor: Optional[str] = None
+    client_name: Optional[str] = None
+    fx_rate: Optional[float] = None
+    internal_note: Optional[str] = None
+    margin_pct: Optional[float] = None
+    onspot_manual: Optional[float] = None
+    hassle_manual: Optional[float] = None
+
+
+class QuoteDayPatch(BaseModel):
+    """Partial update of a single day (lines are patched separately)."""
+    version: Optional[str] = None
+    date: Optional[str] = None
+    destination: Optional[str] = None
+    decorative_images: Optional[list] = None
+
+
+class QuoteLinePatch(BaseModel):
+    """Partial update of a single line."""
+    version: Optional[str] = None
+    service_id: Optional[int] = None
+    category: Optional[str] = None
+    title: Optional[str] = None
+    supplier_name: Optional[str] = None
+    visibility: Optional[str] = None
+    achat_eur: Optional[float] = None
+    achat_usd: Optional[float] = None
+    vente_usd: Optional[float] = None
+    fx_rate: Optional[float] = None
+    currency: Optional[str] = None
+    base_net_amount: Optional[float] = None
+    raw_json: Optional[dict] = None
+
+    @field_validator("title")
+    @classmethod
+    def _title_not_null(cls, v):
+        # Omit title to keep it; an explicit null would violate quote_lines.title NOT NULL
+        if v is None:
+            raise ValueError("title cannot be null")
+        return v
+
+
+class QuoteDayFieldsOut(BaseModel):
+    """Day fields without its lines."""
+    id: int
+    position: Optional[int] = None
+    date: Optional[str] = None
+    destination: Optional[str] = None
+    decorative_images: Optional[list] = None
+
+
+class QuotePatchOut(BaseModel):
+    """Result of a PATCH: new version token and only the entities that changed."""
+    quote_id: int
+    version: str
+    quote: Optional[dict] = None  # changed header fields
+    days: List[QuoteDayFieldsOut] = []
+    lines: List[QuoteLineOut] = []
+
+
+
 # QuoteVersion schemas
 
 class QuoteVersionIn(BaseModel):
@@ -209,6 +292,30 @@ class QuoteVersionIn(BaseModel):
     comment: str  # Mandatory for manual versions
 
 
+class QuoteRepriceBatchIn(BaseModel):
+    """Filter of POST /quotes/reprice-batch (all quotes if nothing is set)."""
+    ids: Optional[List[int]] = None
+    updated_since: Optional[str] = None  # ISO date or datetime
+    travel_agency: Optional[str] = None
+
+
+class QuoteExportBatchIn(QuoteRepriceBatchIn):
+    """Body of POST /quotes/export-batch: export kind + the same filter as reprice-batch."""
+    kind: Literal["word", "excel"] = "excel"
+
+
+class QuoteConsolidatedExportIn(QuoteRepriceBatchIn):
+    """Body of POST /quotes/export-consolidated: the reprice-batch filter + a departure range."""
+    departure_from: Optional[str] = None  # ISO date, start_date >= (e.g. first day of the season)
+    departure_to: Optional[str] = None  # ISO date, start_date <=
+
+
+class ExportJobIn(BaseModel):
+    """Body of POST /quotes/{id}/export-jobs."""
+    kind: Literal["word", "excel"] = "word"
+    create_version: bool = True  # auto version once the file is built (the Word endpoint always does)
+
+
 class QuoteVersionPatch(BaseModel):
     """Schema for updating version metadata (label and/or comment)."""
     label: Optional[str] = None
@@ -226,6 +333,7 @@ class QuoteVersionOut(BaseModel):
     type: str
     export_type: Optional[str] = None
     export_file_name: Optional[str] = None
+    export_artifact: Optional[str] = None  # Export cache key of the exported file
     total_price: Optional[float] = None
     archived_at: Optional[str] = None  # ISO format datetime
 
@@ -235,6 +343,62 @@ class QuoteVersionDetailOut(QuoteVersionOut):
     snapshot_json: dict  # Full quote snapshot
 
 
+class QuoteVersionChangedOut(BaseModel):
+    """Whether a quote's content differs from one of its versions (content hashes)."""
+    version_id: int
+    label: str
+    changed: bool
+    version_hash: str
+    current_hash: str
+
+
+class QuoteFieldChangeOut(BaseModel):
+    """A field's value on each side of a diff."""
+    old: Any = None
+    new: Any = None
+
+
+class QuotePriceChangeOut(BaseModel):
+    """A price on each side of a diff, and new - old."""
+    old: Optional[float] = None
+    new: Optional[float] = None
+    delta: Optional[float] = None
+
+
+class QuoteLineDiffOut(BaseModel):
+    """A line added, removed or changed (services/version_diff.py)."""
+    id: Optional[int] = None
+    status: Literal["added", "removed", "changed"]
+    title: Optional[str] = None
+    category: Optional[str] = None
+    fields: Dict[str, QuoteFieldChangeOut] = {}
+    line: Optional[dict] = None  # Added line, in full
+
+
+class QuoteDayDiffOut(BaseModel):
+    """A day added, removed or changed, with its changed lines."""
+    id: Optional[int] = None
+    status: Literal["added", "removed", "changed"]
+    date: Optional[str] = None
+    destination: Optional[str] = None
+    fields: Dict[str, QuoteFieldChangeOut] = {}
+    lines: List[QuoteLineDiffOut] = []
+    lines_reordered: bool = False
+    day: Optional[dict] = None  # Added day, in full
+
+
+class QuoteVersionDiffOut(BaseModel):
+    """Diff from one version to another version or to the current quote (changes only)."""
+    quote_id: int
+    from_version_id: int
+    to_version_id: Optional[int] = None  # None: the current quote
+    changed: bool
+    grand_total: QuotePriceChangeOut
+    fields: Dict[str, QuoteFieldChangeOut]
+    days_reordered: bool
+    days: List[QuoteDayDiffOut]
+
+
 class QuoteVersionListOut(BaseModel):
     """Schema for paginated version list response."""
     items: List[QuoteVersionOut]
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Header, Query, HTTPException
+from fastapi.responses import Response
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, desc, func
 from sqlalchemy import inspect
@@ -6,6 +7,7 @@ from sqlalchemy import inspect
 from ..db import get_db
 from ..models.prod_models import ServiceCatalog, ServicePopularity, Supplier, ServiceImage
 from .schemas_services import ServiceOut
+from .http_cache import cache_headers, etag_matches, hashed_etag, not_modified
 from typing import List, Optional
 
 
@@ -71,6 +73,13 @@ def serialize_sa_row(row):
     return data
 
 
+def _row_values(row):
+    """Raw column values of a row (for content hashing, no normalization)."""
+    if row is None:
+        return None
+    return tuple(getattr(row, col.key) for col in inspect(row.__class__).columns)
+
+
 # Map high-level groups to concrete category values in DB
 CATEGORY_GROUPS: dict[str, list[str]] = {
     "Activity": ["Small Group", "Private", "Private Chauffeur", "Tickets"],
@@ -220,7 +229,12 @@ def search_services(
 
 
 @router.get("/{service_id}")
-def get_service_by_id(service_id: int, db: Session = Depends(get_db)):
+def get_service_by_id(
+    service_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+):
     """Get full service details by ID, including supplier and popularity."""
     svc = (
         db.query(ServiceCatalog)
@@ -230,17 +244,6 @@ def get_service_by_id(service_id: int, db: Session = Depends(get_db)):
     )
     if not svc:
         raise HTTPException(status_code=404, detail="Service not found")
-    out = serialize_sa_row(svc)
-    # Prefer already-serialized extras if present
-    extras = out.get("extras") or getattr(svc, "extras", None) or {}
-    # Debug: ensure extras is a dict
-    if extras and not isinstance(extras, dict):
-        extras = {}
-    # Extract normalized fields from extras
-    fields = extract_excel_fields(extras) if extras else {}
-    out["fields"] = fields
-    if getattr(svc, "supplier", None) is not None:
-        out["supplier"] = serialize_sa_row(svc.supplier)
     # Popularity if model exists
     try:
         pop = (
@@ -248,10 +251,8 @@ def get_service_by_id(service_id: int, db: Session = Depends(get_db)):
             .filter(ServicePopularity.service_id == service_id)
             .one_or_none()
         )
-        if pop:
-            out["popularity"] = serialize_sa_row(pop)
     except Exception:
-        pass
+        pop = None
 
     # Attach images from ServiceImage if available
     try:
@@ -260,15 +261,39 @@ def get_service_by_id(service_id: int, db: Session = Depends(get_db)):
             .filter(ServiceImage.service_id == service_id)
             .all()
         )
-        out["images"] = [
-            {"id": getattr(img, "id", None), "url": img.url, "caption": getattr(img, "caption", None)}
-            for img in imgs or []
-        ]
     except Exception:
-        # Be resilient: always provide a predictable shape
-        out["images"] = []
+        imgs = None
 
-    return out
+    # Content hash of everything the payload is built from: a matching
+    # If-None-Match is answered before any serialization
+    etag = hashed_etag(
+        _row_values(svc),
+        _row_values(getattr(svc, "supplier", None)),
+        _row_values(pop),
+        [(img.id, img.url, img.caption) for img in imgs] if imgs is not None else None,
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
+    out = serialize_sa_row(svc)
+    # Prefer already-serialized extras if present
+    extras = out.get("extras") or getattr(svc, "extras", None) or {}
+    # Debug: ensure extras is a dict
+    if extras and not isinstance(extras, dict):
+        extras = {}
+    # Extract normalized fields from extras
+    fields = extract_excel_fields(extras) if extras else {}
+    out["fields"] = fields
+    if getattr(svc, "supplier", None) is not None:
+        out["supplier"] = serialize_sa_row(svc.supplier)
+    if pop:
+        out["popularity"] = serialize_sa_row(pop)
 
+    # Be resilient: always provide a predictable shape
+    out["images"] = [
+        {"id": getattr(img, "id", None), "url": img.url, "caption": getattr(img, "caption", None)}
+        for img in imgs or []
+    ]
 
+    response.headers.update(cache_headers(etag))
+    return out
@@ -1,6 +1,8 @@
 """Email sending utilities for magic link authentication."""
+import asyncio
 import logging
 import smtplib
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from ..config import (
@@ -11,10 +13,14 @@ from ..config import (
     SMTP_USE_TLS,
     SMTP_FROM_EMAIL,
     MAGALIA_APP_BASE_URL,
+    SMTP_MAX_WORKERS,
 )
 
 logger = logging.getLogger(__name__)
 
+# Bounded pool for blocking SMTP sessions (see send_magic_link_email_async)
+_smtp_pool = ThreadPoolExecutor(max_workers=SMTP_MAX_WORKERS, thread_name_prefix="smtp")
+
 
 def send_magic_link_email(to_email: str, token: str) -> None:
     """Send a magic link email to the user."""
@@ -67,3 +73,14 @@ Magalia Team
         logger.error(f"Failed to send email to {to_email}: {e}")
         raise Exception(f"Failed to send email: {str(e)}")
 
+
+async def send_magic_link_email_async(to_email: str, token: str) -> None:
+    """
+    Async wrapper of send_magic_link_email for async handlers.
+
+    The blocking SMTP exchange runs in a dedicated pool of SMTP_MAX_WORKERS
+    threads: extra sends wait in the pool queue instead of holding the event
+    loop or FastAPI's shared threadpool.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_smtp_pool, send_magic_link_email, to_email, token)
@@ -22,4 +22,45 @@ SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
 SMTP_FROM_EMAIL = os.getenv("SMTP_FROM_EMAIL", "noreply@eetvl.com")
+# Emails are sent from a small dedicated thread pool so a slow SMTP server
+# never blocks the event loop nor the threads serving other requests
+SMTP_MAX_WORKERS = int(os.getenv("SMTP_MAX_WORKERS", "4"))
 
+# Background exports (services/export_jobs.py): number of worker threads,
+# where finished files are kept, and how long jobs/files are kept around
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_JOBS_DIR = Path(os.getenv("EXPORT_JOBS_DIR", str(Path(__file__).resolve().parent.parent / "var" / "export_jobs")))
+EXPORT_JOB_RETENTION_HOURS = int(os.getenv("EXPORT_JOB_RETENTION_HOURS", "24"))
+# Synchronous exports are written to a spooled temporary file: kept in memory up
+# to this size, then moved to disk, and streamed to the client in chunks
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", str(1024 * 1024)))
+# Rendered exports, keyed by quote content + template (services/export_cache.py):
+# a repeat export of an unchanged quote is served from here
+EXPORT_CACHE_DIR = Path(os.getenv("EXPORT_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "var" / "export_cache")))
+EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", "256"))
+EXPORT_CACHE_MAX_AGE_S = int(os.getenv("EXPORT_CACHE_MAX_AGE_S", "86400"))
+# Batch exports to ZIP (services/export_batch.py): worker processes rendering
+# the quotes in parallel, one per CPU up to 4 (each pays a process start and
+# its own imports, so a single-CPU host gets a single worker)
+EXPORT_BATCH_WORKERS = int(os.getenv("EXPORT_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Consolidated Excel workbooks (exports/excel/consolidated.py): quotes loaded
+# (days + lines) per bulk query, then written and released before the next ones
+EXPORT_CONSOLIDATED_CHUNK = int(os.getenv("EXPORT_CONSOLIDATED_CHUNK", "50"))
+
+# Disk cache of export images (exports/word/image_cache.py): downloaded photos
+# and their processed JPEGs. Downloads younger than IMAGE_CACHE_MAX_AGE_S are
+# used without asking the server; older ones are revalidated (ETag/Last-Modified)
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "var" / "image_cache")))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "512"))
+IMAGE_CACHE_MAX_AGE_S = int(os.getenv("IMAGE_CACHE_MAX_AGE_S", "86400"))
+# Background threads building image derivatives when photos are attached
+# (services/image_prewarm.py)
+IMAGE_PREWARM_WORKERS = int(os.getenv("IMAGE_PREWARM_WORKERS", "2"))
+
+# Quote versions (services/quote_versioning.py): a full snapshot is stored every
+# VERSION_KEYFRAME_INTERVAL versions of a quote, the others as a delta against
+# the previous version, so rebuilding one applies at most INTERVAL - 1 deltas
+VERSION_KEYFRAME_INTERVAL = max(1, int(os.getenv("VERSION_KEYFRAME_INTERVAL", "10")))
+# Diffs between versions (services/version_diff.py) kept in memory, keyed by the
+# content hashes of the two sides: at most VERSION_DIFF_CACHE_SIZE of them (LRU)
+VERSION_DIFF_CACHE_SIZE = int(os.getenv("VERSION_DIFF_CACHE_SIZE", "512"))
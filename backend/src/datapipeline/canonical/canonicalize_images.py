@@ -4,12 +4,16 @@ from src.models.staging_models import StgImage
 
 from src.models.prod_models import ServiceCatalog, ServiceImage
 
+from src.services.image_prewarm import prewarm_images
+
 
 
 def canonicalize_images():
 
     inserted = updated = linked = 0
 
+    new_image_urls = []
+
     with SessionLocal() as s:
 
         for img in s.query(StgImage).all():
@@ -28,6 +32,8 @@ def canonicalize_images():
 
                 inserted += 1
 
+                new_image_urls.append(img.url)
+
             else:
 
                 # Update caption if changed
@@ -64,6 +70,10 @@ def canonicalize_images():
 
     print(f"Canonicalized images -> inserted={inserted}, updated={updated}, linked={linked}")
 
+    # Download and prepare the new images now rather than at the first export using them
+    if new_image_urls:
+        print(f"Pre-warmed service images -> {prewarm_images(urls=new_image_urls)}")
+
 
 
 if __name__ == "__main__":
@@ -6,6 +6,8 @@ from src.models.staging_models import StgService
 
 from src.models.prod_models import ServiceCatalog, Supplier, ServiceImage
 
+from src.services.image_prewarm import prewarm_images
+
 
 
 def load_yaml(path):
@@ -36,6 +38,8 @@ def canonicalize_services(cat_map_path: str):
 
     inserted = updated = suppliers_upserted = images_added = 0
 
+    new_image_urls = []
+
     with SessionLocal() as s:
 
         for stg in s.query(StgService).all():
@@ -114,6 +118,7 @@ def canonicalize_services(cat_map_path: str):
                         s.add(ServiceImage(service_id=obj.id, url=img))
                         s.flush()
                         images_added += 1
+                        new_image_urls.append(img)
 
                 inserted += 1
 
@@ -155,6 +160,7 @@ def canonicalize_services(cat_map_path: str):
                         s.add(ServiceImage(service_id=existing.id, url=img))
                         s.flush()
                         images_added += 1
+                        new_image_urls.append(img)
                         changed = True
 
 
@@ -169,6 +175,10 @@ def canonicalize_services(cat_map_path: str):
 
     print(f"Canonicalized services -> inserted={inserted}, updated={updated}, suppliers_upserted={suppliers_upserted}, images_added={images_added}")
 
+    # Download and prepare the new images now rather than at the first export using them
+    if new_image_urls:
+        print(f"Pre-warmed service images -> {prewarm_images(urls=new_image_urls)}")
+
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
-from .exporter import build_xlsx_for_quote
-
-__all__ = ["build_xlsx_for_quote"]
-
+from .exporter import QuoteSheetStyles, build_xlsx_for_quote, write_quote_sheet
+from .consolidated import build_xlsx_for_quotes, sheet_title
 
+__all__ = ["build_xlsx_for_quote", "write_quote_sheet", "QuoteSheetStyles", "build_xlsx_for_quotes", "sheet_title"]
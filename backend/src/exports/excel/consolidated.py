@@ -0,0 +1,144 @@
+"""
+Consolidated Excel workbook of many quotes (e.g. a departure season).
+
+One "Summary" sheet listing every quote with its stored totals (grand total,
+commission, Onspot/Hassle, margin) and a total row, then one sheet per quote,
+the same as the single-quote export (write_quote_sheet).
+
+The summary is written from the totals persisted by the pricing engine, read
+with one column query per chunk (no ORM graph). The quote sheets are written
+chunk by chunk: each chunk of EXPORT_CONSOLIDATED_CHUNK quotes is loaded in
+bulk (load_quotes: one query per level), written, and released from the
+session before the next one. With the write-only workbook nothing is kept per
+row either, and each sheet is closed once written: memory depends on the chunk
+size, plus the small worksheet object openpyxl keeps per sheet until the
+workbook is saved (about 12 KB).
+"""
+from io import BytesIO
+from typing import BinaryIO, List, Optional, Sequence
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.hyperlink import Hyperlink
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ...config import EXPORT_CONSOLIDATED_CHUNK
+from ...models_quote import Quote
+from .exporter import QuoteSheetStyles, _cell, write_quote_sheet
+
+SUMMARY_TITLE = "Summary"
+
+# (header, Quote column, number format, width); money columns get a total
+_SUMMARY_COLUMNS = [
+    ("Quote", Quote.id, None, 8),
+    ("Title", Quote.title, None, 40),
+    ("Travel agency", Quote.travel_agency, None, 20),
+    ("Client", Quote.client_name, None, 20),
+    ("Departure", Quote.start_date, "yyyy-mm-dd", 12),
+    ("Pax", Quote.pax, None, 6),
+    ("Onspot", Quote.onspot_total, "#,##0.00", 12),
+    ("Hassle", Quote.hassle_total, "#,##0.00", 12),
+    ("Commission", Quote.commission_total, "#,##0.00", 14),
+    ("Sell total", Quote.sell_total, "#,##0.00", 14),
+    ("Grand total", Quote.grand_total, "#,##0.00", 14),
+    ("Margin", Quote.margin_pct, "0.00%", 9),
+]
+
+_INVALID_SHEET_CHARS = str.maketrans({c: " " for c in "[]:*?/\\"})
+
+
+def sheet_title(quote_id: int, title: Optional[str]) -> str:
+    """Sheet name of a quote: "<id> <title>", within Excel's rules (31 chars, no []:*?/\\)."""
+    name = f"{quote_id} {(title or '').translate(_INVALID_SHEET_CHARS)}".strip()
+    return name[:31].rstrip().rstrip("'")
+
+
+def _chunks(ids: List[int], size: int):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _write_summary(ws, styles: QuoteSheetStyles, db: Session, quote_ids: List[int], chunk_size: int) -> None:
+    letters = [chr(ord("A") + i) for i in range(len(_SUMMARY_COLUMNS))]
+    for letter, (_, _, _, width) in zip(letters, _SUMMARY_COLUMNS):
+        ws.column_dimensions[letter].width = width
+    ws.freeze_panes = "A2"
+
+    ws.append([_cell(ws, styles, header, border="grid", bold=True, center=True)
+               for header, _, _, _ in _SUMMARY_COLUMNS])
+    columns = [column for _, column, _, _ in _SUMMARY_COLUMNS]
+    last_row = 1
+    for chunk in _chunks(quote_ids, chunk_size):
+        rows = {r.id: r for r in db.execute(select(*columns).where(Quote.id.in_(chunk)))}
+        for quote_id in chunk:
+            r = rows.get(quote_id)
+            if r is None:
+                continue
+            cells = []
+            for (_, column, number_format, _), value in zip(_SUMMARY_COLUMNS, r):
+                if column is Quote.title:
+                    # Title links to the quote's sheet
+                    cell = WriteOnlyCell(ws, value or "")
+                    location = sheet_title(r.id, r.title).replace("'", "''")
+                    cell.hyperlink = Hyperlink(ref="", location=f"'{location}'!A1")
+                    styles.apply(cell, border="grid", link=True)
+                else:
+                    if value is not None and number_format and column is not Quote.start_date:
+                        value = float(value)
+                    cell = _cell(ws, styles, value, border="grid", number_format=number_format)
+                cells.append(cell)
+            ws.append(cells)
+            last_row += 1
+
+    # Total row: SUM of the money columns over the quote rows
+    total = [_cell(ws, styles, "Total", border="grid", bold=True)]
+    for letter, (_, _, number_format, _) in list(zip(letters, _SUMMARY_COLUMNS))[1:]:
+        if number_format == "#,##0.00":
+            total.append(_cell(ws, styles, f"=SUM({letter}2:{letter}{last_row})",
+                               border="grid", bold=True, number_format=number_format))
+        else:
+            total.append(_cell(ws, styles, border="grid"))
+    ws.append(total)
+
+
+def build_xlsx_for_quotes(
+    db: Session,
+    quote_ids: Sequence[int],
+    out: Optional[BinaryIO] = None,
+    chunk_size: int = EXPORT_CONSOLIDATED_CHUNK,
+) -> BinaryIO:
+    """
+    Build the consolidated workbook of the quotes (Summary + one sheet per quote,
+    in quote_ids order; unknown ids are skipped). Written to out or to a new
+    BytesIO; returned rewound.
+
+    The quotes loaded for their sheets are expunged from db once written: use a
+    session that does not hold them for anything else.
+    """
+    from ...api.quotes import load_quotes
+
+    quote_ids = list(dict.fromkeys(quote_ids))
+    chunk_size = max(1, chunk_size)
+
+    wb = Workbook(write_only=True)
+    styles = QuoteSheetStyles(wb)
+    # Each sheet is closed once written: its XML stream (a temporary file) is
+    # finished and released instead of staying open until the workbook is saved
+    summary = wb.create_sheet(SUMMARY_TITLE)
+    _write_summary(summary, styles, db, quote_ids, chunk_size)
+    summary.close()
+
+    for chunk in _chunks(quote_ids, chunk_size):
+        quotes = load_quotes(db, chunk)
+        for q in quotes:
+            ws = wb.create_sheet(sheet_title(q.id, q.title))
+            write_quote_sheet(ws, q, styles)
+            ws.close()
+        for q in quotes:
+            db.expunge(q)
+
+    buf = out if out is not None else BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
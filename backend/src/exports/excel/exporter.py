@@ -1,37 +1,15 @@
+from copy import copy
 from decimal import Decimal
 from io import BytesIO
-from typing import Optional
+from typing import Any, BinaryIO, Dict, Iterator, Optional
 from sqlalchemy.orm import Session
 from openpyxl import Workbook
-from openpyxl.styles import Font, Border, Side, Alignment
-from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, Alignment, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
 
 from ...models_quote import Quote, QuoteDay, QuoteLine
-import math
-
-
-def _days_count(q: Quote) -> int:
-    """Calcule le nombre de jours à partir de la liste des jours ou de la différence de dates."""
-    if q.days:
-        return len(q.days)
-    # sinon on tombe sur le diff de dates inclusif
-    try:
-        from datetime import date as dt_date
-        d0 = q.start_date if isinstance(q.start_date, dt_date) else dt_date.fromisoformat(str(q.start_date))
-        d1 = q.end_date   if isinstance(q.end_date,   dt_date) else dt_date.fromisoformat(str(q.end_date))
-        return max(0, (d1 - d0).days + 1)
-    except Exception:
-        return 0
-
-
-def compute_onspot(q: Quote) -> Decimal:
-    """Calcule le montant Onspot avec minimum 3 jours par carte."""
-    pax = q.pax or 0
-    cards = max(1, math.ceil((pax or 1) / 6))
-    trip_days = _days_count(q)
-    effective_days = max(trip_days, 3)  # **minimum 3 jours par carte**
-    auto_val = cards * 9 * effective_days
-    return q.onspot_manual if q.onspot_manual is not None else Decimal(str(auto_val))
 
 
 def _round2(val) -> float:
@@ -167,45 +145,14 @@ def _format_number(val: float) -> tuple[str, str]:
         return (str(round(val, 2)), "0.00;;;")  # 2 decimals, hide zero
 
 
-def build_xlsx_for_quote(db: Session, quote_id: int) -> BytesIO:
-    """
-    Build Excel export v2 for a quote.
-    Single sheet with destinations, formulas, totals, and recap.
-    """
-    q = db.query(Quote).filter(Quote.id == quote_id).first()
-    if not q:
-        raise ValueError(f"Quote {quote_id} not found")
-    
-    # Create workbook and worksheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Quote"
-    
-    # Set column widths
-    ws.column_dimensions[get_column_letter(1)].width = 17    # Column A
-    ws.column_dimensions[get_column_letter(2)].width = 12   # Column B
-    ws.column_dimensions[get_column_letter(3)].width = 41.87 # Column C
-    ws.column_dimensions[get_column_letter(4)].width = 20.8 # Column D
-    ws.column_dimensions[get_column_letter(5)].width = 20.8 # Column E
-    ws.column_dimensions[get_column_letter(6)].width = 11.3 # Column F
-    ws.column_dimensions[get_column_letter(7)].width = 21   # Column G
-    ws.column_dimensions[get_column_letter(8)].width = 10   # Column H
-    ws.column_dimensions[get_column_letter(9)].width = 20   # Column I
-    
-    # Default FX (fallback)
-    default_fx = 1.0
-    if q.fx_rate:
-        default_fx = float(q.fx_rate)
-    
-    # Compute Onspot and Hassle
-    onspot_total = compute_onspot(q)
-    onspot_value = float(onspot_total) if onspot_total else 0.0
-    
-    hassle_auto = (q.pax or 0) * 150
-    hassle_value = float(q.hassle_manual) if q.hassle_manual is not None else hassle_auto
-    
-    # Collect all paid service rows
-    service_rows = []
+def _value_format(val: float) -> str:
+    """Number format of a computed value: no decimals if integer, else 2 (zero hidden)."""
+    return "0;;;" if val == int(val) else "0.00;;;"
+
+
+def _iter_service_rows(q: Quote) -> Iterator[Dict[str, Any]]:
+    """Paid service rows of the quote, in day/line order (destination only on its first row)."""
+    default_fx = float(q.fx_rate) if q.fx_rate else 1.0
     current_dest = None
     
     # Sort days by position
@@ -225,235 +172,266 @@ def build_xlsx_for_quote(db: Session, quote_id: int) -> BytesIO:
             if show_dest:
                 current_dest = dest
             
-            # Service name
-            service_name = _excel_service_name(line)
-            
-            # Purchase EUR raw value
-            purchase_eur_raw = float(line.achat_eur) if line.achat_eur else 0.0
             buff_pct = _get_buff_pct(line)
             has_buff = buff_pct and buff_pct > 0
             
-            # FX rate
-            fx = _effective_fx(line.fx_rate, q.fx_rate, default_fx)
-            
-            # Sell USD
-            sell_usd = float(line.vente_usd) if line.vente_usd else 0.0
-            
-            # Supplier
-            supplier = line.supplier_name or ""
-            
-            # Internal note
-            internal_note = _get_internal_note(line)
-            
-            # Provider URL
-            provider_url = _get_provider_url(line)
-            
-            service_rows.append({
+            yield {
                 "dest": dest if show_dest else "",
-                "service_name": service_name,
-                "purchase_eur_raw": purchase_eur_raw,
+                "service_name": _excel_service_name(line),
+                "purchase_eur_raw": float(line.achat_eur) if line.achat_eur else 0.0,
                 "buff_pct": buff_pct if has_buff else None,
                 "has_buff": has_buff,
-                "fx": fx,
-                "sell_usd": sell_usd,
-                "supplier": supplier,
-                "internal_note": internal_note,
-                "provider_url": provider_url,
-            })
+                "fx": _effective_fx(line.fx_rate, q.fx_rate, default_fx),
+                "sell_usd": float(line.vente_usd) if line.vente_usd else 0.0,
+                "supplier": line.supplier_name or "",
+                "internal_note": _get_internal_note(line),
+                "provider_url": _get_provider_url(line),
+            }
+
+
+# === STYLES ===
+# Borders of the table (rows 2 to grand total): B-F full grid, G left only, H-I none
+_TABLE_BORDERS = {2: "grid", 3: "grid", 4: "grid", 5: "grid", 6: "grid", 7: "left", 8: "none", 9: "none"}
+
+_BORDERS = {
+    "grid": lambda: Border(left=Side(style="thin"), right=Side(style="thin"),
+                           top=Side(style="thin"), bottom=Side(style="thin")),
+    "left": lambda: Border(left=Side(style="thin")),
+    "none": Border,
+}
+
+_COLUMN_WIDTHS = {"A": 17, "B": 12, "C": 41.87, "D": 20.8, "E": 20.8, "F": 11.3, "G": 21, "H": 10, "I": 20}
+
+_ROW_HEIGHT = 14.3
+
+
+class QuoteSheetStyles:
+    """
+    Named styles of the quote sheets of a workbook.
+
+    Each combination (border, number format, bold, link, centered) is one
+    NamedStyle registered once in the workbook and shared by all the cells
+    that use it, instead of building Font/Border/Alignment objects per cell.
+    """
+
+    def __init__(self, wb: Workbook):
+        self._wb = wb
+        self._styles: Dict[str, NamedStyle] = {}
+
+    def apply(self, cell, **style) -> None:
+        """Give cell the named style (what `cell.style = name` does, without its lookup by name)."""
+        named = self._styles[self.name(**style)]
+        cell._style = copy(named.as_tuple())
+
+    def name(self, border: Optional[str] = None, number_format: Optional[str] = None,
+             bold: bool = False, link: bool = False, center: bool = False) -> str:
+        parts = [border or "plain"]
+        if number_format:
+            parts.append(number_format)
+        parts += [flag for flag, on in (("bold", bold), ("link", link), ("center", center)) if on]
+        name = "Quote " + " ".join(parts)
+        if name not in self._styles:
+            if link:
+                font = Font(underline="single", color="0563C1")
+            elif bold:
+                font = Font(bold=True)
+            else:
+                font = copy(DEFAULT_FONT)
+            named = NamedStyle(
+                name=name,
+                font=font,
+                border=_BORDERS[border]() if border else copy(DEFAULT_BORDER),
+                alignment=Alignment(horizontal="center") if center else None,
+                number_format=number_format or "General",
+            )
+            self._wb.add_named_style(named)
+            self._styles[name] = named
+        return name
+
+
+def _cell(ws, styles: QuoteSheetStyles, value=None, link: bool = False, **style) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value)
+    if link:
+        cell.hyperlink = value
+    styles.apply(cell, link=link, **style)
+    return cell
+
+
+class _RowWriter:
+    """
+    Appends rows to a write-only worksheet with their height. A row's height
+    must be set before the row is written and is dropped right after, so no
+    per-row state is kept.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.row = 0
+
+    def append(self, cells: list, height: Optional[float] = _ROW_HEIGHT) -> int:
+        """Write the next row; returns its number."""
+        self.row += 1
+        if height is not None:
+            self.ws.row_dimensions[self.row].height = height
+        self.ws.append(cells)
+        self.ws.row_dimensions.pop(self.row, None)
+        return self.row
+
+
+def _table_row(ws, styles: QuoteSheetStyles, cells: Optional[Dict[int, Dict[str, Any]]] = None,
+               center: bool = False) -> list:
+    """Row of the bordered table: every column B-I gets its border, plus the given cells."""
+    row = [None]
+    for col, border in _TABLE_BORDERS.items():
+        row.append(_cell(ws, styles, border=border, center=center, **(cells or {}).get(col, {})))
+    return row
+
+
+def _url(provider_url: str) -> str:
+    url = provider_url.strip()
+    # Ensure URL has protocol
+    if url and not url.startswith(("http://", "https://")):
+        url = "https://" + url
+    return url
+
+
+def write_quote_sheet(ws, q: Quote, styles: QuoteSheetStyles) -> None:
+    """
+    Write the cost sheet of q (destinations, formulas, totals, recap) to a
+    write-only worksheet, row by row. Nothing is kept once a row is written,
+    so memory stays flat whatever the number of lines.
+    """
+    # Column widths must be set before the first row is written
+    for letter, width in _COLUMN_WIDTHS.items():
+        ws.column_dimensions[letter].width = width
+    rows = _RowWriter(ws)
+    
+    # Onspot and Hassle as persisted by the pricing engine
+    onspot_value = float(q.onspot_total) if q.onspot_total else 0.0
+    hassle_value = float(q.hassle_total) if q.hassle_total else 0.0
+    margin_pct = float(q.margin_pct) if q.margin_pct else 0.1627
+    
+    rows.append([], height=None)  # Row 1 stays empty
     
     # === HEADERS (Row 2) ===
     headers = ["Destination", "Service", "Prix d'achat €", "Prix d'achat $", "Prix de vente", "Supplier", "Note", "Provider URL"]
-    for col_idx, header in enumerate(headers, start=2):  # Start at column B
-        cell = ws.cell(row=2, column=col_idx)
-        cell.value = header
-        cell.alignment = Alignment(horizontal="center")
+    rows.append(_table_row(ws, styles, {col: {"value": h} for col, h in enumerate(headers, start=2)}, center=True))
     
     # === SPECIAL ROWS ===
     # Row 3: Hassle (F3)
-    ws.cell(row=3, column=6).value = hassle_value
-    hassle_fmt = "0;;;" if hassle_value == int(hassle_value) else "0.00;;;"
-    ws.cell(row=3, column=6).number_format = hassle_fmt
-    
+    rows.append(_table_row(ws, styles, {6: {"value": hassle_value, "number_format": _value_format(hassle_value)}}))
     # Row 4: Onspot (E4)
-    ws.cell(row=4, column=5).value = onspot_value
-    onspot_fmt = "0;;;" if onspot_value == int(onspot_value) else "0.00;;;"
-    ws.cell(row=4, column=5).number_format = onspot_fmt
+    rows.append(_table_row(ws, styles, {5: {"value": onspot_value, "number_format": _value_format(onspot_value)}}))
     
     # === SERVICE ROWS (starting at row 5) ===
-    first_service_row = 5
-    last_service_row = first_service_row + len(service_rows) - 1 if service_rows else first_service_row - 1
-    
-    for idx, row_data in enumerate(service_rows):
-        excel_row = first_service_row + idx
+    first_service_row = rows.row + 1
+    for row_data in _iter_service_rows(q):
+        excel_row = rows.row + 1
+        cells = {3: {"value": row_data["service_name"]}}
         
         # Column B: Destination
         if row_data["dest"]:
-            ws.cell(row=excel_row, column=2).value = row_data["dest"]
-        
-        # Column C: Service
-        ws.cell(row=excel_row, column=3).value = row_data["service_name"]
+            cells[2] = {"value": row_data["dest"]}
         
         # Column D: Purchase EUR (with formula if buff_pct is present)
-        if row_data["purchase_eur_raw"] > 0:
-            purchase_eur_val = row_data["purchase_eur_raw"]
+        purchase_eur = row_data["purchase_eur_raw"]
+        if purchase_eur > 0:
             if row_data["has_buff"]:
                 # Formula with raw value visible: ={purchase_eur_raw}*(1+{buff_pct}/100)
                 buff_pct_val = row_data["buff_pct"]
-                ws.cell(row=excel_row, column=4).value = f"={purchase_eur_val}*(1+{buff_pct_val}/100)"
-                # Calculate expected result to determine format
-                expected_result = purchase_eur_val * (1 + buff_pct_val / 100)
-                eur_fmt = "0;;;" if expected_result == int(expected_result) else "0.00;;;"
+                purchase_eur = purchase_eur * (1 + buff_pct_val / 100)
+                value = f"={row_data['purchase_eur_raw']}*(1+{buff_pct_val}/100)"
             else:
-                # Direct value
-                ws.cell(row=excel_row, column=4).value = purchase_eur_val
-                eur_fmt = "0;;;" if purchase_eur_val == int(purchase_eur_val) else "0.00;;;"
-            ws.cell(row=excel_row, column=4).number_format = eur_fmt
+                value = purchase_eur
+            cells[4] = {"value": value, "number_format": _value_format(purchase_eur)}
         else:
-            ws.cell(row=excel_row, column=4).number_format = "0;;;"
+            cells[4] = {"number_format": "0;;;"}
         
         # Column E: Purchase USD (formula: D{row} / FX)
         if row_data["purchase_eur_raw"] > 0 and row_data["fx"] > 0:
-            # Formula: D{row} / FX
             fx_val = row_data["fx"]
-            ws.cell(row=excel_row, column=5).value = f"=D{excel_row}/{fx_val}"
-            # Calculate expected result to determine format
-            purchase_eur_for_usd = row_data["purchase_eur_raw"]
-            if row_data["has_buff"]:
-                purchase_eur_for_usd = purchase_eur_for_usd * (1 + row_data["buff_pct"] / 100)
-            expected_usd = purchase_eur_for_usd / fx_val
-            usd_fmt = "0;;;" if expected_usd == int(expected_usd) else "0.00;;;"
-            ws.cell(row=excel_row, column=5).number_format = usd_fmt
+            cells[5] = {"value": f"=D{excel_row}/{fx_val}", "number_format": _value_format(purchase_eur / fx_val)}
         else:
-            ws.cell(row=excel_row, column=5).number_format = "0;;;"
+            cells[5] = {"number_format": "0;;;"}
         
         # Column F: Sell USD
         sell_val, sell_fmt = _format_number(row_data["sell_usd"])
-        if sell_val:
-            ws.cell(row=excel_row, column=6).value = float(sell_val)
-        ws.cell(row=excel_row, column=6).number_format = sell_fmt
+        cells[6] = {"value": float(sell_val) if sell_val else None, "number_format": sell_fmt}
         
         # Column G: Supplier
         if row_data["supplier"]:
-            ws.cell(row=excel_row, column=7).value = row_data["supplier"]
+            cells[7] = {"value": row_data["supplier"]}
         
-        # Column H: Internal note (or provider_url if internal_note is empty, as clickable hyperlink)
+        # Column H: Internal note; column I: provider URL as clickable hyperlink.
+        # If H is empty, the URL goes in H and I stays empty.
         internal_note = row_data["internal_note"]
         provider_url = row_data["provider_url"]
+        if internal_note:
+            cells[8] = {"value": internal_note}
+        if provider_url:
+            cells[9 if internal_note else 8] = {"value": _url(provider_url), "link": True}
         
-        # If H is empty, use I's content in H (as clickable hyperlink) and leave I empty
-        if not internal_note and provider_url:
-            url = provider_url.strip()
-            # Ensure URL has protocol
-            if url and not url.startswith(("http://", "https://")):
-                url = "https://" + url
-            # Put URL in H as clickable hyperlink
-            cell_h = ws.cell(row=excel_row, column=8)
-            cell_h.value = url
-            cell_h.hyperlink = url
-            cell_h.font = Font(underline="single", color="0563C1")
-            # Don't put anything in I
-        else:
-            # Normal case: H has content or both H and I are empty
-            if internal_note:
-                ws.cell(row=excel_row, column=8).value = internal_note
-            
-            # Column I: Provider URL (as clickable hyperlink) - only if H is not empty
-            if provider_url:
-                url = provider_url.strip()
-                # Ensure URL has protocol
-                if url and not url.startswith(("http://", "https://")):
-                    url = "https://" + url
-                cell = ws.cell(row=excel_row, column=9)
-                cell.value = url
-                cell.hyperlink = url
-                cell.font = Font(underline="single", color="0563C1")
+        rows.append(_table_row(ws, styles, cells))
+    last_service_row = rows.row
     
     # === BLANK ROW ===
-    blank_row = last_service_row + 1
+    rows.append(_table_row(ws, styles))
     
     # === TOTAL ROW ===
-    total_row = blank_row + 1
-    ws.cell(row=total_row, column=2).value = "Total"
-    ws.cell(row=total_row, column=2).font = Font(bold=True)
-    
-    # Column E: SUM of all service E values + E4 (Onspot)
+    # Columns E/F: SUM of all service values + E4 (Onspot) / F3 (Hassle)
     if last_service_row >= first_service_row:
-        ws.cell(row=total_row, column=5).value = f"=SUM(E{first_service_row}:E{last_service_row})+E4"
+        total_e = f"=SUM(E{first_service_row}:E{last_service_row})+E4"
+        total_f = f"=SUM(F{first_service_row}:F{last_service_row})+F3"
     else:
-        ws.cell(row=total_row, column=5).value = "=E4"
-    ws.cell(row=total_row, column=5).number_format = "0.##;;;"  # Show decimals only if needed
-    
-    # Column F: SUM of all service F values + F3 (Hassle)
-    if last_service_row >= first_service_row:
-        ws.cell(row=total_row, column=6).value = f"=SUM(F{first_service_row}:F{last_service_row})+F3"
-    else:
-        ws.cell(row=total_row, column=6).value = "=F3"
-    ws.cell(row=total_row, column=6).number_format = "0.##;;;"  # Show decimals only if needed
+        total_e, total_f = "=E4", "=F3"
+    total_row = rows.append(_table_row(ws, styles, {
+        2: {"value": "Total", "bold": True},
+        5: {"value": total_e, "number_format": "0.##;;;"},  # Show decimals only if needed
+        6: {"value": total_f, "number_format": "0.##;;;"},
+    }))
     
     # === GRAND TOTAL ROW ===
-    grand_total_row = total_row + 1
-    ws.cell(row=grand_total_row, column=2).value = "Grand total"
-    ws.cell(row=grand_total_row, column=2).font = Font(bold=True)
-    
     # Column F: (Total purchases $ incl. Onspot) + (Total sales incl. Hassle)
-    ws.cell(row=grand_total_row, column=6).value = f"=E{total_row}+F{total_row}"
-    ws.cell(row=grand_total_row, column=6).number_format = "0.##;;;"  # Show decimals only if needed
-    
-    # === BORDERS ===
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    # Border for columns G, H, I: only left border (no top, right, bottom)
-    left_only_border = Border(
-        left=Side(style='thin')
-    )
-    
-    # Apply borders from row 2 to grand_total_row
-    for row in range(2, grand_total_row + 1):
-        for col in range(2, 10):  # Columns B to I
-            if col == 7:  # Column G: only left border
-                ws.cell(row=row, column=col).border = left_only_border
-            elif col >= 8:  # Columns H, I: no borders
-                ws.cell(row=row, column=col).border = Border()  # No borders
-            else:  # Columns B to F: full borders
-                ws.cell(row=row, column=col).border = thin_border
+    rows.append(_table_row(ws, styles, {
+        2: {"value": "Grand total", "bold": True},
+        6: {"value": f"=E{total_row}+F{total_row}", "number_format": "0.##;;;"},
+    }))
     
     # === RECAP BLOCK (2 blank rows after grand total) ===
-    recap_start_row = grand_total_row + 3
-    
-    # R1: Prix d'achat
-    ws.cell(row=recap_start_row, column=3).value = "Prix d'achat"
-    ws.cell(row=recap_start_row, column=4).value = f"=E{total_row}"
-    ws.cell(row=recap_start_row, column=4).number_format = "0.##;;;"  # Show decimals only if needed
-    
-    # R2: Commission
-    margin_pct = float(q.margin_pct) if q.margin_pct else 0.1627
-    ws.cell(row=recap_start_row + 1, column=3).value = "Commission"
-    ws.cell(row=recap_start_row + 1, column=4).value = f"=E{total_row}*{margin_pct}"
-    ws.cell(row=recap_start_row + 1, column=4).number_format = "0.##;;;"  # Show decimals only if needed
-    
-    # R3: Prix de vente
-    ws.cell(row=recap_start_row + 2, column=3).value = "Prix de vente"
-    ws.cell(row=recap_start_row + 2, column=4).value = f"=F{total_row}"
-    ws.cell(row=recap_start_row + 2, column=4).number_format = "0.##;;;"  # Show decimals only if needed
-    
-    # R4: Total
-    ws.cell(row=recap_start_row + 3, column=3).value = "Total"
-    ws.cell(row=recap_start_row + 3, column=3).font = Font(bold=True)
-    ws.cell(row=recap_start_row + 3, column=4).value = f"=D{recap_start_row}+D{recap_start_row + 1}+D{recap_start_row + 2}"
-    ws.cell(row=recap_start_row + 3, column=4).number_format = "0.##;;;"  # Show decimals only if needed
+    rows.append([])
+    rows.append([])
+    recap_start_row = rows.row + 1
+    recap = [
+        ("Prix d'achat", f"=E{total_row}"),
+        ("Commission", f"=E{total_row}*{margin_pct}"),
+        ("Prix de vente", f"=F{total_row}"),
+        ("Total", f"=D{recap_start_row}+D{recap_start_row + 1}+D{recap_start_row + 2}"),
+    ]
+    for label, formula in recap:
+        label_cell = _cell(ws, styles, label, bold=True) if label == "Total" else label
+        rows.append([None, None, label_cell, _cell(ws, styles, formula, number_format="0.##;;;")])
+
+
+def build_xlsx_for_quote(db: Session, quote_id: int, out: Optional[BinaryIO] = None) -> BinaryIO:
+    """
+    Build Excel export v2 for a quote.
+    Single sheet with destinations, formulas, totals, and recap.
+    Written to out (a seekable binary file, e.g. a spooled temporary file) or
+    to a new BytesIO; returned rewound.
+    """
+    # Import here to avoid circular import
+    from ...api.quotes import load_quote
+
+    q = load_quote(db, quote_id)
+    if not q:
+        raise ValueError(f"Quote {quote_id} not found")
     
-    # Set row height to 14.3 for all rows (from row 2 to last recap row)
-    last_row = recap_start_row + 3
-    for row_num in range(2, last_row + 1):
-        ws.row_dimensions[row_num].height = 14.3
+    # Write-only workbook: rows are streamed to the file as they are appended
+    wb = Workbook(write_only=True)
+    write_quote_sheet(wb.create_sheet("Quote"), q, QuoteSheetStyles(wb))
     
-    # Save to BytesIO
-    buf = BytesIO()
+    # Save to the output file
+    buf = out if out is not None else BytesIO()
     wb.save(buf)
     buf.seek(0)
     return buf
-
@@ -2,6 +2,7 @@ from .settings import WORD_TEMPLATE_PATH, COL_W_CM, COL_H_CM, DPI, JPEG_QUALITY,
 
 from .image_utils import (
     fetch_image_bytes,
+    prefetch_images,
     ensure_jpeg,
     cover_crop_to_cm,
     contain_resize_to_width_cm,
@@ -10,14 +11,19 @@ from .image_utils import (
     jpeg_bytes,
 )
 
+from .image_cache import ImageCache, get_image_cache
+from .template_cache import WordTemplate, get_word_template
+
 from .html_utils import sanitize_html, append_sanitized_html_to_docx
 from .exporter import build_docx_for_quote
 
 __all__ = [
     "WORD_TEMPLATE_PATH",
     "COL_W_CM", "COL_H_CM", "DPI", "JPEG_QUALITY", "MAX_IMAGE_BYTES", "IMG_TIMEOUT_S",
-    "fetch_image_bytes", "ensure_jpeg", "cover_crop_to_cm", "contain_resize_to_width_cm",
+    "fetch_image_bytes", "prefetch_images", "ensure_jpeg", "cover_crop_to_cm", "contain_resize_to_width_cm",
     "make_two_up_cover", "make_two_up_fixed", "jpeg_bytes",
+    "ImageCache", "get_image_cache",
+    "WordTemplate", "get_word_template",
     "sanitize_html", "append_sanitized_html_to_docx",
     "build_docx_for_quote",
 ]
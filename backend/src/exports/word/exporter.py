@@ -1,6 +1,6 @@
 from __future__ import annotations
 from io import BytesIO
-from typing import Optional, List
+from typing import BinaryIO, Callable, Dict, Optional, List, Tuple
 import re
 import html
 import calendar
@@ -8,19 +8,19 @@ from datetime import datetime
 
 from docx import Document
 from docx.shared import Cm, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.text.paragraph import Paragraph
-from docx.oxml.ns import qn
 
 from sqlalchemy.orm import Session
 
 from .settings import (
-    WORD_TEMPLATE_PATH, HERO_W_CM, HERO_H_CM,
+    HERO_W_CM, HERO_H_CM,
     TEXT_COLOR, TITLE_PT, DAY_PT, DATE_PT, NORMAL_PT,
     SP_AFTER_NORMAL_PT, SP_BEFORE_ALL_PT, SP_AFTER_ALL_PT
 )
-from .image_utils import fetch_image_bytes, contain_resize_to_width_cm, stitch_side_by_side_to_cm
+from .image_utils import fetch_image_bytes, contain_resize_to_width_cm, prefetch_images, stitch_side_by_side_to_cm
 from .html_utils import append_sanitized_html_to_docx, add_hyperlink
+from .template_cache import get_word_template
 from ...models_quote import Quote
 
 # --- Date formatting identical to UI, English locale, ordinals ---
@@ -515,13 +515,15 @@ def _append_hotel_url_if_any(doc, line):
         r.underline = True
         r.italic = False
         _set_par_spacing(p, before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_NORMAL_PT)
+        return p
+    return None
 
-def _insert_two_heroes(doc: Document, url1: str, url2: str, add_blank_after: bool = True):
+def _insert_two_heroes(doc: Document, url1: str, url2: str, add_blank_after: bool = True, images=None):
     if not url1 or not url2:
         return None, None
     # Pas d'espace avant la photo
     try:
-        jpeg = stitch_side_by_side_to_cm(url1, url2, width_cm=HERO_W_CM, height_cm=HERO_H_CM)
+        jpeg = stitch_side_by_side_to_cm(url1, url2, width_cm=HERO_W_CM, height_cm=HERO_H_CM, images=images)
         p = doc.add_paragraph()
         run = p.add_run()
         run.add_picture(BytesIO(jpeg), width=Cm(HERO_W_CM), height=Cm(HERO_H_CM))
@@ -541,9 +543,10 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
         cat = (_get_attr(line, "category") or "").strip()
         rj = _get_attr(line, "raw_json", {}) or {}
         
-        # Mémoriser l'index du premier paragraphe du service pour gérer les sauts de page
-        # Cela permet de garder tous les éléments du service (titre, sous-titre, description, URL) ensemble
-        service_start_para_idx = len(doc.paragraphs)
+        # Paragraphes écrits par ce service (titre, sous-titre, description, URL), dans l'ordre,
+        # pour gérer les sauts de page à la fin. On les garde ici plutôt que de relire
+        # doc.paragraphs, qui reconstruit la liste de tout le document à chaque accès.
+        service_paras = []
         
         # 1) Titre - toujours affiché
         title = _fmt_service_title(line)
@@ -582,6 +585,7 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                         if part_type == 'superscript':
                             r.font.superscript = True
                 _set_par_spacing(p, before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_ALL_PT)
+                service_paras.append(p)
             # Pour Car Rental, parser le HTML pour préserver le formatage (gras pour SUV, CDW, etc.)
             elif cat == "Car Rental":
                 p = doc.add_paragraph()
@@ -589,8 +593,9 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                 # Utiliser une fonction spéciale pour préserver le formatage
                 _add_title_with_html_formatting(p, title)
                 _set_par_spacing(p, before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_ALL_PT)
+                service_paras.append(p)
             else:
-                _add_day_title(doc, title)
+                service_paras.append(_add_day_title(doc, title))
         added_any = False
 
         # 2) Sous-titre pour Flight, Train, Ferry (heures de départ/arrivée)
@@ -605,7 +610,7 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                     subtitle_parts.append(f"arrival at {_fmt_ampm(arr_time)}")
                 if subtitle_parts:
                     subtitle = f"{'; '.join(subtitle_parts)} – Schedule subject to change"
-                    _add_normal(doc, subtitle)
+                    service_paras.append(_add_normal(doc, subtitle))
                     added_any = True
     
         elif cat == "Train":
@@ -619,7 +624,7 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                     subtitle_parts.append(f"arrival at {_fmt_ampm(arr_time)}")
                 if subtitle_parts:
                     subtitle = f"{'; '.join(subtitle_parts)} – Schedule subject to change"
-                    _add_normal(doc, subtitle)
+                    service_paras.append(_add_normal(doc, subtitle))
                     added_any = True
         
         elif cat == "Ferry":
@@ -633,7 +638,7 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                     subtitle_parts.append(f"Arrival {_fmt_ampm(arr_time)}")
                 if subtitle_parts:
                     subtitle = f"{'; '.join(subtitle_parts)} – Schedule subject to change"
-                    _add_normal(doc, subtitle)
+                    service_paras.append(_add_normal(doc, subtitle))
                     added_any = True
 
         # Description (corps) - affichée après les sous-titres
@@ -727,41 +732,32 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
             if not desc and title and not has_subtitle:
                 desc = title
 
-        # Mémoriser l'index du premier paragraphe de la description (si elle existe)
-        desc_start_para_idx = None
-        desc_end_para_idx = None
+        # Paragraphes de la description (si elle existe)
+        desc_paras = []
         
         if desc:
-            # Mémoriser l'index du premier paragraphe de la description
-            desc_start_para_idx = len(doc.paragraphs)
-            
             # Pour Trip info, description en italique
-            para_count_before = len(doc.paragraphs)
             p_desc = doc.add_paragraph()
             if cat == "Trip info":
                 # Description en italique (pas de gras) et en bleu
-                append_sanitized_html_to_docx(p_desc, desc, allow_italic=True)
+                desc_paras = append_sanitized_html_to_docx(p_desc, desc, allow_italic=True)
                 # Forcer italique, pas de gras, couleur bleue, police Arial taille 10 pour tous les runs
-                para_count_after = len(doc.paragraphs)
-                for i in range(para_count_before, para_count_after):
-                    for run in doc.paragraphs[i].runs:
+                for para in desc_paras:
+                    for run in para.runs:
                         run.font.name = "Arial"
                         run.font.size = Pt(NORMAL_PT)  # NORMAL_PT = 10
                         run.font.italic = True
                         run.font.bold = False
                         run.font.color.rgb = TEXT_COLOR  # Forcer la couleur bleue
-                    _set_par_spacing(doc.paragraphs[i], before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_NORMAL_PT)
+                    _set_par_spacing(para, before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_NORMAL_PT)
             else:
                 # Autres catégories : italique autorisé seulement pour Trip info (mais on est déjà dans le else)
-                append_sanitized_html_to_docx(p_desc, desc, allow_italic=False)
+                desc_paras = append_sanitized_html_to_docx(p_desc, desc, allow_italic=False)
                 # Apply spacing to all generated paragraphs
-                para_count_after = len(doc.paragraphs)
-                for i in range(para_count_before, para_count_after):
-                    _set_par_spacing(doc.paragraphs[i], before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_NORMAL_PT)
+                for para in desc_paras:
+                    _set_par_spacing(para, before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_NORMAL_PT)
+            service_paras.extend(desc_paras)
             added_any = True
-            
-            # Mémoriser l'index du dernier paragraphe de la description
-            desc_end_para_idx = len(doc.paragraphs) - 1
 
         # 3) Sous-titre pour Activity (catalogue) avec duration
         if cat in ("Activity", "Small Group", "Private"):
@@ -781,7 +777,7 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                 
                 if subtitle_parts:
                     subtitle = "\n".join(subtitle_parts)
-                    _add_normal(doc, subtitle)
+                    service_paras.append(_add_normal(doc, subtitle))
                     added_any = True
             else:
                 # Pour les activités non-catalogue, calculer la durée depuis start_time/end_time
@@ -824,7 +820,7 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                 
                 if subtitle_parts:
                     subtitle = "\n".join(subtitle_parts)
-                    _add_normal(doc, subtitle)
+                    service_paras.append(_add_normal(doc, subtitle))
                     added_any = True
 
         # 4) Sous-titre pour New Service (duration et description)
@@ -867,12 +863,14 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
             
             if subtitle_parts:
                 subtitle = "\n".join(subtitle_parts)
-                _add_normal(doc, subtitle)
+                service_paras.append(_add_normal(doc, subtitle))
                 added_any = True
 
         # 5) Lien hôtel si catégorie Hotel ou New Hotel
         if cat == "Hotel":
-            _append_hotel_url_if_any(doc, line)
+            p_url = _append_hotel_url_if_any(doc, line)
+            if p_url is not None:
+                service_paras.append(p_url)
             added_any = True
         elif cat == "New Hotel":
             # Pour New Hotel, l'URL est dans raw_json.hotel_url
@@ -887,12 +885,9 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
                 r.underline = True
                 r.italic = False
                 _set_par_spacing(p, before_pt=SP_BEFORE_ALL_PT, after_pt=SP_AFTER_NORMAL_PT)
+                service_paras.append(p)
                 added_any = True
 
-        # Mémoriser l'index du dernier paragraphe du service (avant le _blank_line)
-        # C'est le dernier paragraphe qui fait partie du service (titre, sous-titre, description, URL)
-        service_end_para_idx = len(doc.paragraphs) - 1
-        
         # 4) Saut de ligne après le dernier élément du service (sauf si skip_blank_line_after est True)
         if not skip_blank_line_after:
             _blank_line(doc)
@@ -900,21 +895,17 @@ def _render_service(doc: Document, line, usable_width_cm: float, skip_blank_line
         # Appliquer keep_with_next et keep_together de manière sélective
         # Pour les activités et hôtels, permettre les sauts de page entre les paragraphes de description
         # pour éviter trop d'espace vide en bas de page
-        if service_start_para_idx <= service_end_para_idx and service_end_para_idx < len(doc.paragraphs):
+        if service_paras:
             # Déterminer si on doit permettre les sauts de page dans la description
             allow_page_breaks_in_desc = cat in ("Activity", "Small Group", "Private", "Hotel", "New Hotel")
+            desc_ids = {id(para) for para in desc_paras}
             
-            for para_idx in range(service_start_para_idx, service_end_para_idx + 1):
-                para = doc.paragraphs[para_idx]
-                
+            for para in service_paras:
                 # Si c'est un paragraphe de description pour activités/hôtels, permettre les sauts de page
-                if (allow_page_breaks_in_desc and 
-                    desc_start_para_idx is not None and 
-                    desc_end_para_idx is not None and
-                    desc_start_para_idx <= para_idx <= desc_end_para_idx):
+                if allow_page_breaks_in_desc and id(para) in desc_ids:
                     # Pour les paragraphes de description (sauf le premier), ne pas forcer keep_with_next
                     # Cela permet à Word de faire des sauts de page entre les paragraphes si nécessaire
-                    if para_idx == desc_start_para_idx:
+                    if para is desc_paras[0]:
                         # Le premier paragraphe de description reste avec le sous-titre (si existe)
                         para.paragraph_format.keep_with_next = True
                     else:
@@ -980,7 +971,7 @@ def _render_day_services(doc: Document, day, usable_w_cm: float = None) -> None:
         
         _render_service(doc, line, usable_w_cm or 0, skip_blank_line_after=skip_blank)
 
-def _insert_day_block(doc: Document, qout, day, day_idx, usable_width_cm: float):
+def _insert_day_block(doc: Document, qout, day, day_idx, usable_width_cm: float, images=None):
     # Jamais d'image hero pour le premier jour
     photo_para = None
     blank_para = None
@@ -989,7 +980,7 @@ def _insert_day_block(doc: Document, qout, day, day_idx, usable_width_cm: float)
         if len(decorative_images) >= 2:
             imgs = decorative_images[:2]
             # Garder un espace entre la photo et la date, mais s'assurer qu'ils ne sont pas séparés
-            photo_para, blank_para = _insert_two_heroes(doc, imgs[0], imgs[1], add_blank_after=True)
+            photo_para, blank_para = _insert_two_heroes(doc, imgs[0], imgs[1], add_blank_after=True, images=images)
 
     # Ligne de date
     date_iso = _get_attr(day, "date")
@@ -1012,145 +1003,116 @@ def _insert_day_block(doc: Document, qout, day, day_idx, usable_width_cm: float)
     # Utiliser _render_day_services pour rendre tous les services (inclut Flight, Train, etc.)
     _render_day_services(doc, day, usable_width_cm)
 
-def _apply_terms_conditions_style(para: Paragraph):
-    """
-    Applique le style spécifique aux termes et conditions :
-    - Police Arial 8
-    - Alignement : Gauche
-    - Espacement avant : 0 pt
-    - Espacement après : 0 pt
-    - Interligne : Multiple 1.08
-    - Mise en retrait : 0" avant et après
-    - Gestion des veuves et des orphelins activée
-    """
-    # Alignement à gauche
-    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    
-    # Formatage du paragraphe
-    pf = para.paragraph_format
-    pf.space_before = Pt(0)
-    pf.space_after = Pt(0)
-    pf.left_indent = None
-    pf.right_indent = None
-    pf.first_line_indent = None
-    
-    # Interligne Multiple 1.08
-    # python-docx utilise line_spacing_rule et line_spacing pour le multiple
-    pf.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
-    pf.line_spacing = 1.08
-    
-    # Gestion des veuves et des orphelins (widow/orphan control)
-    para._element.get_or_add_pPr().set(qn('w:widowControl'), '1')
-
-def _find_terms_heading_index(doc: Document) -> Optional[int]:
-    """
-    Find the index of the 'Essential Travel Terms and Conditions' heading.
-    Returns paragraph index or None if not found.
-    """
-    target = "essential travel terms and conditions"
-    for i, p in enumerate(doc.paragraphs):
-        if p.text and p.text.strip().lower() == target:
-            return i
-    return None
-
 def _compute_usable_width_cm(section) -> float:
     page_cm = section.page_width.cm
     left_cm = section.left_margin.cm
     right_cm = section.right_margin.cm
     return max(0.0, page_cm - left_cm - right_cm)
 
-def build_docx_for_quote(db: Session, quote_id: int) -> BytesIO:
+def _day_has_heroes(day, day_idx: int) -> bool:
+    """Same rule as _insert_day_block: two decorative images, never on the first day."""
+    return day_idx > 0 and len(_get_attr(day, "decorative_images", []) or []) >= 2
+
+
+def hero_image_pairs(quote) -> List[Tuple[str, str]]:
+    """
+    Image pairs the export stitches, in order: the global heroes, then the two
+    first decorative images of days 1..n (sorted by position). Works on a
+    QuoteOut as well as on a Quote row.
+    """
+    pairs = []
+    global_heroes = [u for u in (_get_attr(quote, "hero_photo_1"), _get_attr(quote, "hero_photo_2")) if u]
+    if len(global_heroes) >= 2:
+        pairs.append((global_heroes[0], global_heroes[1]))
+    days = sorted(_get_attr(quote, "days") or [], key=lambda d: _get_attr(d, "position") or 0)
+    for i, day in enumerate(days):
+        if _day_has_heroes(day, i):
+            left, right = (_get_attr(day, "decorative_images") or [])[:2]
+            if isinstance(left, str) and isinstance(right, str):
+                pairs.append((left, right))
+    return pairs
+
+
+def build_docx_for_quote(
+    db: Session,
+    quote_id: int,
+    on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    out: Optional[BinaryIO] = None,
+) -> BinaryIO:
     """
     Build a .docx for the given quote id, using the repository template and inserting
     generated content before the Terms & Conditions heading.
+
+    All the hero images are downloaded concurrently before rendering starts.
+    on_progress, if given, is called with {"days_total", "days_rendered",
+    "images_total", "images_fetched", "images_failed"} as images arrive, once
+    they are all in, and after each day. images_failed counts the downloads
+    that failed: the document is then rendered without those photos and must
+    not be cached as the export of the quote.
+
+    The document is written to out (a seekable binary file, e.g. a spooled
+    temporary file) or to a new BytesIO, and returned rewound.
     """
     # Import here to avoid circular import
-    from ...api.quotes import _to_out
+    from ...api.quotes import _to_out, load_quote
     
-    # Re-query properly:
-    q = db.query(Quote).filter(Quote.id == quote_id).first()
+    # Re-query properly (days, lines and service images in a fixed number of queries):
+    q = load_quote(db, quote_id, include_first_image=True)
     if not q:
         raise ValueError("Quote not found")
     qout = _to_out(q, db=db, include_first_image=True)
 
-    # Load template
-    doc = Document(str(WORD_TEMPLATE_PATH))
-    section = doc.sections[0]
-    usable_width_cm = _compute_usable_width_cm(section)
+    days = sorted(qout.days or [], key=lambda d: _get_attr(d, "position") or 0)
+    global_heroes = [_get_attr(qout, "hero_photo_1"), _get_attr(qout, "hero_photo_2")]
+    global_heroes = [u for u in global_heroes if u]
+    image_urls = list(dict.fromkeys(url for pair in hero_image_pairs(qout) for url in pair))
+    progress = {
+        "days_total": len(days),
+        "days_rendered": 0,
+        "images_total": len(image_urls),
+        "images_fetched": 0,
+        "images_failed": 0,
+    }
 
-    # Find T&C anchor paragraph
-    tc_idx = _find_terms_heading_index(doc)
-    if tc_idx is None:
-        # No T&C found: append content at end
-        # Titre global
-        title = (_get_attr(qout, "display_title") or _get_attr(qout, "title") or "").strip()
-        if title:
-            _add_title(doc, title)
-        # Global heroes
-        global_heroes = [_get_attr(qout, "hero_photo_1"), _get_attr(qout, "hero_photo_2")]
-        global_heroes = [u for u in global_heroes if u]
-        if len(global_heroes) >= 2:
-            _insert_two_heroes(doc, global_heroes[0], global_heroes[1])  # Ignore returned tuple for global photos
-        # Days - trier par position pour respecter l'ordre visuel
-        days = sorted(qout.days or [], key=lambda d: _get_attr(d, "position") or 0)
-        for i, day in enumerate(days):
-            _insert_day_block(doc, qout, day, i, usable_width_cm)
-    else:
-        # Start a fresh doc with same section settings
-        doc = Document()
-        new_sec = doc.sections[0]
-        old_sec = Document(str(WORD_TEMPLATE_PATH)).sections[0]
-        new_sec.page_width = old_sec.page_width
-        new_sec.page_height = old_sec.page_height
-        new_sec.left_margin = old_sec.left_margin
-        new_sec.right_margin = old_sec.right_margin
-        new_sec.top_margin = old_sec.top_margin
-        new_sec.bottom_margin = old_sec.bottom_margin
-        usable_width_cm = _compute_usable_width_cm(new_sec)
-        # Generate content area now on fresh doc
-        title = (_get_attr(qout, "display_title") or _get_attr(qout, "title") or "").strip()
-        if title:
-            _add_title(doc, title)
-        # Global heroes
-        global_heroes = [_get_attr(qout, "hero_photo_1"), _get_attr(qout, "hero_photo_2")]
-        global_heroes = [u for u in global_heroes if u]
-        if len(global_heroes) >= 2:
-            _insert_two_heroes(doc, global_heroes[0], global_heroes[1])  # Ignore returned tuple for global photos
-        # Days - trier par position pour respecter l'ordre visuel
-        days = sorted(qout.days or [], key=lambda d: _get_attr(d, "position") or 0)
-        for i, day in enumerate(days):
-            _insert_day_block(doc, qout, day, i, usable_width_cm)
+    def _report():
+        if on_progress is not None:
+            on_progress(dict(progress))
+
+    def _on_fetched(url, data):
+        progress["images_fetched"] += 1
+        _report()
+
+    # Prefetch stage: the renderer below only reads from this dict
+    images = prefetch_images(image_urls, on_fetched=_on_fetched)
+    progress["images_failed"] = sum(1 for url in image_urls if not images.get(url))
+    _report()
+
+    # Template parsed once per process (section geometry + pre-styled T&C)
+    template = get_word_template()
+    doc = template.new_document()
+    usable_width_cm = _compute_usable_width_cm(doc.sections[0])
+
+    # Titre global
+    title = (_get_attr(qout, "display_title") or _get_attr(qout, "title") or "").strip()
+    if title:
+        _add_title(doc, title)
+    # Global heroes
+    if len(global_heroes) >= 2:
+        _insert_two_heroes(doc, global_heroes[0], global_heroes[1], images=images)  # Ignore returned tuple for global photos
+    # Days - trier par position pour respecter l'ordre visuel
+    for i, day in enumerate(days):
+        _insert_day_block(doc, qout, day, i, usable_width_cm, images=images)
+        progress["days_rendered"] += 1
+        _report()
+
+    if template.has_terms:
         # Page break then re-add T&C with specific style
         doc.add_page_break()
-        # Recharger le template pour récupérer le texte des termes et conditions
-        template_doc = Document(str(WORD_TEMPLATE_PATH))
-        template_tc_paragraphs = template_doc.paragraphs[tc_idx:]
-        # Copier le texte et appliquer le style spécifique
-        for source_para in template_tc_paragraphs:
-            target_para = doc.add_paragraph()
-            # Copier le texte en préservant les runs (pour garder gras/italique si nécessaire)
-            if source_para.runs:
-                for source_run in source_para.runs:
-                    target_run = target_para.add_run(source_run.text)
-                    # Préserver le formatage de base (gras, italique) mais appliquer Arial 8
-                    target_run.bold = source_run.bold
-                    target_run.italic = source_run.italic
-                    target_run.underline = source_run.underline
-                    target_run.font.name = 'Arial'
-                    target_run.font.size = Pt(8)
-                    # Préserver la couleur si elle existe
-                    if source_run.font.color and source_run.font.color.rgb:
-                        target_run.font.color.rgb = source_run.font.color.rgb
-            else:
-                # Paragraphe vide, ajouter un run vide avec Arial 8
-                target_run = target_para.add_run("")
-                target_run.font.name = 'Arial'
-                target_run.font.size = Pt(8)
-            # Appliquer le style de paragraphe spécifique
-            _apply_terms_conditions_style(target_para)
+        template.append_terms(doc)
 
-    # Save to memory
-    out = BytesIO()
+    # Save to the output file
+    if out is None:
+        out = BytesIO()
     doc.save(out)
     out.seek(0)
     return out
@@ -1,5 +1,6 @@
 import bleach
 import html
+from typing import List
 from docx.text.paragraph import Paragraph
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
@@ -50,16 +51,21 @@ def add_hyperlink(paragraph: Paragraph, url: str, text: str) -> None:
     hyperlink.append(new_run)
     paragraph._p.append(hyperlink)
 
-def append_sanitized_html_to_docx(paragraph: Paragraph, html_text: str, allow_italic: bool = False) -> None:
+def append_sanitized_html_to_docx(paragraph: Paragraph, html_text: str, allow_italic: bool = False) -> List[Paragraph]:
     """
     Minimal HTML → Word:
     - <p>/<br>: new paragraphs only when needed (no duplicates)
     - <a>: clickable hyperlink runs
     - <ul>/<ol>/<li>: plain paragraphs with simple bullet/number prefix to avoid template style drift
+
+    Returns the paragraphs written, in document order (paragraph first), so the
+    caller can style them without going through doc.paragraphs.
     """
     safe = sanitize_html(html_text)
     import re
 
+    written = [paragraph]
+
     def _emit_text_or_link(p: Paragraph, chunk: str, allow_italic: bool = False):
         # Gérer les balises <strong> et <b> pour le gras
         # D'abord, traiter les liens
@@ -144,6 +150,7 @@ def append_sanitized_html_to_docx(paragraph: Paragraph, html_text: str, allow_it
         for i, raw in enumerate(items, 1):
             newp = par._parent.add_paragraph()
             newp.style = par.style
+            written.append(newp)
             prefix = f"{i}. " if ordered else "• "
             run = newp.add_run(prefix)
             if not allow_italic:
@@ -170,5 +177,7 @@ def append_sanitized_html_to_docx(paragraph: Paragraph, html_text: str, allow_it
         else:
             newp = paragraph._parent.add_paragraph()
             newp.style = paragraph.style
+            written.append(newp)
             _emit_text_or_link(newp, blk, allow_italic=allow_italic)
+    return written
 
@@ -0,0 +1,244 @@
+"""
+Disk cache of export images.
+
+The same destination/hotel photos are used by many quotes, and every Word export
+used to download them again and redo the crop/resize/JPEG encoding. This cache
+keeps both on disk, content-addressed:
+
+    blobs/<sha256 of the bytes>    downloaded image (shared by all URLs serving it)
+    urls/<sha256 of the URL>.json  {url, digest, etag, last_modified, checked_at}
+    derived/<sha256 of the key>.<fmt>  processed image (JPEG, PNG for hero halves)
+
+A derivative key is built from the content digests of its sources plus the
+processing parameters (size in cm, DPI, quality), so when a photo changes on
+the server its derivatives are simply no longer found. Downloads younger than
+max_age_s are used without asking the server; older ones are revalidated with
+If-None-Match / If-Modified-Since.
+
+Files are evicted least-recently-used (by mtime, refreshed on every hit) when
+the total size exceeds max_bytes. Counters are exposed by stats().
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ...config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_AGE_S, IMAGE_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+_COUNTERS = (
+    "raw_hits", "raw_misses", "raw_revalidated",
+    "derived_hits", "derived_misses", "evictions",
+)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageCache:
+    """Content-addressed disk cache of downloaded images and their derivatives."""
+
+    def __init__(self, root, max_bytes: int, max_age_s: int = IMAGE_CACHE_MAX_AGE_S):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # computed on first write
+        self._counters = {name: 0 for name in _COUNTERS}
+
+    # --- layout -------------------------------------------------------------
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def _url_path(self, url: str) -> Path:
+        h = _sha256(url.encode("utf-8"))
+        return self.root / "urls" / h[:2] / f"{h}.json"
+
+    def _derived_path(self, key: tuple, fmt: str = "jpg") -> Path:
+        h = _sha256(repr(key).encode("utf-8"))
+        return self.root / "derived" / h[:2] / f"{h}.{fmt}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _read(self, path: Path) -> Optional[bytes]:
+        """File content, marking it as recently used; None if missing."""
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path: Path, data: bytes) -> None:
+        """Atomic write (tmp + rename), then evict if the cap is exceeded."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            previous = path.stat().st_size
+        except OSError:
+            previous = 0
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _files(self):
+        for sub in ("blobs", "urls", "derived"):
+            base = self.root / sub
+            if base.exists():
+                yield from (p for p in base.rglob("*") if p.is_file() and not p.name.endswith(".tmp"))
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self._files())
+
+    def _evict(self) -> None:
+        """Delete least recently used files until the cache is back to 90% of the cap."""
+        with self._lock:
+            entries = []
+            for p in self._files():
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            entries.sort(key=lambda e: e[0])
+            size = sum(e[1] for e in entries)
+            target = int(self.max_bytes * 0.9)
+            for _, file_size, path in entries:
+                if size <= target:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                size -= file_size
+                self._counters["evictions"] += 1
+            self._size = size
+
+    # --- downloaded images --------------------------------------------------
+
+    def _meta(self, url: str) -> Optional[Dict[str, Any]]:
+        raw = self._read(self._url_path(url))
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def get_raw(self, url: str) -> Optional[bytes]:
+        """Bytes of a fresh download of url (no network needed), else None."""
+        meta = self._meta(url)
+        if meta and time.time() - meta.get("checked_at", 0) < self.max_age_s:
+            data = self._read(self._blob_path(meta["digest"]))
+            if data is not None:
+                self._count("raw_hits")
+                return data
+        self._count("raw_misses")
+        return None
+
+    def revalidation_headers(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a stale cached download of url."""
+        meta = self._meta(url)
+        if not meta or not self._blob_path(meta["digest"]).exists():
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def not_modified(self, url: str) -> Optional[bytes]:
+        """The server answered 304: keep the cached bytes for another max_age_s."""
+        meta = self._meta(url)
+        if not meta:
+            return None
+        data = self._read(self._blob_path(meta["digest"]))
+        if data is None:
+            return None
+        meta["checked_at"] = time.time()
+        self._write(self._url_path(url), json.dumps(meta).encode("utf-8"))
+        self._count("raw_revalidated")
+        return data
+
+    def put_raw(self, url: str, data: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> str:
+        """Store a download of url; returns its content digest."""
+        digest = _sha256(data)
+        blob = self._blob_path(digest)
+        if not blob.exists():
+            self._write(blob, data)
+        meta = {
+            "url": url,
+            "digest": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            "checked_at": time.time(),
+        }
+        self._write(self._url_path(url), json.dumps(meta).encode("utf-8"))
+        return digest
+
+    def digest(self, url: str) -> Optional[str]:
+        """Content digest of the cached download of url, if any (fresh or not)."""
+        meta = self._meta(url)
+        return meta["digest"] if meta else None
+
+    # --- processed images ---------------------------------------------------
+
+    def get_derived(self, key: tuple, fmt: str = "jpg") -> Optional[bytes]:
+        """Cached derivative for key; fmt is the extension of the format it was stored in."""
+        data = self._read(self._derived_path(key, fmt))
+        self._count("derived_hits" if data is not None else "derived_misses")
+        return data
+
+    def put_derived(self, key: tuple, data: bytes, fmt: str = "jpg") -> None:
+        self._write(self._derived_path(key, fmt), data)
+
+    # --- monitoring ---------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            size = self._size
+        if size is None:
+            size = self._scan_size()
+        out.update({"size_bytes": size, "max_bytes": self.max_bytes, "max_age_s": self.max_age_s})
+        return out
+
+
+_cache: Optional[ImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Process-wide cache configured from IMAGE_CACHE_DIR / IMAGE_CACHE_MAX_MB."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
+
+
+def set_image_cache(cache: Optional[ImageCache]) -> None:
+    """Replace the process-wide cache (tests, scripts)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
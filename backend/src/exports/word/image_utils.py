@@ -1,10 +1,17 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from urllib.request import urlopen, Request
 from urllib.error import URLError, HTTPError
-from typing import Optional
+from typing import Callable, Dict, Iterable, Mapping, Optional
+import httpx
 from PIL import Image, ImageOps
 
-from .settings import cm_to_px, COL_W_CM, COL_H_CM, DPI, JPEG_QUALITY, MAX_IMAGE_BYTES, IMG_TIMEOUT_S, HERO_W_CM, HERO_H_CM
+from .image_cache import ImageCache, get_image_cache
+from .settings import (
+    cm_to_px, COL_W_CM, COL_H_CM, DPI, JPEG_QUALITY, MAX_IMAGE_BYTES, IMG_TIMEOUT_S, IMG_PREFETCH_WORKERS,
+    HERO_W_CM, HERO_H_CM, HERO_DPI, HERO_JPEG_QUALITY,
+)
 
 CM_TO_PX = lambda cm, dpi=300: int(round(cm * dpi / 2.54))
 
@@ -18,6 +25,62 @@ def fetch_image_bytes(url: str, timeout: int = IMG_TIMEOUT_S) -> Optional[BytesI
     except (URLError, HTTPError, ValueError):
         return None
 
+def prefetch_images(
+    urls: Iterable[str],
+    max_workers: int = IMG_PREFETCH_WORKERS,
+    timeout: float = IMG_TIMEOUT_S,
+    on_fetched: Optional[Callable[[str, Optional[bytes]], None]] = None,
+    cache: Optional[ImageCache] = None,
+) -> Dict[str, Optional[bytes]]:
+    """
+    Download all the images of an export concurrently: {url: bytes, or None on failure}.
+
+    A single httpx.Client is shared by the worker threads, so requests to the same
+    host reuse its keep-alive connections; the total time is about the slowest
+    image instead of the sum. Fresh copies in the image cache are used without
+    any request, stale ones are revalidated. on_fetched(url, data) is called in
+    the calling thread as each download completes.
+    """
+    cache = cache or get_image_cache()
+    unique = list(dict.fromkeys(u for u in urls if u))
+    results: Dict[str, Optional[bytes]] = {}
+    if not unique:
+        return results
+    workers = max(1, min(max_workers, len(unique)))
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    with httpx.Client(
+        headers={"User-Agent": "Mozilla/5.0"},
+        timeout=timeout,
+        follow_redirects=True,
+        limits=limits,
+    ) as client:
+
+        def _get(url: str) -> Optional[bytes]:
+            data = cache.get_raw(url)
+            if data is not None:
+                return data
+            try:
+                resp = client.get(url, headers=cache.revalidation_headers(url))
+                if resp.status_code == 304:
+                    data = cache.not_modified(url)
+                    if data is not None:
+                        return data
+                    resp = client.get(url)  # cached copy vanished meanwhile (eviction)
+                resp.raise_for_status()
+            except (httpx.HTTPError, ValueError):
+                return None
+            cache.put_raw(url, resp.content, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            return resp.content
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="img-prefetch") as pool:
+            futures = {pool.submit(_get, url): url for url in unique}
+            for future in as_completed(futures):
+                url = futures[future]
+                results[url] = future.result()
+                if on_fetched is not None:
+                    on_fetched(url, results[url])
+    return results
+
 def ensure_jpeg(buf: BytesIO) -> Image.Image:
     """Open with PIL and convert to RGB JPEG-compatible image."""
     buf.seek(0)
@@ -26,41 +89,120 @@ def ensure_jpeg(buf: BytesIO) -> Image.Image:
         img = img.convert("RGB")
     return img
 
+# Pre-scaling (JPEG draft decoding, integer reduce()) stops at this multiple
+# of the target size, so the final LANCZOS still has enough pixels to work with
+RESAMPLE_HEADROOM = 1.5
+
+def _open_scaled(buf: BytesIO, min_w: int, min_h: int) -> Image.Image:
+    """
+    Like ensure_jpeg(), for an image that will be resized to at least min_w x min_h.
+
+    JPEGs are decoded in draft mode at the smallest DCT scale (1/2, 1/4, 1/8)
+    that keeps RESAMPLE_HEADROOM x that size: a 4000 px supplier photo bound for
+    a 900 px hero is decoded at 2000 px, with a quarter of the memory.
+    """
+    buf.seek(0)
+    img = Image.open(buf)
+    if img.format == "JPEG":
+        img.draft(
+            img.mode if img.mode in ("RGB", "L") else None,
+            (int(min_w * RESAMPLE_HEADROOM), int(min_h * RESAMPLE_HEADROOM)),
+        )
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return img
+
+def _resize(img: Image.Image, size) -> Image.Image:
+    """LANCZOS resize, after a cheap integer reduce() of large downscales."""
+    factor = int(min(img.width / (size[0] * RESAMPLE_HEADROOM), img.height / (size[1] * RESAMPLE_HEADROOM)))
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize(size, Image.LANCZOS)
+
+def _cover_size(w: int, h: int, tw: int, th: int):
+    """Size of a w x h image scaled to cover tw x th (never smaller than the target)."""
+    scale = max(tw / w, th / h)
+    return max(tw, int(round(w * scale))), max(th, int(round(h * scale)))
+
+def _cover_to_px(buf: BytesIO, tw: int, th: int) -> Image.Image:
+    """Decode (draft) and cover-crop a source image to exactly tw x th pixels."""
+    buf.seek(0)
+    with Image.open(buf) as probe:
+        cover_w, cover_h = _cover_size(probe.width, probe.height, tw, th)
+    img = _open_scaled(buf, cover_w, cover_h)
+    return _crop_center(_resize(img, _cover_size(img.width, img.height, tw, th)), tw, th)
+
+def _crop_center(img: Image.Image, tw: int, th: int) -> Image.Image:
+    left = max(0, (img.width - tw) // 2)
+    top = max(0, (img.height - th) // 2)
+    return img.crop((left, top, left + tw, top + th))
+
+# Qualities tried by _compress_to_jpeg_bytes, from the requested one down to this floor
+MIN_JPEG_QUALITY = 50
+JPEG_QUALITY_STEP = 5
+
 def _compress_to_jpeg_bytes(img: Image.Image, quality: int = JPEG_QUALITY, max_bytes: int = MAX_IMAGE_BYTES) -> BytesIO:
-    """Compress to progressive JPEG and cap size by lowering quality if needed."""
-    q = quality
-    out = BytesIO()
-    while True:
-        out.seek(0)
-        out.truncate(0)
+    """
+    Compress to progressive JPEG and cap size by lowering quality if needed.
+
+    Picks the highest of quality, quality-5, ... 50 whose output fits in max_bytes
+    (50 if none does). The size measured at the requested quality usually settles
+    it in one encode; otherwise the candidates are bisected (size decreases with
+    quality), i.e. at most 4 encodes instead of up to 7 for a step-by-step loop.
+    """
+    def _encode(q: int) -> BytesIO:
+        out = BytesIO()
         img.save(out, format="JPEG", quality=q, optimize=True, progressive=True)
-        if out.tell() <= max_bytes or q <= 50:
-            break
-        q -= 5
+        return out
+
+    out = _encode(quality)
+    candidates = list(range(quality - JPEG_QUALITY_STEP, MIN_JPEG_QUALITY - 1, -JPEG_QUALITY_STEP))
+    if out.tell() > max_bytes and candidates:
+        # First candidate that fits; when none does, the floor quality is the last one probed
+        fitting = None
+        lo, hi = 0, len(candidates) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            out = _encode(candidates[mid])
+            if out.tell() <= max_bytes:
+                fitting = out
+                hi = mid - 1
+            else:
+                lo = mid + 1
+        out = fitting or out
     out.seek(0)
     return out
 
 def _cover_crop_image(img: Image.Image, target_w_cm: float, target_h_cm: float, dpi: int = DPI) -> Image.Image:
     """Internal: cover-crop an Image.Image to exact WxH cm."""
     tw, th = cm_to_px(target_w_cm, dpi), cm_to_px(target_h_cm, dpi)
-    # Compute scale to cover
-    scale = max(tw / img.width, th / img.height)
-    new_w, new_h = int(round(img.width * scale)), int(round(img.height * scale))
-    img = img.resize((new_w, new_h), Image.LANCZOS)
-    # Center-crop
-    left = max(0, (new_w - tw) // 2)
-    top = max(0, (new_h - th) // 2)
-    return img.crop((left, top, left + tw, top + th))
+    return _crop_center(_resize(img, _cover_size(img.width, img.height, tw, th)), tw, th)
+
+def _source_digest(buf: BytesIO) -> str:
+    return hashlib.sha256(buf.getvalue()).hexdigest()
 
-def cover_crop_to_cm(buf: BytesIO, target_w_cm: float = COL_W_CM, target_h_cm: float = COL_H_CM, dpi: int = DPI) -> Optional[BytesIO]:
+def cover_crop_to_cm(
+    buf: BytesIO,
+    target_w_cm: float = COL_W_CM,
+    target_h_cm: float = COL_H_CM,
+    dpi: int = DPI,
+    cache: Optional[ImageCache] = None,
+) -> Optional[BytesIO]:
     """
     Resize with 'cover' behavior to exact WxH cm without distortion:
     scale to fill then center-crop the overflow, convert to JPEG, compress.
+    The result is kept in the image cache, keyed by the source content and the parameters.
     """
     try:
-        img = ensure_jpeg(buf)
-        img = _cover_crop_image(img, target_w_cm, target_h_cm, dpi)
-        return _compress_to_jpeg_bytes(img)
+        cache = cache or get_image_cache()
+        key = ("cover", _source_digest(buf), target_w_cm, target_h_cm, dpi, JPEG_QUALITY, MAX_IMAGE_BYTES)
+        cached = cache.get_derived(key)
+        if cached is not None:
+            return BytesIO(cached)
+        img = _cover_to_px(buf, cm_to_px(target_w_cm, dpi), cm_to_px(target_h_cm, dpi))
+        out = _compress_to_jpeg_bytes(img)
+        cache.put_derived(key, out.getvalue())
+        return out
     except Exception:
         return None
 
@@ -93,52 +235,111 @@ def jpeg_bytes(img: Image.Image, quality: int = 85) -> bytes:
     img.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
     return buf.getvalue()
 
-def contain_resize_to_width_cm(buf: BytesIO, page_width_cm: float, dpi: int = DPI) -> Optional[BytesIO]:
+def contain_resize_to_width_cm(
+    buf: BytesIO,
+    page_width_cm: float,
+    dpi: int = DPI,
+    cache: Optional[ImageCache] = None,
+) -> Optional[BytesIO]:
     """
     Resize to fit within page_width_cm (keep aspect, no crop).
-    Good for service images inserted in the flow.
+    Good for service images inserted in the flow. Cached like cover_crop_to_cm().
     """
     try:
-        img = ensure_jpeg(buf)
+        cache = cache or get_image_cache()
+        key = ("contain", _source_digest(buf), page_width_cm, dpi, JPEG_QUALITY, MAX_IMAGE_BYTES)
+        cached = cache.get_derived(key)
+        if cached is not None:
+            return BytesIO(cached)
         tw = cm_to_px(page_width_cm, dpi)
-        if img.width <= tw:
-            return _compress_to_jpeg_bytes(img)  # already small enough
-        scale = tw / img.width
-        new_w, new_h = int(round(img.width * scale)), int(round(img.height * scale))
-        img = img.resize((new_w, new_h), Image.LANCZOS)
-        return _compress_to_jpeg_bytes(img)
+        buf.seek(0)
+        with Image.open(buf) as probe:
+            src_w, src_h = probe.size
+        new_h = max(1, int(round(src_h * tw / src_w)))
+        img = _open_scaled(buf, tw, new_h) if src_w > tw else ensure_jpeg(buf)
+        if img.width > tw:
+            img = _resize(img, (tw, new_h))
+        out = _compress_to_jpeg_bytes(img)  # (as is when already small enough)
+        cache.put_derived(key, out.getvalue())
+        return out
     except Exception:
         return None
 
-def stitch_side_by_side_to_cm(url_left: str, url_right: str, width_cm: float = 14.72, height_cm: float = 4.5, dpi: int = 300) -> bytes:
-    """Download two images, cover-crop each to half width, then stitch into one JPEG."""
+def hero_half(buf: BytesIO, width_px: int, height_px: int, cache: Optional[ImageCache] = None) -> Image.Image:
+    """
+    One side of a stitched hero: the source cover-cropped to width_px x height_px.
+    Cached on its own so that a photo can be prepared before it is paired. The
+    cached copy is a lossless PNG: the stitched hero is encoded once from the
+    same pixels whether the half came from the cache or not.
+    """
+    cache = cache or get_image_cache()
+    key = ("hero_half", _source_digest(buf), width_px, height_px)
+    cached = cache.get_derived(key, fmt="png")
+    if cached is not None:
+        return Image.open(BytesIO(cached))
+    img = _cover_to_px(buf, width_px, height_px)
+    out = BytesIO()
+    img.save(out, format="PNG", compress_level=1)
+    cache.put_derived(key, out.getvalue(), fmt="png")
+    return img
+
+def _hero_size_px(width_cm: float, height_cm: float, dpi: int):
     W = CM_TO_PX(width_cm, dpi)
     H = CM_TO_PX(height_cm, dpi)
-    half_w = W // 2
-
-    def _cover(img: Image.Image, tgt_w: int, tgt_h: int) -> Image.Image:
-        r = max(tgt_w / img.width, tgt_h / img.height)
-        nw, nh = int(img.width * r), int(img.height * r)
-        img = img.resize((nw, nh), Image.LANCZOS)
-        x0 = (nw - tgt_w) // 2
-        y0 = (nh - tgt_h) // 2
-        return img.crop((x0, y0, x0 + tgt_w, y0 + tgt_h))
-
-    left_buf = fetch_image_bytes(url_left)
-    right_buf = fetch_image_bytes(url_right)
+    return W, H, W // 2
+
+def stitch_side_by_side_to_cm(
+    url_left: str,
+    url_right: str,
+    width_cm: float = HERO_W_CM,
+    height_cm: float = HERO_H_CM,
+    dpi: int = HERO_DPI,
+    images: Optional[Mapping[str, Optional[bytes]]] = None,
+    cache: Optional[ImageCache] = None,
+    quality: int = HERO_JPEG_QUALITY,
+) -> bytes:
+    """
+    Download two images, cover-crop each to half width, then stitch into one JPEG.
+    images: bytes already downloaded by prefetch_images(); URLs missing from it are fetched here.
+    The stitched JPEG is kept in the image cache, keyed by the content of both
+    sources and the size/DPI/quality, so a known pair costs no PIL work.
+    """
+    cache = cache or get_image_cache()
+    W, H, half_w = _hero_size_px(width_cm, height_cm, dpi)
+
+    def _load(url: str) -> Optional[BytesIO]:
+        if images is not None and url in images:
+            data = images[url]
+            return BytesIO(data) if data else None
+        return fetch_image_bytes(url)
+
+    left_buf = _load(url_left)
+    right_buf = _load(url_right)
     if not (left_buf and right_buf):
         raise ValueError("Failed to fetch one or both images")
-    
-    imL = ensure_jpeg(left_buf)
-    imR = ensure_jpeg(right_buf)
-    imL = _cover(imL, half_w, H)
-    imR = _cover(imR, half_w, H)
+
+    key = ("stitch", _source_digest(left_buf), _source_digest(right_buf), width_cm, height_cm, dpi, quality)
+    cached = cache.get_derived(key)
+    if cached is not None:
+        return cached
+
+    imL = hero_half(left_buf, half_w, H, cache)
+    imR = hero_half(right_buf, half_w, H, cache)
 
     canvas = Image.new("RGB", (W, H), (255, 255, 255))
     canvas.paste(imL, (0, 0))
     canvas.paste(imR, (half_w, 0))
 
     out = BytesIO()
-    canvas.save(out, format="JPEG", optimize=True, progressive=True, quality=86)
+    canvas.save(out, format="JPEG", optimize=True, progressive=True, quality=quality)
+    cache.put_derived(key, out.getvalue())
     return out.getvalue()
 
+def warm_image_derivatives(data: bytes, cache: Optional[ImageCache] = None) -> None:
+    """
+    Build, before a photo is used, the derivative a Word export reads from any
+    photo: its hero half (whatever it is paired with). Other images go into the
+    document from their downloaded bytes.
+    """
+    _, H, half_w = _hero_size_px(HERO_W_CM, HERO_H_CM, HERO_DPI)
+    hero_half(BytesIO(data), half_w, H, cache)
@@ -11,6 +11,7 @@ DPI = 150  # print/email friendly
 JPEG_QUALITY = 80  # target quality for JPEG
 MAX_IMAGE_BYTES = 900_000  # ~900 KB max per inserted image
 IMG_TIMEOUT_S = 5  # per-image download timeout
+IMG_PREFETCH_WORKERS = 8  # concurrent downloads when prefetching the images of an export
 
 # Utility conversions
 CM_PER_INCH = 2.54
@@ -35,4 +36,6 @@ SP_AFTER_NORMAL_PT = 0  # Normal: Après = 0 pt (modif demandée)
 # Image size (cm)
 HERO_W_CM = 14.72
 HERO_H_CM = 4.5
+HERO_DPI = 300
+HERO_JPEG_QUALITY = 86
 
@@ -0,0 +1,171 @@
+"""
+Word template, parsed once per process.
+
+Every export used to open WORD_TEMPLATE_PATH three times (to find the Terms &
+Conditions heading, to copy the section geometry, to read the T&C paragraphs)
+and then rebuild the T&C run by run, re-applying fonts. The template is now
+parsed once: the section geometry is kept as values and the T&C are rendered
+once, already styled (Arial 8, T&C paragraph format), into a list of <w:p>
+elements. An export deep-copies that fragment at the end of its document.
+
+get_word_template() stats the file on each call and reparses it when its mtime
+or size changed, so replacing the template does not need a restart. digest (of
+the file content) identifies the template version, e.g. in export cache keys.
+"""
+import hashlib
+import logging
+import os
+import threading
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+from docx.oxml.ns import qn
+from docx.shared import Pt
+from docx.text.paragraph import Paragraph
+
+from .settings import WORD_TEMPLATE_PATH
+
+logger = logging.getLogger(__name__)
+
+SECTION_ATTRS = ("page_width", "page_height", "left_margin", "right_margin", "top_margin", "bottom_margin")
+
+
+def _apply_terms_conditions_style(para: Paragraph):
+    """
+    Applique le style spécifique aux termes et conditions :
+    - Police Arial 8
+    - Alignement : Gauche
+    - Espacement avant : 0 pt
+    - Espacement après : 0 pt
+    - Interligne : Multiple 1.08
+    - Mise en retrait : 0" avant et après
+    - Gestion des veuves et des orphelins activée
+    """
+    # Alignement à gauche
+    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    # Formatage du paragraphe
+    pf = para.paragraph_format
+    pf.space_before = Pt(0)
+    pf.space_after = Pt(0)
+    pf.left_indent = None
+    pf.right_indent = None
+    pf.first_line_indent = None
+
+    # Interligne Multiple 1.08
+    # python-docx utilise line_spacing_rule et line_spacing pour le multiple
+    pf.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
+    pf.line_spacing = 1.08
+
+    # Gestion des veuves et des orphelins (widow/orphan control)
+    para._element.get_or_add_pPr().set(qn('w:widowControl'), '1')
+
+
+def _find_terms_heading_index(doc: Document) -> Optional[int]:
+    """
+    Find the index of the 'Essential Travel Terms and Conditions' heading.
+    Returns paragraph index or None if not found.
+    """
+    target = "essential travel terms and conditions"
+    for i, p in enumerate(doc.paragraphs):
+        if p.text and p.text.strip().lower() == target:
+            return i
+    return None
+
+
+def _styled_terms_fragment(source_paras: List[Paragraph]) -> list:
+    """Render the T&C paragraphs with the export style into a scratch document; returns their <w:p>."""
+    scratch = Document()
+    fragment = []
+    for source_para in source_paras:
+        target_para = scratch.add_paragraph()
+        # Copier le texte en préservant les runs (pour garder gras/italique si nécessaire)
+        if source_para.runs:
+            for source_run in source_para.runs:
+                target_run = target_para.add_run(source_run.text)
+                # Préserver le formatage de base (gras, italique) mais appliquer Arial 8
+                target_run.bold = source_run.bold
+                target_run.italic = source_run.italic
+                target_run.underline = source_run.underline
+                target_run.font.name = 'Arial'
+                target_run.font.size = Pt(8)
+                # Préserver la couleur si elle existe
+                if source_run.font.color and source_run.font.color.rgb:
+                    target_run.font.color.rgb = source_run.font.color.rgb
+        else:
+            # Paragraphe vide, ajouter un run vide avec Arial 8
+            target_run = target_para.add_run("")
+            target_run.font.name = 'Arial'
+            target_run.font.size = Pt(8)
+        # Appliquer le style de paragraphe spécifique
+        _apply_terms_conditions_style(target_para)
+        fragment.append(target_para._p)
+    return fragment
+
+
+class WordTemplate:
+    """What an export needs from the template, computed once from the file."""
+
+    def __init__(self, path: Path, data: bytes, stamp: tuple):
+        self.path = path
+        self.data = data
+        self.stamp = stamp
+        self.digest = hashlib.sha256(data).hexdigest()
+        doc = Document(BytesIO(data))
+        self.terms_index = _find_terms_heading_index(doc)
+        section = doc.sections[0]
+        self.section = {name: getattr(section, name) for name in SECTION_ATTRS}
+        self.terms_fragment = []
+        if self.terms_index is not None:
+            self.terms_fragment = _styled_terms_fragment(doc.paragraphs[self.terms_index:])
+
+    @property
+    def has_terms(self) -> bool:
+        return self.terms_index is not None
+
+    def new_document(self) -> Document:
+        """
+        Document to render an export into. With T&C: a blank document with the
+        template's page size and margins (the T&C are added by append_terms).
+        Without: the template itself, parsed from the cached bytes.
+        """
+        if not self.has_terms:
+            return Document(BytesIO(self.data))
+        doc = Document()
+        section = doc.sections[0]
+        for name, value in self.section.items():
+            setattr(section, name, value)
+        return doc
+
+    def append_terms(self, doc: Document) -> None:
+        """Append a copy of the pre-styled T&C paragraphs at the end of doc's body."""
+        body = doc.element.body
+        sect_pr = body.sectPr
+        for p in self.terms_fragment:
+            if sect_pr is not None:
+                sect_pr.addprevious(deepcopy(p))
+            else:
+                body.append(deepcopy(p))
+
+
+_templates: Dict[Path, WordTemplate] = {}
+_lock = threading.Lock()
+
+
+def get_word_template(path=None) -> WordTemplate:
+    """Parsed template at path (default WORD_TEMPLATE_PATH), reparsed if the file changed."""
+    path = Path(path or WORD_TEMPLATE_PATH)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _templates.get(path)
+        if cached is not None and cached.stamp == stamp:
+            return cached
+        template = WordTemplate(path, path.read_bytes(), stamp)
+        _templates[path] = template
+    logger.info(f"[word_template] {'reloaded' if cached else 'loaded'} {path.name}")
+    return template
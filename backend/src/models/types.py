@@ -0,0 +1,87 @@
+"""
+Column types shared by the models.
+
+CompressedJSON: compressed storage of quote version snapshots and deltas
+(QuoteVersion.snapshot_json / snapshot_delta).
+
+A stored value is one format byte followed by a raw deflate stream of the
+compact JSON text, compressed with a preset dictionary (zlib zdict). The
+dictionary holds the strings every snapshot repeats: the keys of the quote,
+day and line dumps (build_quote_snapshot) and of the deltas
+(services/version_delta.py), in serialization order, and common values. A
+small version or delta therefore compresses well even though it repeats these
+strings only a few times itself.
+
+The format byte selects the dictionary. A stored value must stay decodable:
+never change a dictionary in place; add a new one under a new format byte and
+point SNAPSHOT_FORMAT at it (older values keep decoding with theirs).
+"""
+import json
+import zlib
+from typing import Any
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# Format 1: the strings of a snapshot, the most frequent (line keys) last,
+# where deflate reaches them with the shortest distances
+_DICTIONARY_1 = (
+    '{"set": {}, "unset": [], "days": [{"id": 1, "set": {}, "lines": [{"new": {}}]}]}'
+    '"Trip info""Private Transfer""Train""Ferry""Flight""Small Group""Private""New Hotel"'
+    '"Hotel""Car rental""Cost""Internal""Activity""USD""EUR"'
+    '{"id": 1, "title": "", "display_title": null, "hero_photo_1": null, "hero_photo_2": null, '
+    '"pax": 2, "start_date": "2026-01-01", "end_date": "2026-01-01", "travel_agency": null, '
+    '"travel_advisor": null, "client_name": null, "fx_rate": 1.0, "internal_note": null, '
+    '"margin_pct": 0.1627, "onspot_manual": null, "hassle_manual": null, "onspot_total": 0.0, '
+    '"hassle_total": 0.0, "commissionable_net": 0.0, "commission_total": 0.0, "sell_total": 0.0, '
+    '"grand_total": 0.0, '
+    '"days": [{"id": 1, "position": 0, "date": "2026-01-01", "destination": "", '
+    '"decorative_images": [], "lines": ['
+    '{"id": 1, "position": 0, "service_id": null, "category": "Activity", "title": "", '
+    '"supplier_name": null, "visibility": "client", "achat_eur": null, "achat_usd": null, '
+    '"vente_usd": null, "fx_rate": null, "currency": "EUR", "base_net_amount": null, '
+    '"raw_json": {"description": "<p></p>", "full_description": "", "start_time": "", '
+    '"activity_duration": "", "hotel_name": "", "hotel_url": "", "provider_service_url": "", '
+    '"internal_note": "", "buff_pct": null, "fields": {}}}, '
+    '{"id": 2, "position": 1, "service_id": null, "category": "Hotel", "title": "", '
+    '"supplier_name": null, "visibility": "client", "achat_eur": null, "achat_usd": null, '
+    '"vente_usd": null, "fx_rate": null, "currency": "EUR", "base_net_amount": null, "raw_json": {}}]}]}'
+).encode()
+
+_DICTIONARIES = {1: _DICTIONARY_1}
+
+SNAPSHOT_FORMAT = 1
+
+_LEVEL = 6
+_WBITS = -15  # raw deflate: no zlib header/checksum (the JSON decode validates)
+
+
+def encode_snapshot(value: Any) -> bytes:
+    """Stored bytes of a snapshot or delta (JSON types only)."""
+    text = json.dumps(value, ensure_ascii=False).encode()
+    compressor = zlib.compressobj(_LEVEL, zlib.DEFLATED, _WBITS, zdict=_DICTIONARIES[SNAPSHOT_FORMAT])
+    return bytes([SNAPSHOT_FORMAT]) + compressor.compress(text) + compressor.flush()
+
+
+def decode_snapshot(data: bytes) -> Any:
+    """The snapshot or delta stored by encode_snapshot (any format)."""
+    data = bytes(data)
+    zdict = _DICTIONARIES.get(data[0]) if data else None
+    if zdict is None:
+        raise ValueError(f"Unknown snapshot format {data[:1]!r}")
+    decompressor = zlib.decompressobj(_WBITS, zdict=zdict)
+    return json.loads(decompressor.decompress(data[1:]) + decompressor.flush())
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON stored as a compressed blob (encode_snapshot), decoded when loaded."""
+
+    impl = LargeBinary
+
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_snapshot(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_snapshot(value)
@@ -0,0 +1,37 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, JSON, String, Text
+
+from .models.db import Base
+from .models_quote import utcnow
+
+
+class ExportJob(Base):
+    """Background Word/Excel export of a quote (see services/export_jobs.py)."""
+
+    __tablename__ = "export_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+
+    quote_id = Column(Integer, ForeignKey("quotes.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    kind = Column(String(10), nullable=False)  # word, excel
+
+    status = Column(String(10), nullable=False, default="queued", index=True)  # queued, running, done, failed
+
+    # {"days_total", "days_rendered", "images_total", "images_fetched", "images_failed"}
+    progress = Column(JSON, nullable=False, default=dict)
+
+    create_version = Column(Boolean, nullable=False, default=False)
+
+    created_by = Column(String(255), nullable=True)
+
+    file_name = Column(String(255), nullable=True)  # download name (quote title)
+
+    file_path = Column(String(500), nullable=True)  # result on disk
+
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+
+    started_at = Column(DateTime, nullable=True)
+
+    finished_at = Column(DateTime, nullable=True)
@@ -2,12 +2,16 @@ from datetime import datetime, date, timezone
 
 from decimal import Decimal
 
-from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Numeric, Text, JSON, func
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index, Numeric, Text, JSON, UniqueConstraint, func
 
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, foreign, deferred
 
 from .models.db import Base
 
+from .models.prod_models import ServiceImage
+
+from .models.types import CompressedJSON
+
 def utcnow():
     return datetime.now(timezone.utc)
 
@@ -72,6 +76,10 @@ class Quote(Base):
 
     grand_total = Column(DEC2, nullable=False, default=Decimal("0.00"))
 
+    # Number of the last version label allocated (v1, v2, ...): incremented
+    # atomically by quote_versioning.allocate_version_label, never reused
+    last_version_number = Column(Integer, nullable=False, default=0, server_default="0")
+
 
 
     created_at = Column(DateTime, default=utcnow, nullable=False)
@@ -160,6 +168,19 @@ class QuoteLine(Base):
 
     day = relationship("QuoteDay", back_populates="lines")
 
+    # Catalog images of the linked service (read-only, first one = cover image)
+    service_images = relationship(
+
+        ServiceImage,
+
+        primaryjoin=lambda: QuoteLine.service_id == foreign(ServiceImage.service_id),
+
+        order_by=lambda: ServiceImage.id,
+
+        viewonly=True,
+
+    )
+
 
 
 
@@ -167,6 +188,11 @@ class QuoteVersion(Base):
 
     __tablename__ = "quote_versions"
 
+    __table_args__ = (
+        Index("ix_quote_versions_quote_content_hash", "quote_id", "content_hash"),
+        UniqueConstraint("quote_id", "label", name="uq_quote_versions_quote_label"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
 
     quote_id = Column(Integer, ForeignKey("quotes.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -185,9 +211,26 @@ class QuoteVersion(Base):
 
     export_file_name = Column(String(255), nullable=True)
 
+    export_artifact = Column(String(64), nullable=True)  # Export cache key of the exported file (services/export_cache.py)
+
     total_price = Column(DEC2, nullable=True)
 
-    snapshot_json = Column(JSON, nullable=False)
+    # Full snapshot on keyframes; other versions store snapshot_delta against
+    # base_version_id (services/version_delta.py) and are rebuilt by
+    # load_version_snapshot() after delta_depth delta applications.
+    # Both are compressed and deferred: loaded (together) and decoded only when
+    # accessed, so listing versions never reads them
+    snapshot_json = deferred(Column(CompressedJSON, nullable=True), group="snapshot")
+
+    snapshot_delta = deferred(Column(CompressedJSON, nullable=True), group="snapshot")
+
+    base_version_id = Column(Integer, ForeignKey("quote_versions.id"), nullable=True)
+
+    delta_depth = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # SHA-256 of the canonical snapshot (quote_versioning.snapshot_hash): an
+    # auto version is not created when the latest version has the same content
+    content_hash = Column(String(64), nullable=True)
 
     archived_at = Column(DateTime, nullable=True, index=True)
 
@@ -0,0 +1,230 @@
+"""
+Batch export of many quotes (Word or Excel) into a single ZIP.
+
+Used for end-of-season reviews (e.g. the Excel cost sheets of every quote of a
+travel agency) instead of calling /quotes/{id}/export/excel hundreds of times.
+
+The quotes are rendered by a pool of worker processes (EXPORT_BATCH_WORKERS,
+one per CPU up to 4), each with its own database connection, through the
+export cache (services/export_cache.py). Workers write their file to a
+temporary directory and only its path comes back; the parent adds each file
+to the ZIP as soon as it is done and deletes it. At most 2 x workers quotes
+are in flight, so memory and temporary disk use stay bounded whatever the
+number of quotes.
+
+The ZIP can be written to a non-seekable stream (the HTTP response): entries
+then use data descriptors. It ends with export_report.json listing the files
+and the quotes that failed.
+
+Processes need a database they can open: with an in-memory SQLite database
+(tests) the pool falls back to threads sharing the engine.
+
+CLI (from backend/):
+    python -m src.services.export_batch --out quotes.zip [--kind excel|word]
+        [--ids 1,2,3] [--updated-since 2025-01-01] [--travel-agency NAME] [--workers N]
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, replace
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..config import EXPORT_BATCH_WORKERS
+from .quote_versioning import EXPORT_TYPE_EXCEL, EXPORT_TYPE_WORD
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {EXPORT_TYPE_WORD: "docx", EXPORT_TYPE_EXCEL: "xlsx"}
+REPORT_NAME = "export_report.json"
+CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class ExportBatchProgress:
+    """Progress of a batch export, reported after each quote."""
+    total: int
+    exported: int = 0
+    failed: int = 0
+    done: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# --- worker side -------------------------------------------------------------
+
+_worker_sessions: Optional[sessionmaker] = None
+
+
+def _init_worker(bind) -> None:
+    """Pool initializer: a database URL (process) or the parent's Engine (thread)."""
+    global _worker_sessions
+    if isinstance(bind, Engine):
+        _worker_sessions = sessionmaker(bind=bind)
+        return
+    # Every mapped class must be known before the first query in a fresh process
+    from ..models import auth_models, prod_models, staging_models  # noqa: F401
+    from .. import models_audit, models_export, models_geo, models_quote  # noqa: F401
+
+    connect_args = {"check_same_thread": False} if bind.startswith("sqlite") else {}
+    _worker_sessions = sessionmaker(bind=create_engine(bind, connect_args=connect_args))
+
+
+def _render_to_file(kind: str, quote_id: int, directory: str) -> Dict[str, Any]:
+    """Render one quote into directory; returns its path and download name."""
+    from ..api.quotes import export_file_name, load_quote
+    from .export_cache import export_cache_key, get_export_cache
+    from .quote_versioning import build_quote_snapshot
+
+    with _worker_sessions() as db:
+        q = load_quote(db, quote_id)
+        if q is None:
+            raise ValueError(f"Quote {quote_id} not found")
+        path = os.path.join(directory, f"{quote_id}.{EXTENSIONS[kind]}")
+        key = export_cache_key(kind, build_quote_snapshot(q, db=db))
+        cache = get_export_cache()
+        with open(path, "w+b") as out:
+            cached = cache.open(key)
+            if cached is not None:
+                with cached:
+                    shutil.copyfileobj(cached, out)
+            else:
+                progress: Dict[str, int] = {}
+                if kind == EXPORT_TYPE_WORD:
+                    from ..exports.word import build_docx_for_quote
+                    build_docx_for_quote(db, quote_id, on_progress=progress.update, out=out)
+                else:
+                    from ..exports.excel import build_xlsx_for_quote
+                    build_xlsx_for_quote(db, quote_id, out=out)
+                # Photos that could not be downloaded: not cached, the next export retries
+                if not progress.get("images_failed"):
+                    cache.put(key, out)
+        return {"quote_id": quote_id, "path": path, "file_name": export_file_name(q, EXTENSIONS[kind])}
+
+
+# --- parent side -------------------------------------------------------------
+
+def _executor(bind: Engine, max_workers: int) -> Executor:
+    url = bind.url
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return ThreadPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(bind,))
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),  # no fork of a threaded server
+        initializer=_init_worker,
+        initargs=(url.render_as_string(hide_password=False),),
+    )
+
+
+def export_batch(
+    db: Session,
+    kind: str,
+    quote_ids: Sequence[int],
+    out: BinaryIO,
+    max_workers: int = EXPORT_BATCH_WORKERS,
+) -> Iterator[ExportBatchProgress]:
+    """
+    Export the quotes to a ZIP written to out (seekable or not).
+
+    Yields an ExportBatchProgress after each quote, and a final one with
+    done=True once the ZIP is complete. A quote that fails to render is
+    listed in export_report.json instead of stopping the batch.
+    """
+    if kind not in EXTENSIONS:
+        raise ValueError(f"Unknown export kind: {kind!r}")
+    quote_ids = list(dict.fromkeys(quote_ids))
+    progress = ExportBatchProgress(total=len(quote_ids))
+    report: Dict[str, List[Dict[str, Any]]] = {"files": [], "failed": []}
+    window = max(1, max_workers) * 2
+
+    with tempfile.TemporaryDirectory(prefix="export_batch_") as directory, \
+            _executor(db.get_bind(), max(1, max_workers)) as pool, \
+            zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        pending = {}
+        queue = iter(quote_ids)
+
+        def _submit_next() -> None:
+            for quote_id in queue:
+                pending[pool.submit(_render_to_file, kind, quote_id, directory)] = quote_id
+                return
+
+        for _ in range(window):
+            _submit_next()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                quote_id = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"[export_batch] quote {quote_id} failed: {e}")
+                    report["failed"].append({"quote_id": quote_id, "error": str(e)})
+                    progress.failed += 1
+                else:
+                    arcname = f"{quote_id} - {result['file_name']}"
+                    with open(result["path"], "rb") as src, zf.open(arcname, "w") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_BYTES)
+                    os.remove(result["path"])
+                    report["files"].append({"quote_id": quote_id, "name": arcname})
+                    progress.exported += 1
+                _submit_next()
+                yield replace(progress)
+        zf.writestr(REPORT_NAME, json.dumps({"kind": kind, **progress.as_dict(), **report}, indent=2))
+
+    progress.done = True
+    logger.info(f"[export_batch] {kind}: {progress.as_dict()}")
+    yield replace(progress)
+
+
+class ChunkSink:
+    """Write-only, non-seekable file collecting what the ZIP writer produces, drained by the caller."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _main(argv=None) -> None:
+    import argparse
+
+    from ..models.db import SessionLocal
+    from .quote_reprice import select_quote_ids
+
+    parser = argparse.ArgumentParser(description="Export many quotes to a single ZIP.")
+    parser.add_argument("--out", required=True, help="ZIP file to write")
+    parser.add_argument("--kind", choices=sorted(EXTENSIONS), default=EXPORT_TYPE_EXCEL)
+    parser.add_argument("--ids", help="Comma-separated quote ids")
+    parser.add_argument("--updated-since", help="Only quotes updated since this ISO date/datetime")
+    parser.add_argument("--travel-agency", help="Only quotes of this travel agency (case-insensitive)")
+    parser.add_argument("--workers", type=int, default=EXPORT_BATCH_WORKERS)
+    args = parser.parse_args(argv)
+
+    ids = [int(x) for x in args.ids.split(",") if x.strip()] if args.ids else None
+    with SessionLocal() as db, open(args.out, "wb") as out:
+        quote_ids = select_quote_ids(db, ids, args.updated_since, args.travel_agency)
+        for p in export_batch(db, args.kind, quote_ids, out, max_workers=args.workers):
+            print(f"{p.exported + p.failed}/{p.total} quotes, {p.failed} failed{' (done)' if p.done else ''}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,186 @@
+"""
+Cache of rendered exports.
+
+The same quote is often exported several times in a row (send to client,
+resend, download again) and each request rebuilt the whole document. Rendered
+files are now kept on disk under a key made of:
+
+- the quote content: a hash of build_quote_snapshot() (what a version stores),
+- the export kind and the template version (digest of the Word template),
+- EXPORT_CACHE_FORMAT, to bump when the renderers change their output.
+
+A repeat export of an unchanged quote streams the stored file. The key is also
+recorded on the auto version created by the export (QuoteVersion.export_artifact),
+so the exact file sent with a version can be downloaded while it is cached.
+
+Hero photos are referenced by URL in the snapshot: if a photo changes on its
+server without its URL changing, cached exports keep the old one until they
+age out (EXPORT_CACHE_MAX_AGE_S, counted from the file's mtime). Files are
+evicted least-recently-used (atime, set on every hit) once the total size
+exceeds EXPORT_CACHE_MAX_MB.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+from ..config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_AGE_S, EXPORT_CACHE_MAX_MB
+from .quote_versioning import EXPORT_TYPE_WORD
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_FORMAT = 2
+
+_COUNTERS = ("hits", "misses", "stores", "evictions", "expired")
+
+
+def template_version(kind: str) -> str:
+    """Version of what the export is rendered from, besides the quote."""
+    if kind == EXPORT_TYPE_WORD:
+        from ..exports.word.template_cache import get_word_template
+        return get_word_template().digest
+    return "-"
+
+
+def export_cache_key(kind: str, snapshot: Dict[str, Any]) -> str:
+    """Cache key of the kind export of a quote whose content is snapshot."""
+    content = json.dumps(snapshot, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    h = hashlib.sha256(f"{EXPORT_CACHE_FORMAT}:{kind}:{template_version(kind)}:".encode("utf-8"))
+    h.update(content.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ExportCache:
+    """Disk cache of rendered export files, with size (LRU) and age eviction."""
+
+    def __init__(self, root, max_bytes: int, max_age_s: int = EXPORT_CACHE_MAX_AGE_S):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._counters = {name: 0 for name in _COUNTERS}
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _fresh(self, path: Path) -> bool:
+        try:
+            stored_at = path.stat().st_mtime
+        except OSError:
+            return False
+        if time.time() - stored_at < self.max_age_s:
+            return True
+        try:
+            path.unlink()
+            self._count("expired")
+        except OSError:
+            pass
+        return False
+
+    def has(self, key: str) -> bool:
+        return self._fresh(self.path(key))
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """The stored file of key opened for reading, or None (missing or too old)."""
+        path = self.path(key)
+        if self._fresh(path):
+            try:
+                f = open(path, "rb")
+            except OSError:
+                f = None
+            if f is not None:
+                try:
+                    # atime = last use (LRU); mtime stays the time it was stored (age)
+                    os.utime(path, (time.time(), os.stat(path).st_mtime))
+                except OSError:
+                    pass
+                self._count("hits")
+                return f
+        self._count("misses")
+        return None
+
+    def put(self, key: str, f: BinaryIO) -> None:
+        """Store the content of f (from its start). Failures are only logged."""
+        path = self.path(key)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            f.seek(0)
+            with open(tmp, "wb") as dst:
+                shutil.copyfileobj(f, dst)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[export_cache] could not store {key}: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        self._count("stores")
+        self._evict()
+
+    def _files(self):
+        if self.root.exists():
+            yield from (p for p in self.root.rglob("*") if p.is_file() and not p.name.endswith(".tmp"))
+
+    def _evict(self) -> None:
+        """Delete least recently used files until the cache is back under the cap."""
+        with self._lock:
+            entries = []
+            for p in self._files():
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((max(st.st_atime, st.st_mtime), st.st_size, p))
+            size = sum(e[1] for e in entries)
+            if size <= self.max_bytes:
+                return
+            entries.sort(key=lambda e: e[0])
+            for _, file_size, path in entries:
+                if size <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                size -= file_size
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+        files = list(self._files())
+        out.update({
+            "files": len(files),
+            "size_bytes": sum(p.stat().st_size for p in files),
+            "max_bytes": self.max_bytes,
+            "max_age_s": self.max_age_s,
+        })
+        return out
+
+
+_cache: Optional[ExportCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache() -> ExportCache:
+    """Process-wide cache configured from EXPORT_CACHE_DIR / EXPORT_CACHE_MAX_MB."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
+
+
+def set_export_cache(cache: Optional[ExportCache]) -> None:
+    """Replace the process-wide cache (tests, scripts)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,278 @@
+"""
+Background Word/Excel exports.
+
+A Word export with many days and hero photos can take tens of seconds, which
+is too long to hold an HTTP request open. POST /quotes/{id}/export-jobs only
+records an ExportJob row (status "queued") and hands its id to a small thread
+pool; the worker builds the file, reports progress on the row (days rendered,
+images fetched) and writes the result under EXPORT_JOBS_DIR. Clients poll the
+job and download the file once it is "done".
+
+The export_jobs table is the queue: there is no broker, and on startup
+resume_pending_jobs() re-queues the jobs a previous process left queued or
+running, so a restart does not lose them.
+
+Jobs share the export cache (services/export_cache.py) with the synchronous
+endpoints: an unchanged quote is copied from there instead of being rebuilt.
+"""
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from time import monotonic
+from typing import BinaryIO, Callable, Dict, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from ..config import EXPORT_JOB_RETENTION_HOURS, EXPORT_JOBS_DIR, EXPORT_WORKERS
+from ..models_export import ExportJob
+from ..models_quote import Quote, utcnow
+from .export_cache import export_cache_key, get_export_cache
+
+logger = logging.getLogger(__name__)
+
+EXPORT_KIND_WORD = "word"
+EXPORT_KIND_EXCEL = "excel"
+EXPORT_KINDS = (EXPORT_KIND_WORD, EXPORT_KIND_EXCEL)
+
+MEDIA_TYPES = {
+    EXPORT_KIND_WORD: "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    EXPORT_KIND_EXCEL: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+_EXTENSIONS = {EXPORT_KIND_WORD: "docx", EXPORT_KIND_EXCEL: "xlsx"}
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Progress is written at most this often (plus once at the end)
+PROGRESS_INTERVAL_S = 0.5
+
+_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+# Jobs found running that were started before this moment belong to a previous process
+_PROCESS_STARTED = utcnow()
+
+
+def job_to_dict(job: ExportJob) -> Dict:
+    """Public shape of a job (GET /quotes/{id}/export-jobs/{job_id})."""
+    return {
+        "id": job.id,
+        "quote_id": job.quote_id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress or {},
+        "file_name": job.file_name,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def enqueue_export(
+    db: Session,
+    quote_id: int,
+    kind: str,
+    session_factory: Callable[[], Session],
+    created_by: Optional[str] = None,
+    create_version: bool = False,
+) -> ExportJob:
+    """
+    Record a queued export job for a quote and submit it to the worker pool.
+
+    session_factory opens the session the worker uses (the request session is
+    closed long before the job runs). Raises ValueError for an unknown kind.
+    """
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Unknown export kind: {kind!r} (expected one of {', '.join(EXPORT_KINDS)})")
+    job = ExportJob(
+        id=uuid.uuid4().hex,
+        quote_id=quote_id,
+        kind=kind,
+        status=STATUS_QUEUED,
+        progress={},
+        created_by=created_by,
+        create_version=create_version,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _pool.submit(run_job, job.id, session_factory)
+    return job
+
+
+def result_path(job: ExportJob) -> Path:
+    return Path(EXPORT_JOBS_DIR) / f"{job.id}.{_EXTENSIONS[job.kind]}"
+
+
+def _build(db: Session, job: ExportJob, on_progress, out: BinaryIO) -> None:
+    """Render the job's file into out; job.progress holds its last progress report."""
+    if job.kind == EXPORT_KIND_WORD:
+        from ..exports.word import build_docx_for_quote
+        build_docx_for_quote(db, job.quote_id, on_progress=on_progress, out=out)
+    else:
+        from ..exports.excel import build_xlsx_for_quote
+        build_xlsx_for_quote(db, job.quote_id, out=out)
+
+
+def _create_version(db: Session, job: ExportJob, quote: Quote, artifact: str, snapshot: dict) -> None:
+    """Automatic version after a successful export, as the synchronous endpoints do."""
+    from ..services.quote_versioning import (
+        create_auto_version,
+        EXPORT_TYPE_EXCEL,
+        EXPORT_TYPE_WORD,
+        VERSION_TYPE_AUTO_EXPORT_EXCEL,
+        VERSION_TYPE_AUTO_EXPORT_WORD,
+    )
+    if job.kind == EXPORT_KIND_WORD:
+        version_type, export_type = VERSION_TYPE_AUTO_EXPORT_WORD, EXPORT_TYPE_WORD
+    else:
+        version_type, export_type = VERSION_TYPE_AUTO_EXPORT_EXCEL, EXPORT_TYPE_EXCEL
+    try:
+        create_auto_version(
+            quote=quote,
+            version_type=version_type,
+            db=db,
+            created_by=job.created_by,
+            export_type=export_type,
+            export_file_name=job.file_name,
+            export_artifact=artifact,
+            snapshot_json=snapshot,
+        )
+        db.commit()
+    except Exception as e:
+        # Log but don't fail export if version creation fails
+        logger.warning(f"Failed to create auto version after {job.kind} export job {job.id}: {e}")
+        db.rollback()
+
+
+def run_job(job_id: str, session_factory: Callable[[], Session]) -> None:
+    """Build the file of a job (worker thread). Failures are recorded on the job."""
+    from ..api.quotes import export_file_name, load_quote
+    from .quote_versioning import build_quote_snapshot
+
+    with session_factory() as db:
+        # Claim the job: when several processes (uvicorn workers) resume the same
+        # queued job, only the one whose UPDATE changes the row renders it
+        claimed = db.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == STATUS_QUEUED)
+            .values(status=STATUS_RUNNING, started_at=utcnow(), error=None)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return
+        job = db.get(ExportJob, job_id)
+
+        last_write = monotonic()
+
+        def on_progress(progress: Dict[str, int]) -> None:
+            nonlocal last_write
+            job.progress = progress
+            if monotonic() - last_write >= PROGRESS_INTERVAL_S:
+                db.commit()
+                last_write = monotonic()
+
+        try:
+            quote = load_quote(db, job.quote_id)
+            if quote is None:
+                raise ValueError("Quote not found")
+            job.file_name = export_file_name(quote, _EXTENSIONS[job.kind])
+            snapshot = build_quote_snapshot(quote, db=db)
+            artifact = export_cache_key(job.kind, snapshot)
+            cache = get_export_cache()
+
+            # Build straight into a file next to the final name, then rename:
+            # a reader never sees a partial file
+            path = result_path(job)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(path.suffix + ".part")
+            try:
+                with open(tmp_path, "w+b") as out:
+                    cached = cache.open(artifact)
+                    if cached is not None:
+                        with cached:
+                            shutil.copyfileobj(cached, out)
+                    else:
+                        _build(db, job, on_progress, out)
+                        # Photos that could not be downloaded: not cached, the next export retries
+                        if not (job.progress or {}).get("images_failed"):
+                            cache.put(artifact, out)
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+            job.file_path = str(path)
+            job.status = STATUS_DONE
+            job.finished_at = utcnow()
+            db.commit()
+        except Exception as e:
+            logger.exception(f"Export job {job_id} failed")
+            db.rollback()
+            job = db.get(ExportJob, job_id)
+            job.status = STATUS_FAILED
+            job.error = str(e)
+            job.finished_at = utcnow()
+            db.commit()
+            return
+
+        if job.create_version:
+            _create_version(db, job, quote, artifact, snapshot)
+
+
+def purge_expired_jobs(db: Session, retention_hours: int = EXPORT_JOB_RETENTION_HOURS) -> int:
+    """Delete finished jobs older than the retention period, and their files."""
+    cutoff = utcnow() - timedelta(hours=retention_hours)
+    expired = db.query(ExportJob).filter(
+        ExportJob.status.in_((STATUS_DONE, STATUS_FAILED)),
+        ExportJob.finished_at < cutoff,
+    ).all()
+    for job in expired:
+        if job.file_path:
+            Path(job.file_path).unlink(missing_ok=True)
+        db.delete(job)
+    db.commit()
+    return len(expired)
+
+
+def resume_pending_jobs(session_factory: Optional[Callable[[], Session]] = None) -> int:
+    """
+    Re-queue the jobs left queued or running by a previous process (app startup).
+
+    A job that was running (started before this process) is put back in the
+    queue and restarted from scratch; the old partial file, if any, is
+    overwritten. Each process submits every queued job, and run_job claims it
+    atomically, so with several workers a job is still rendered once. Expired
+    finished jobs are purged at the same time.
+    """
+    if session_factory is None:
+        # Looked up at call time so that the tests' SessionLocal is used
+        from ..models import db as models_db
+        session_factory = models_db.SessionLocal
+    with session_factory() as db:
+        purge_expired_jobs(db)
+        db.execute(
+            update(ExportJob)
+            .where(
+                ExportJob.status == STATUS_RUNNING,
+                or_(ExportJob.started_at.is_(None), ExportJob.started_at < _PROCESS_STARTED),
+            )
+            .values(status=STATUS_QUEUED)
+        )
+        db.commit()
+        pending = [
+            job_id for (job_id,) in db.query(ExportJob.id)
+            .filter(ExportJob.status == STATUS_QUEUED)
+            .order_by(ExportJob.created_at)
+        ]
+    for job_id in pending:
+        _pool.submit(run_job, job_id, session_factory)
+    if pending:
+        logger.info(f"[export_jobs] resumed {len(pending)} pending job(s)")
+    return len(pending)
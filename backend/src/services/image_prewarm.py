@@ -0,0 +1,105 @@
+"""
+Pre-warming of export image derivatives.
+
+Without it the first Word export of a quote pays for every download and resize.
+When photos are attached (destination photos, quote heroes, day decorative
+images, imported service images) the URLs are handed to a small background pool
+that downloads them into the image cache and builds the derivatives the export
+reads: the hero half of each photo and, when the pairing is known, the
+stitched hero itself. Exports then find ready-made images.
+
+Failures are only logged: pre-warming is an optimisation, the export still
+downloads and processes whatever is missing.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from ..config import IMAGE_PREWARM_WORKERS
+from ..exports.word.image_cache import ImageCache, get_image_cache
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+_pool = ThreadPoolExecutor(max_workers=IMAGE_PREWARM_WORKERS, thread_name_prefix="img-prewarm")
+_pending: Set[Future] = set()
+_pending_lock = threading.Lock()
+
+
+def prewarm_images(
+    urls: Iterable[str] = (),
+    pairs: Iterable[Pair] = (),
+    cache: Optional[ImageCache] = None,
+) -> Dict[str, int]:
+    """
+    Download urls (and both sides of pairs) into the image cache and build their
+    derivatives. Runs in the calling thread; returns counts for logging.
+    """
+    from ..exports.word.image_utils import prefetch_images, stitch_side_by_side_to_cm, warm_image_derivatives
+
+    cache = cache or get_image_cache()
+    pairs = list(dict.fromkeys(pairs))
+    all_urls = list(dict.fromkeys([*urls, *(u for pair in pairs for u in pair)]))
+    images = prefetch_images(all_urls, cache=cache)
+
+    counts = {"images": 0, "failed": 0, "pairs": 0}
+    for url in all_urls:
+        data = images.get(url)
+        if not data:
+            counts["failed"] += 1
+            continue
+        try:
+            warm_image_derivatives(data, cache=cache)
+            counts["images"] += 1
+        except Exception as e:
+            logger.warning(f"[image_prewarm] could not process {url}: {e}")
+            counts["failed"] += 1
+    for left, right in pairs:
+        if images.get(left) and images.get(right):
+            try:
+                stitch_side_by_side_to_cm(left, right, images=images, cache=cache)
+                counts["pairs"] += 1
+            except Exception as e:
+                logger.warning(f"[image_prewarm] could not stitch {left} + {right}: {e}")
+    logger.debug(f"[image_prewarm] {counts}")
+    return counts
+
+
+def enqueue_prewarm(urls: Iterable[str] = (), pairs: Iterable[Pair] = ()) -> Optional[Future]:
+    """
+    Pre-warm in the background (request handlers, hooks). Returns the future,
+    or None when there is nothing to do. The cache is resolved now, so the job
+    writes to the cache in use when it was queued.
+    """
+    urls = [u for u in urls if isinstance(u, str) and u]
+    pairs = [p for p in pairs if p]
+    if not urls and not pairs:
+        return None
+    future = _pool.submit(prewarm_images, urls, pairs, get_image_cache())
+    with _pending_lock:
+        _pending.add(future)
+    future.add_done_callback(_forget)
+    return future
+
+
+def _forget(future: Future) -> None:
+    with _pending_lock:
+        _pending.discard(future)
+    if future.exception() is not None:
+        logger.warning(f"[image_prewarm] job failed: {future.exception()}")
+
+
+def wait_for_prewarm(timeout: Optional[float] = None) -> bool:
+    """Block until the queued pre-warm jobs are finished (scripts, tests). True if all are."""
+    with _pending_lock:
+        pending = list(_pending)
+    _, not_done = wait(pending, timeout=timeout)
+    return not not_done
+
+
+def new_pairs(before: Sequence[Pair], after: Sequence[Pair]) -> list:
+    """Pairs of after that were not already in before (what a save changed)."""
+    known = set(before)
+    return [p for p in after if p not in known]
@@ -0,0 +1,257 @@
+"""
+Quote pricing engine (single source of truth for quote totals).
+
+Total = Achats USD (incl. Onspot) + Commission% sur Achats + Ventes USD (incl. Hassle)
+
+The totals are computed with Decimal and persisted on the Quote row
+(onspot_total, hassle_total, commissionable_net, commission_total, sell_total,
+grand_total) every time the lines or the pricing header fields change. Readers
+(reprice, versioning, Excel) use the stored columns and never walk the lines.
+
+totals_from_sums() only takes plain values so that the same rules can be fed
+from loaded ORM rows (compute_totals) or from SQL aggregates (migrations,
+batch repricing).
+"""
+import logging
+import math
+from dataclasses import dataclass
+from datetime import date as dt_date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..models_quote import Quote, QuoteLine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MARGIN_PCT = Decimal("0.1627")
+HASSLE_PER_PAX = Decimal("150")
+ONSPOT_PER_CARD_DAY = 9
+ONSPOT_PAX_PER_CARD = 6
+ONSPOT_MIN_DAYS = 3  # minimum 3 jours par carte
+
+# Lines of these categories are informative only and never priced
+UNPAID_CATEGORIES = ("trip info", "internal")
+
+_CENT = Decimal("0.01")
+_ZERO = Decimal("0")
+
+
+def _money(v: Decimal) -> Decimal:
+    return v.quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _dec(v) -> Decimal:
+    if v is None:
+        return _ZERO
+    return v if isinstance(v, Decimal) else Decimal(str(v))
+
+
+@dataclass(frozen=True)
+class QuoteTotals:
+    """Computed totals of a quote (Decimal, rounded to cents)."""
+    pax: int
+    days: int
+    onspot_cards: int
+    margin_pct: Decimal
+    onspot_total: Decimal
+    hassle_total: Decimal
+    achats_total: Decimal      # commissionable_net: paid lines + Onspot
+    commission_total: Decimal
+    ventes_total: Decimal      # sell_total: paid lines + Hassle
+    grand_total: Decimal
+
+    def as_columns(self) -> Dict[str, Decimal]:
+        """Values of the persisted Quote columns."""
+        return {
+            "onspot_total": self.onspot_total,
+            "hassle_total": self.hassle_total,
+            "commissionable_net": self.achats_total,
+            "commission_total": self.commission_total,
+            "sell_total": self.ventes_total,
+            "grand_total": self.grand_total,
+        }
+
+    def as_response(self, quote_id: int) -> Dict[str, Any]:
+        """Shape of POST /quotes/{id}/reprice."""
+        return {
+            "quote_id": quote_id,
+            "pax": self.pax,
+            "days": self.days,
+            "onspot_cards": self.onspot_cards,
+            "margin_pct": float(self.margin_pct),
+            "onspot_total": float(self.onspot_total),
+            "hassle_total": float(self.hassle_total),
+            "achats_total": float(self.achats_total),
+            "commission_total": float(self.commission_total),
+            "ventes_total": float(self.ventes_total),
+            "grand_total": float(self.grand_total),
+        }
+
+
+def is_paid_category(category: Optional[str]) -> bool:
+    return (category or "").lower() not in UNPAID_CATEGORIES
+
+
+def onspot_cards(pax: Optional[int]) -> int:
+    return max(1, math.ceil((pax or 1) / ONSPOT_PAX_PER_CARD))
+
+
+def days_count(n_days: int, start_date=None, end_date=None) -> int:
+    """Number of days of the trip: the days list, else the inclusive date range."""
+    if n_days:
+        return n_days
+    try:
+        d0 = start_date if isinstance(start_date, dt_date) else dt_date.fromisoformat(str(start_date))
+        d1 = end_date if isinstance(end_date, dt_date) else dt_date.fromisoformat(str(end_date))
+        return max(0, (d1 - d0).days + 1)
+    except Exception:
+        return 0
+
+
+def quote_days_count(q: Quote) -> int:
+    """days_count() of a quote (loads q.days, not the lines)."""
+    return days_count(len(q.days), q.start_date, q.end_date)
+
+
+def onspot_amount(pax: Optional[int], trip_days: int, onspot_manual=None) -> Decimal:
+    """Onspot amount: manual override, else cards x 9 x days (minimum 3 days per card)."""
+    if onspot_manual is not None:
+        return _dec(onspot_manual)
+    effective_days = max(trip_days, ONSPOT_MIN_DAYS)
+    return Decimal(onspot_cards(pax) * ONSPOT_PER_CARD_DAY * effective_days)
+
+
+def compute_onspot(q: Quote) -> Decimal:
+    """Onspot amount of a quote."""
+    return onspot_amount(q.pax, quote_days_count(q), q.onspot_manual)
+
+
+def hassle_amount(pax: Optional[int], hassle_manual=None) -> Decimal:
+    if hassle_manual is not None:
+        return _dec(hassle_manual)
+    return (pax or 0) * HASSLE_PER_PAX
+
+
+def totals_from_sums(
+    *,
+    pax: Optional[int],
+    trip_days: int,
+    margin_pct,
+    onspot_manual,
+    hassle_manual,
+    achats_sum,
+    ventes_sum,
+) -> QuoteTotals:
+    """Apply the pricing rules to the sums of achat_usd / vente_usd of the paid lines."""
+    margin = _dec(margin_pct) if margin_pct is not None else DEFAULT_MARGIN_PCT
+    onspot = onspot_amount(pax, trip_days, onspot_manual)
+    hassle = hassle_amount(pax, hassle_manual)
+
+    achats_total = _money(onspot + _dec(achats_sum))
+    commission_total = _money(achats_total * margin)
+    ventes_total = _money(_dec(ventes_sum) + hassle)
+    grand_total = _money(achats_total + commission_total + ventes_total)
+
+    return QuoteTotals(
+        pax=pax or 0,
+        days=trip_days,
+        onspot_cards=onspot_cards(pax),
+        margin_pct=margin,
+        onspot_total=_money(onspot),
+        hassle_total=_money(hassle),
+        achats_total=achats_total,
+        commission_total=commission_total,
+        ventes_total=ventes_total,
+        grand_total=grand_total,
+    )
+
+
+def line_contribution(line: QuoteLine) -> Tuple[Decimal, Decimal]:
+    """(achat_usd, vente_usd) a line adds to the totals."""
+    if not is_paid_category(line.category):
+        return _ZERO, _ZERO
+    return _dec(line.achat_usd), _dec(line.vente_usd)
+
+
+def line_sums(lines: Iterable[QuoteLine]) -> Tuple[Decimal, Decimal]:
+    """(sum of achat_usd, sum of vente_usd) over the paid lines."""
+    achats = ventes = _ZERO
+    for l in lines:
+        achat, vente = line_contribution(l)
+        achats += achat
+        ventes += vente
+    return achats, ventes
+
+
+def compute_totals(q: Quote) -> QuoteTotals:
+    """Totals of a quote from its loaded days/lines (one pass over the lines)."""
+    achats_sum, ventes_sum = line_sums(l for d in q.days for l in d.lines)
+    return totals_from_sums(
+        pax=q.pax,
+        trip_days=quote_days_count(q),
+        margin_pct=q.margin_pct,
+        onspot_manual=q.onspot_manual,
+        hassle_manual=q.hassle_manual,
+        achats_sum=achats_sum,
+        ventes_sum=ventes_sum,
+    )
+
+
+def apply_totals(q: Quote) -> bool:
+    """
+    Recompute the totals of q and store them on the row.
+
+    Only differing columns are assigned, so an unchanged quote stays clean.
+    Returns True if a stored total changed. Nothing is flushed here.
+    """
+    return _store(q, compute_totals(q))
+
+
+def _store(q: Quote, totals: QuoteTotals) -> bool:
+    changed = False
+    for column, value in totals.as_columns().items():
+        if getattr(q, column) != value:
+            setattr(q, column, value)
+            changed = True
+    return changed
+
+
+def apply_line_delta(q: Quote, before: Tuple[Decimal, Decimal], after: Tuple[Decimal, Decimal]) -> bool:
+    """
+    Update the stored totals for a change of a single line, without reading the
+    other lines: the paid-lines sums are recovered from the stored columns
+    (commissionable_net - onspot_total, sell_total - hassle_total).
+
+    before/after are line_contribution() of the line around the change. Onspot
+    and Hassle do not depend on the lines, their stored values are reused.
+    """
+    if before == after:
+        return False
+    achats_sum = _dec(q.commissionable_net) - _dec(q.onspot_total) + (after[0] - before[0])
+    ventes_sum = _dec(q.sell_total) - _dec(q.hassle_total) + (after[1] - before[1])
+    totals = totals_from_sums(
+        pax=q.pax,
+        trip_days=0,
+        margin_pct=q.margin_pct,
+        onspot_manual=q.onspot_total,
+        hassle_manual=q.hassle_total,
+        achats_sum=achats_sum,
+        ventes_sum=ventes_sum,
+    )
+    return _store(q, totals)
+
+
+def stored_totals(q: Quote) -> QuoteTotals:
+    """Totals as persisted on the row (no traversal of the lines)."""
+    return QuoteTotals(
+        pax=q.pax or 0,
+        days=quote_days_count(q),
+        onspot_cards=onspot_cards(q.pax),
+        margin_pct=_dec(q.margin_pct) if q.margin_pct is not None else DEFAULT_MARGIN_PCT,
+        onspot_total=_dec(q.onspot_total),
+        hassle_total=_dec(q.hassle_total),
+        achats_total=_dec(q.commissionable_net),
+        commission_total=_dec(q.commission_total),
+        ventes_total=_dec(q.sell_total),
+        grand_total=_dec(q.grand_total),
+    )
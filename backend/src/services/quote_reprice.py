@@ -0,0 +1,196 @@
+"""
+Batch repricing of quotes with set-based SQL.
+
+Used when the pricing rules or the margin policy change: instead of loading
+every Quote -> QuoteDay -> QuoteLine graph, the paid-line sums and day counts
+are aggregated in SQL (GROUP BY quote_id) for a chunk of quotes, the rules of
+services/quote_pricing.py are applied to those sums, and the changed totals
+are written back with one bulk UPDATE per chunk.
+
+CLI (from backend/):
+    python -m src.services.quote_reprice [--ids 1,2,3] [--updated-since 2025-01-01] [--travel-agency NAME]
+"""
+import logging
+from dataclasses import dataclass, asdict, replace
+from datetime import date as dt_date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from ..models_quote import Quote, QuoteDay, QuoteLine, utcnow
+from .quote_pricing import UNPAID_CATEGORIES, days_count, totals_from_sums
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+_TOTAL_COLUMNS = (
+    "onspot_total", "hassle_total", "commissionable_net",
+    "commission_total", "sell_total", "grand_total",
+)
+
+
+@dataclass
+class RepriceProgress:
+    """Progress of a batch reprice, reported after each chunk."""
+    total: int
+    processed: int = 0
+    updated: int = 0
+    done: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def parse_updated_since(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, dt_date):
+        return datetime(value.year, value.month, value.day)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid updated_since: {value!r} (expected an ISO date or datetime)")
+
+
+def _parse_date(value, name: str) -> Optional[dt_date]:
+    if value is None or isinstance(value, dt_date):
+        return value
+    try:
+        return dt_date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected an ISO date)")
+
+
+def select_quote_ids(
+    db: Session,
+    ids: Optional[Sequence[int]] = None,
+    updated_since=None,
+    travel_agency: Optional[str] = None,
+    departure_from=None,
+    departure_to=None,
+) -> List[int]:
+    """
+    Ids of the quotes matching the filter (all quotes when no filter is given).
+    departure_from/departure_to bound the start date (inclusive), e.g. a season.
+    """
+    stmt = select(Quote.id).order_by(Quote.id)
+    if ids:
+        stmt = stmt.where(Quote.id.in_(list(ids)))
+    since = parse_updated_since(updated_since)
+    if since is not None:
+        stmt = stmt.where(Quote.updated_at >= since)
+    if travel_agency:
+        stmt = stmt.where(func.lower(Quote.travel_agency) == travel_agency.strip().lower())
+    departure_from = _parse_date(departure_from, "departure_from")
+    if departure_from is not None:
+        stmt = stmt.where(Quote.start_date >= departure_from)
+    departure_to = _parse_date(departure_to, "departure_to")
+    if departure_to is not None:
+        stmt = stmt.where(Quote.start_date <= departure_to)
+    return list(db.execute(stmt).scalars())
+
+
+def _chunk_updates(db: Session, quote_ids: List[int]) -> List[Dict[str, Any]]:
+    """Compute the totals of a chunk of quotes; return the rows whose totals changed."""
+    day_counts = dict(db.execute(
+        select(QuoteDay.quote_id, func.count(QuoteDay.id))
+        .where(QuoteDay.quote_id.in_(quote_ids))
+        .group_by(QuoteDay.quote_id)
+    ).all())
+
+    sums = {
+        row.quote_id: row for row in db.execute(
+            select(
+                QuoteDay.quote_id,
+                func.sum(QuoteLine.achat_usd).label("achats"),
+                func.sum(QuoteLine.vente_usd).label("ventes"),
+            )
+            .join(QuoteDay, QuoteLine.quote_day_id == QuoteDay.id)
+            .where(
+                QuoteDay.quote_id.in_(quote_ids),
+                func.lower(func.coalesce(QuoteLine.category, "")).notin_(UNPAID_CATEGORIES),
+            )
+            .group_by(QuoteDay.quote_id)
+        )
+    }
+
+    headers = db.execute(
+        select(
+            Quote.id, Quote.pax, Quote.start_date, Quote.end_date,
+            Quote.margin_pct, Quote.onspot_manual, Quote.hassle_manual,
+            *(getattr(Quote, c) for c in _TOTAL_COLUMNS),
+        )
+        .where(Quote.id.in_(quote_ids))
+    ).all()
+
+    now = utcnow()
+    updates = []
+    for q in headers:
+        line_sums = sums.get(q.id)
+        columns = totals_from_sums(
+            pax=q.pax,
+            trip_days=days_count(day_counts.get(q.id, 0), q.start_date, q.end_date),
+            margin_pct=q.margin_pct,
+            onspot_manual=q.onspot_manual,
+            hassle_manual=q.hassle_manual,
+            achats_sum=line_sums.achats if line_sums else None,
+            ventes_sum=line_sums.ventes if line_sums else None,
+        ).as_columns()
+        if any(getattr(q, c) != v for c, v in columns.items()):
+            # updated_at moves with the totals (version token / ETag)
+            updates.append({"id": q.id, "updated_at": now, **columns})
+    return updates
+
+
+def reprice_quotes(
+    db: Session,
+    ids: Optional[Sequence[int]] = None,
+    updated_since=None,
+    travel_agency: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[RepriceProgress]:
+    """
+    Recompute and store the totals of the matching quotes, chunk by chunk.
+
+    Yields a RepriceProgress after each chunk (committed), and a final one with
+    done=True. Quotes whose stored totals are already right are not written.
+    """
+    quote_ids = select_quote_ids(db, ids, updated_since, travel_agency)
+    progress = RepriceProgress(total=len(quote_ids))
+    for start in range(0, len(quote_ids), chunk_size):
+        chunk = quote_ids[start:start + chunk_size]
+        updates = _chunk_updates(db, chunk)
+        if updates:
+            # ORM bulk UPDATE by primary key (executemany)
+            db.execute(update(Quote), updates)
+        db.commit()
+        progress.processed += len(chunk)
+        progress.updated += len(updates)
+        yield replace(progress)
+    progress.done = True
+    logger.info(f"[reprice_quotes] {progress.as_dict()}")
+    yield replace(progress)
+
+
+def _main(argv=None) -> None:
+    import argparse
+
+    from ..models.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Recompute the stored totals of quotes.")
+    parser.add_argument("--ids", help="Comma-separated quote ids")
+    parser.add_argument("--updated-since", help="Only quotes updated since this ISO date/datetime")
+    parser.add_argument("--travel-agency", help="Only quotes of this travel agency (case-insensitive)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    ids = [int(x) for x in args.ids.split(",") if x.strip()] if args.ids else None
+    with SessionLocal() as db:
+        for p in reprice_quotes(db, ids, args.updated_since, args.travel_agency, args.chunk_size):
+            print(f"{p.processed}/{p.total} quotes, {p.updated} updated{' (done)' if p.done else ''}")
+
+
+if __name__ == "__main__":
+    _main()
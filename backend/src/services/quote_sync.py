@@ -0,0 +1,238 @@
+"""
+Incremental save of a quote's days and lines.
+
+Instead of deleting every QuoteDay (and cascading QuoteLine) and re-inserting the
+whole tree on each save, incoming days/lines are reconciled against the existing
+rows: matched by id when the client sends one, otherwise by position. Only the
+rows that really changed are updated, new ones are inserted and missing ones are
+deleted, all in a single flush so SQLAlchemy can batch the statements.
+"""
+import logging
+from dataclasses import dataclass, asdict
+from datetime import date as dt_date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models_quote import Quote, QuoteDay, QuoteLine, utcnow
+from .quote_pricing import apply_totals
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QuoteSyncSummary:
+    """Counts of what a reconciliation actually changed."""
+    header_changed: bool = False
+    totals_changed: bool = False
+    days_inserted: int = 0
+    days_updated: int = 0
+    days_deleted: int = 0
+    lines_inserted: int = 0
+    lines_updated: int = 0
+    lines_deleted: int = 0
+
+    @property
+    def changed(self) -> bool:
+        """True if anything (header, days or lines) has to be written."""
+        return self.header_changed or self.totals_changed or any((
+            self.days_inserted, self.days_updated, self.days_deleted,
+            self.lines_inserted, self.lines_updated, self.lines_deleted,
+        ))
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = asdict(self)
+        out["changed"] = self.changed
+        return out
+
+
+def _to_date(v):
+    if v is None:
+        return None
+    if isinstance(v, str):
+        try:
+            return dt_date.fromisoformat(v)
+        except ValueError:
+            return None
+    return v
+
+
+def _dec(v) -> Optional[Decimal]:
+    return Decimal(str(v)) if v is not None else None
+
+
+def line_values(li, current_fx: Optional[Decimal] = None) -> Dict[str, Any]:
+    """
+    Compute the column values of a QuoteLine from a QuoteLineIn.
+
+    current_fx is the fx_rate already stored on the line (None for new lines);
+    it is kept when a buff_pct is present and the client did not send an fx_rate.
+    """
+    achat_eur = _dec(li.achat_eur)
+    achat_usd = _dec(li.achat_usd)
+
+    # Preserve raw_json first to check for buff_pct
+    raw_json = li.raw_json if li.raw_json is not None else {}
+
+    # Check if buff_pct is present - if so, don't auto-recalculate FX
+    has_buff_pct = raw_json and isinstance(raw_json, dict) and raw_json.get("buff_pct") is not None
+
+    # compute fx if both provided (>0) AND no buff_pct is present
+    # If buff_pct is present, preserve the fx_rate from input (or existing value)
+    if has_buff_pct:
+        if li.fx_rate is not None:
+            fx_rate = Decimal(str(li.fx_rate)).quantize(Decimal("0.000001"))
+        else:
+            fx_rate = current_fx
+    elif achat_eur and achat_usd and achat_usd != 0:
+        fx_rate = (achat_eur / achat_usd).quantize(Decimal("0.000001"))
+    elif li.fx_rate is not None:
+        fx_rate = Decimal(str(li.fx_rate)).quantize(Decimal("0.000001"))
+    else:
+        fx_rate = None
+
+    return {
+        "service_id": li.service_id,
+        "category": li.category,
+        "title": li.title,
+        "supplier_name": li.supplier_name,
+        "visibility": li.visibility or "client",
+        "achat_eur": achat_eur,
+        "achat_usd": achat_usd,
+        "vente_usd": _dec(li.vente_usd),
+        "fx_rate": fx_rate,
+        "currency": li.currency,
+        "base_net_amount": _dec(li.base_net_amount),
+        # PRESERVE raw_json exactly as received (don't replace with {} if None)
+        "raw_json": raw_json,
+    }
+
+
+def _assign(obj, values: Dict[str, Any]) -> bool:
+    """Set only the attributes whose value differs; return True if any did."""
+    changed = False
+    for key, value in values.items():
+        if getattr(obj, key) != value:
+            setattr(obj, key, value)
+            changed = True
+    return changed
+
+
+def _claim_by_id(rows: Dict[int, Any], incoming: List[Any]) -> Dict[int, Any]:
+    """
+    Pair incoming items that carry an id with the existing row of that id.
+
+    Keys are the identity of the incoming item, so a row is claimed at most once
+    even if the client sends the same id twice.
+    """
+    claims: Dict[int, Any] = {}
+    taken = set()
+    for item in incoming:
+        item_id = getattr(item, "id", None)
+        if item_id is not None and item_id in rows and item_id not in taken:
+            claims[id(item)] = rows[item_id]
+            taken.add(item_id)
+    return claims
+
+
+def _match(existing: List[Any], incoming: List[Any], claims: Dict[int, Any]) -> List[Optional[Any]]:
+    """
+    Pair each incoming item with an existing row.
+
+    Rows claimed by id win; remaining incoming items fall back to the existing
+    row at the same position, unless that row is claimed by another item.
+    """
+    claimed = {id(row) for row in claims.values()}
+    matches: List[Optional[Any]] = []
+    for idx, item in enumerate(incoming):
+        row = claims.get(id(item))
+        if row is None and idx < len(existing) and id(existing[idx]) not in claimed:
+            row = existing[idx]
+            claimed.add(id(row))
+        matches.append(row)
+    return matches
+
+
+def sync_quote_days(quote: Quote, days_in: Optional[List[Any]], db: Session) -> QuoteSyncSummary:
+    """
+    Reconcile quote.days with days_in (list of QuoteDayIn) and return a summary.
+
+    Header fields must be assigned on the quote before calling this function so
+    that header changes are reported too. Nothing is committed here; the caller
+    controls the transaction. The quote totals are recomputed and stored, and
+    when something changed quote.updated_at is bumped so that day/line edits are
+    visible on the quote row as well.
+    """
+    summary = QuoteSyncSummary()
+    summary.header_changed = quote in db.new or db.is_modified(quote, include_collections=False)
+
+    days_in = list(days_in or [])
+    existing_days = sorted(quote.days, key=lambda d: d.position or 0)
+    existing_lines = {l.id: l for d in existing_days for l in d.lines if l.id is not None}
+
+    day_matches = _match(
+        existing_days, days_in,
+        _claim_by_id({d.id: d for d in existing_days if d.id is not None}, days_in),
+    )
+    line_claims = _claim_by_id(existing_lines, [li for d in days_in for li in (d.lines or [])])
+    claimed_lines = {id(l) for l in line_claims.values()}
+
+    # Days no longer present: the delete-orphan cascade removes their lines
+    kept_days = {id(d) for d in day_matches if d is not None}
+    for day in existing_days:
+        if id(day) not in kept_days:
+            summary.lines_deleted += sum(1 for l in day.lines if id(l) not in claimed_lines)
+            quote.days.remove(day)
+            summary.days_deleted += 1
+
+    for idx, (d_in, day) in enumerate(zip(days_in, day_matches)):
+        day_values = {
+            "position": idx,
+            "date": _to_date(d_in.date),
+            "destination": d_in.destination,
+            "decorative_images": d_in.decorative_images or [],
+        }
+        if day is None:
+            day = QuoteDay(**day_values)
+            quote.days.append(day)
+            summary.days_inserted += 1
+        elif _assign(day, day_values):
+            summary.days_updated += 1
+
+        lines_in = list(d_in.lines or [])
+        current_lines = sorted(day.lines, key=lambda l: l.position or 0)
+        # Lines referenced by id are paired explicitly; only the others are
+        # candidates for the positional fallback
+        line_matches = _match([l for l in current_lines if id(l) not in claimed_lines], lines_in, line_claims)
+
+        # Lines dropped from this day (unless they were moved to another day)
+        kept_lines = {id(l) for l in line_matches if l is not None}
+        for line in current_lines:
+            if id(line) not in kept_lines and id(line) not in claimed_lines:
+                day.lines.remove(line)
+                summary.lines_deleted += 1
+
+        for li_idx, (li, line) in enumerate(zip(lines_in, line_matches)):
+            if line is None:
+                line = QuoteLine(position=li_idx, **line_values(li))
+                day.lines.append(line)
+                summary.lines_inserted += 1
+                continue
+            values = line_values(li, current_fx=line.fx_rate)
+            values["position"] = li_idx
+            moved = line.day is not day
+            if moved:
+                line.day = day
+            if _assign(line, values) or moved:
+                summary.lines_updated += 1
+
+    # Persisted totals follow the lines (and the pricing header fields)
+    summary.totals_changed = apply_totals(quote)
+
+    if summary.changed and quote not in db.new:
+        quote.updated_at = utcnow()
+
+    db.flush()
+    logger.debug(f"[sync_quote_days] quote {quote.id}: {summary.as_dict()}")
+    return summary
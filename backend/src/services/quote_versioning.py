@@ -1,12 +1,17 @@
 """
 Utilities for quote versioning: snapshot creation, label generation, and version type management.
 """
+import hashlib
+import json
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.orm import Session, undefer_group
 
+from ..config import VERSION_KEYFRAME_INTERVAL
 from ..models_quote import Quote, QuoteVersion
+from .version_delta import apply_snapshot_delta, version_storage
 
 logger = logging.getLogger(__name__)
 
@@ -75,105 +80,156 @@ def build_quote_snapshot(quote: Quote, db: Optional[Session] = None) -> Dict[str
         Dictionary representation of the quote (same format as QuoteOut API response)
     """
     # Import here to avoid circular dependency
-    from ..api.quotes import _to_out
-    quote_out = _to_out(quote, db=db, include_first_image=False)
-    # Convert Pydantic model to dict for JSON storage
-    return quote_out.model_dump()
+    from ..api.quotes import _to_json_bytes
+    # Fast path: ORM rows -> JSON (no QuoteOut validation), then back to plain
+    # JSON types for storage. The concurrency token is not part of the content.
+    return json.loads(_to_json_bytes(quote, include_version=False))
+
+
+def snapshot_hash(snapshot: Dict[str, Any]) -> str:
+    """
+    Content hash of a snapshot: SHA-256 of its canonical JSON (sorted keys,
+    compact separators). The quote's concurrency token ("version") is left out:
+    it changes on every save, even one that leaves the content as it was.
+    """
+    content = {k: v for k, v in snapshot.items() if k != "version"}
+    text = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def find_unchanged_version(db: Session, quote_id: int, content_hash: str) -> Optional[QuoteVersion]:
+    """The latest non-archived version of quote_id if its content hash is content_hash, else None."""
+    latest = (
+        db.query(QuoteVersion)
+        .filter(QuoteVersion.quote_id == quote_id, QuoteVersion.archived_at.is_(None))
+        .order_by(QuoteVersion.id.desc())
+        .first()
+    )
+    if latest is not None and latest.content_hash == content_hash:
+        return latest
+    return None
+
+
+def version_content_hash(db: Session, version: QuoteVersion) -> str:
+    """Content hash of a version (computed from its snapshot if not stored)."""
+    if version.content_hash is not None:
+        return version.content_hash
+    return snapshot_hash(load_version_snapshot(db, version))
+
+
+def snapshot_columns(
+    db: Session, quote_id: int, snapshot: Dict[str, Any], content_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Storage columns of a new version of quote_id whose content is snapshot:
+    its content hash (given, or computed here), and a delta against the previous
+    version of the quote, or a full snapshot (keyframe) for the first version,
+    every VERSION_KEYFRAME_INTERVAL versions, or when no smaller delta can be
+    encoded.
+
+    Call before adding the new version to the session (the previous version
+    is looked up by id).
+    """
+    columns = {"content_hash": content_hash or snapshot_hash(snapshot)}
+    previous = (
+        db.query(QuoteVersion)
+        .filter(QuoteVersion.quote_id == quote_id)
+        .order_by(QuoteVersion.id.desc())
+        .first()
+    )
+    if previous is None or previous.delta_depth + 1 >= VERSION_KEYFRAME_INTERVAL:
+        columns.update(version_storage(snapshot, VERSION_KEYFRAME_INTERVAL))
+        return columns
+    columns.update(version_storage(
+        snapshot, VERSION_KEYFRAME_INTERVAL,
+        base_snapshot=load_version_snapshot(db, previous),
+        base_id=previous.id,
+        base_depth=previous.delta_depth,
+    ))
+    return columns
+
+
+def load_version_snapshot(db: Session, version: QuoteVersion) -> Dict[str, Any]:
+    """
+    Full snapshot of a version: its keyframe with the deltas up to it applied
+    (at most VERSION_KEYFRAME_INTERVAL - 1 of them).
+    """
+    deltas = []
+    current = version
+    while current.snapshot_json is None:
+        if current.snapshot_delta is None or current.base_version_id is None:
+            raise ValueError(f"Version {current.id} has no snapshot")
+        deltas.append(current.snapshot_delta)
+        base = db.get(QuoteVersion, current.base_version_id, options=[undefer_group("snapshot")])
+        if base is None or len(deltas) > version.delta_depth:
+            raise ValueError(f"Version {version.id}: broken delta chain at version {current.id}")
+        current = base
+    snapshot = current.snapshot_json
+    for delta in reversed(deltas):
+        snapshot = apply_snapshot_delta(snapshot, delta)
+    return snapshot
 
 
 def compute_total_price(quote: Quote) -> Optional[float]:
     """
-    Compute the total selling price (grand_total) for a quote snapshot.
-    
-    Uses the same calculation logic as the frontend and /reprice endpoint:
-    - Achats USD (incl. Onspot) + Commission% sur Achats + Ventes USD (incl. Hassle)
-    
-    Args:
-        quote: The Quote instance
-    
-    Returns:
-        The grand_total as float, or None if calculation fails
+    Total selling price (grand_total) of a quote, for the version record.
+
+    The pricing engine (services/quote_pricing.py) keeps Quote.grand_total up to
+    date on every write, so no traversal of the days/lines is needed here.
     """
-    try:
-        import math
-        from decimal import Decimal
-        # Import compute_onspot and _days_count from quotes module
-        from ..api.quotes import compute_onspot, _days_count
-        
-        # Compute onspot (same logic as reprice endpoint)
-        onspot_total = compute_onspot(quote)
-        
-        # Calculate hassle (same logic as reprice endpoint)
-        pax = quote.pax or 0
-        hassle_auto = pax * 150
-        hassle_total = float(quote.hassle_manual) if quote.hassle_manual is not None else hassle_auto
-        
-        # Get paid lines only (exclude Trip info and Internal)
-        paid_lines = []
-        for d in quote.days:
-            for l in d.lines:
-                c = (l.category or "").lower()
-                if c in ("trip info", "internal"):
-                    continue
-                paid_lines.append(l)
-        
-        # Sum achats and ventes from paid lines
-        achats_sum = sum(float(l.achat_usd or 0) for l in paid_lines)
-        ventes_sum = sum(float(l.vente_usd or 0) for l in paid_lines)
-        
-        # Calculate totals (same logic as reprice endpoint)
-        achats_total = round(float(onspot_total) + achats_sum, 2)
-        margin = float(quote.margin_pct) if quote.margin_pct is not None else 0.1627
-        commission_total = round(achats_total * margin, 2)
-        ventes_total = round(ventes_sum + hassle_total, 2)
-        grand_total = round(achats_total + commission_total + ventes_total, 2)
-        
-        return grand_total
-    except Exception as e:
-        logger.error(f"Error computing total price for quote {quote.id}: {e}", exc_info=True)
-        # Fallback to stored grand_total if calculation fails
-        if quote.grand_total is not None:
-            return float(quote.grand_total)
+    if quote.grand_total is None:
         return None
+    return float(quote.grand_total)
 
 
-def get_next_version_label(db: Session, quote_id: int) -> str:
+def allocate_version_label(db: Session, quote_id: int) -> str:
     """
-    Generate the next version label (v1, v2, v3, ...) for a quote.
-    
-    Finds the highest version number among non-archived versions and increments it.
-    
+    Allocate the next version label (v1, v2, v3, ...) of a quote.
+
+    The number comes from the quote's version counter (quotes.last_version_number),
+    incremented by a single UPDATE ... RETURNING in the caller's transaction: the
+    write lock it takes (the quote row, the whole database on SQLite) is held
+    until that transaction ends, so concurrent versions of a quote get distinct
+    numbers, and a rollback gives the number back. A number whose label is
+    already used (a version renamed to it) is skipped.
+
     Args:
-        db: Database session
+        db: Database session (the transaction that will add the version)
         quote_id: ID of the quote
-    
+
     Returns:
         Next version label (e.g., "v1", "v2", "v3")
     """
-    # Find the last non-archived version for this quote
-    last_version = (
-        db.query(QuoteVersion)
-        .filter(
-            QuoteVersion.quote_id == quote_id,
-            QuoteVersion.archived_at.is_(None)
+    while True:
+        number = db.execute(
+            update(Quote)
+            .where(Quote.id == quote_id)
+            # updated_at kept: a new version does not modify the quote
+            .values(last_version_number=Quote.last_version_number + 1, updated_at=Quote.updated_at)
+            .returning(Quote.last_version_number)
+        ).scalar_one()
+        label = f"v{number}"
+        taken = (
+            db.query(QuoteVersion.id)
+            .filter(QuoteVersion.quote_id == quote_id, QuoteVersion.label == label)
+            .first()
         )
-        .order_by(QuoteVersion.created_at.desc())
-        .first()
+        if taken is None:
+            return label
+
+
+def lock_quote_versions(db: Session, quote_id: int) -> None:
+    """
+    Take, ahead of allocate_version_label, the write lock it takes (a no-op
+    UPDATE of the quote row), until the caller's transaction ends. Checking the
+    latest version (find_unchanged_version) after this and then adding one is
+    atomic: a concurrent caller waits, then sees the version added.
+    """
+    db.execute(
+        update(Quote)
+        .where(Quote.id == quote_id)
+        .values(last_version_number=Quote.last_version_number, updated_at=Quote.updated_at)
     )
-    
-    if not last_version:
-        return "v1"
-    
-    # Extract number from label (e.g., "v5" -> 5)
-    import re
-    match = re.match(r'v(\d+)', last_version.label)
-    if match:
-        next_num = int(match.group(1)) + 1
-    else:
-        # If label doesn't match pattern, start from 1
-        next_num = 1
-    
-    return f"v{next_num}"
 
 
 def should_create_auto_version(db: Session, quote_id: int, version_type: str) -> bool:
@@ -210,7 +266,7 @@ def apply_snapshot_to_quote(quote: Quote, snapshot_json: Dict[str, Any], db: Ses
     Apply a snapshot JSON to a quote, replacing all fields, days, and lines.
     
     This function overwrites the quote's current state with the snapshot data,
-    following the same pattern as upsert_quote (delete all days, recreate from snapshot).
+    following the same pattern as upsert_quote (incremental sync of days/lines).
     
     Args:
         quote: The Quote instance to update
@@ -219,8 +275,8 @@ def apply_snapshot_to_quote(quote: Quote, snapshot_json: Dict[str, Any], db: Ses
     """
     from decimal import Decimal
     from datetime import date as dt_date
-    from ..models_quote import QuoteDay, QuoteLine
-    from ..api.quotes import QuoteLineIn, _upd_line
+    from ..api.schemas_quote import QuoteDayIn
+    from .quote_sync import sync_quote_days
     
     def _to_date(v):
         if v is None:
@@ -252,47 +308,11 @@ def apply_snapshot_to_quote(quote: Quote, snapshot_json: Dict[str, Any], db: Ses
     quote.onspot_manual = Decimal(str(snapshot_json["onspot_manual"])) if snapshot_json.get("onspot_manual") is not None else None
     quote.hassle_manual = Decimal(str(snapshot_json["hassle_manual"])) if snapshot_json.get("hassle_manual") is not None else None
     
-    # Replace all days/lines (same pattern as upsert_quote)
-    for d in list(quote.days):
-        db.delete(d)
-    db.flush()
-    
-    # Recreate days and lines from snapshot
-    days_data = snapshot_json.get("days") or []
-    for idx, day_data in enumerate(days_data):
-        day = QuoteDay(
-            quote_id=quote.id,
-            position=idx,
-            date=_to_date(day_data.get("date")),
-            destination=day_data.get("destination"),
-            decorative_images=day_data.get("decorative_images") or []
-        )
-        db.add(day)
-        db.flush()
-        
-        # Recreate lines
-        lines_data = day_data.get("lines") or []
-        for li_idx, line_data in enumerate(lines_data):
-            # Create QuoteLineIn from snapshot data
-            line_in = QuoteLineIn(
-                position=line_data.get("position"),
-                service_id=line_data.get("service_id"),
-                category=line_data.get("category"),
-                title=line_data.get("title"),
-                supplier_name=line_data.get("supplier_name"),
-                visibility=line_data.get("visibility"),
-                achat_eur=line_data.get("achat_eur"),
-                achat_usd=line_data.get("achat_usd"),
-                vente_usd=line_data.get("vente_usd"),
-                fx_rate=line_data.get("fx_rate"),
-                currency=line_data.get("currency"),
-                base_net_amount=line_data.get("base_net_amount"),
-                raw_json=line_data.get("raw_json")
-            )
-            
-            line = QuoteLine(quote_day_id=day.id, position=li_idx)
-            _upd_line(line, line_in)
-            db.add(line)
+    # Reconcile days/lines with the snapshot (same engine as upsert_quote):
+    # rows still present in the snapshot are updated in place, the rest is
+    # inserted or deleted
+    days_in = [QuoteDayIn.model_validate(day_data) for day_data in (snapshot_json.get("days") or [])]
+    sync_quote_days(quote, days_in, db)
 
 
 def create_before_restore_version(
@@ -311,14 +331,20 @@ def create_before_restore_version(
         created_by: Email of the user performing the restore
     
     Returns:
-        The created QuoteVersion instance
+        The created QuoteVersion instance, or the latest version if it already
+        holds the current state (same content hash)
     """
     # Build snapshot of current state
     snapshot_json = build_quote_snapshot(quote, db=db)
+    content_hash = snapshot_hash(snapshot_json)
+    lock_quote_versions(db, quote.id)
+    unchanged = find_unchanged_version(db, quote.id, content_hash)
+    if unchanged is not None:
+        return unchanged
     total_price = compute_total_price(quote)
     
     # Generate label
-    label = get_next_version_label(db, quote.id)
+    label = allocate_version_label(db, quote.id)
     
     # Create version with auto comment
     comment = f"Auto: state before restore from {original_version.label}"
@@ -331,7 +357,7 @@ def create_before_restore_version(
         created_by=get_user_display_name(created_by),
         type=VERSION_TYPE_AUTO_BEFORE_RESTORE,
         total_price=Decimal(str(total_price)) if total_price is not None else None,
-        snapshot_json=snapshot_json
+        **snapshot_columns(db, quote.id, snapshot_json, content_hash)
     )
     
     db.add(version)
@@ -347,13 +373,19 @@ def create_auto_version(
     created_by: Optional[str] = None,
     export_type: Optional[str] = None,
     export_file_name: Optional[str] = None,
-    comment: Optional[str] = None
+    comment: Optional[str] = None,
+    export_artifact: Optional[str] = None,
+    snapshot_json: Optional[Dict[str, Any]] = None,
 ) -> Optional[QuoteVersion]:
     """
     Create an automatic version for a quote.
     
     This function checks throttling and creates a version if allowed.
-    Returns None if throttled or if creation fails (non-blocking).
+    Returns None if throttled or if creation fails (non-blocking), and the
+    latest version instead of a new one if the quote has not changed since
+    (same content hash). For an export, that version is reused only if it
+    holds an export of the same type (its file is then the new one); otherwise
+    an export version is still created, so the file stays downloadable.
     
     Args:
         quote: The Quote instance
@@ -363,6 +395,8 @@ def create_auto_version(
         export_type: Type of export (word, pdf, excel) if applicable
         export_file_name: Name of the exported file if applicable
         comment: Custom comment (if None, uses default based on type)
+        export_artifact: Export cache key of the exported file, if applicable
+        snapshot_json: Snapshot already built by the caller (else built here)
     
     Returns:
         The created QuoteVersion instance, or None if throttled/failed
@@ -375,11 +409,22 @@ def create_auto_version(
                 return None
         
         # Build snapshot
-        snapshot_json = build_quote_snapshot(quote, db=db)
+        if snapshot_json is None:
+            snapshot_json = build_quote_snapshot(quote, db=db)
+        content_hash = snapshot_hash(snapshot_json)
+        lock_quote_versions(db, quote.id)
+        unchanged = find_unchanged_version(db, quote.id, content_hash)
+        if unchanged is not None and (export_type is None or unchanged.export_type == export_type):
+            logger.debug(f"Skipping auto version creation for quote {quote.id}, type {version_type} (unchanged since {unchanged.label})")
+            if export_type is not None:
+                unchanged.export_artifact = export_artifact
+                unchanged.export_file_name = export_file_name
+                db.flush()
+            return unchanged
         total_price = compute_total_price(quote)
         
         # Generate label
-        label = get_next_version_label(db, quote.id)
+        label = allocate_version_label(db, quote.id)
         
         # Default comment if not provided
         if comment is None:
@@ -404,8 +449,9 @@ def create_auto_version(
             type=version_type,
             export_type=export_type,
             export_file_name=export_file_name,
+            export_artifact=export_artifact,
             total_price=Decimal(str(total_price)) if total_price is not None else None,
-            snapshot_json=snapshot_json
+            **snapshot_columns(db, quote.id, snapshot_json, content_hash)
         )
         
         db.add(version)
@@ -0,0 +1,142 @@
+"""
+Structural deltas between two quote snapshots (build_quote_snapshot format).
+
+Quote versions are stored as a full snapshot (keyframe) every
+VERSION_KEYFRAME_INTERVAL versions and, in between, as a delta against the
+previous version of the quote (services/quote_versioning.py). A delta only
+holds what changed, at the level of quote fields, days and lines:
+
+    {
+      "set": {field: value, ...},     # quote fields added or changed ("days" excluded)
+      "unset": [field, ...],          # quote fields removed
+      "days": [...],                  # omitted when days and lines are unchanged
+    }
+
+"days" lists the days of the new snapshot in order, each one as:
+- its id (int): the base day, unchanged (fields and lines);
+- {"id", "set", "unset", "lines"}: the base day with changed fields, and its
+  lines in the same form ("lines" omitted when they are unchanged);
+- {"new": {...}}: a day (or line) that is not in the base, in full.
+Days and lines of the base that are not listed are removed.
+
+Days and lines are matched by id; a snapshot whose days or lines have missing
+or duplicate ids cannot be encoded (snapshot_delta returns None) and is stored
+as a keyframe.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+_MISSING = object()
+
+
+def _field_changes(base: Dict[str, Any], new: Dict[str, Any], skip: str) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    changed = {k: v for k, v in new.items() if k != skip and base.get(k, _MISSING) != v}
+    if changed:
+        changes["set"] = changed
+    removed = [k for k in base if k != skip and k not in new]
+    if removed:
+        changes["unset"] = removed
+    return changes
+
+
+def _by_id(items: List[Dict[str, Any]]) -> Optional[Dict[Any, Dict[str, Any]]]:
+    """Items indexed by id, or None if an id is missing or repeated."""
+    index = {}
+    for item in items:
+        item_id = item.get("id")
+        if item_id is None or item_id in index:
+            return None
+        index[item_id] = item
+    return index
+
+
+def _list_delta(base_items: List[Dict[str, Any]], new_items: List[Dict[str, Any]], children: Optional[str]):
+    """Entries of new_items against base_items (see module docstring); None if not encodable."""
+    base_index = _by_id(base_items)
+    if base_index is None or _by_id(new_items) is None:
+        return None
+    entries = []
+    for item in new_items:
+        base = base_index.get(item["id"])
+        if base is None:
+            entries.append({"new": item})
+            continue
+        entry = _field_changes(base, item, skip=children)
+        if children is not None:
+            base_children = base.get(children) or []
+            new_children = item.get(children) or []
+            if base_children != new_children:
+                child_entries = _list_delta(base_children, new_children, None)
+                if child_entries is None:
+                    return None
+                entry[children] = child_entries
+        entries.append({"id": item["id"], **entry} if entry else item["id"])
+    return entries
+
+
+def snapshot_delta(base: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Delta turning base into new, or None if it cannot be encoded (store new in full)."""
+    delta = _field_changes(base, new, skip="days")
+    base_days = base.get("days") or []
+    new_days = new.get("days") or []
+    if base_days != new_days:
+        days = _list_delta(base_days, new_days, "lines")
+        if days is None:
+            return None
+        delta["days"] = days
+    return delta
+
+
+def _apply_fields(base: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: v for k, v in base.items() if k not in entry.get("unset", ())}
+    out.update(entry.get("set", {}))
+    return out
+
+
+def _apply_list(base_items: List[Dict[str, Any]], entries: List[Any], children: Optional[str]):
+    base_index = {item["id"]: item for item in base_items}
+    out = []
+    for entry in entries:
+        if isinstance(entry, dict) and "new" in entry:
+            out.append(entry["new"])
+            continue
+        if not isinstance(entry, dict):
+            out.append(base_index[entry])
+            continue
+        base = base_index[entry["id"]]
+        item = _apply_fields(base, entry)
+        if children is not None and children in entry:
+            item[children] = _apply_list(base.get(children) or [], entry[children], None)
+        out.append(item)
+    return out
+
+
+def apply_snapshot_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """The snapshot obtained by applying delta to base (base is not modified)."""
+    out = _apply_fields(base, delta)
+    if "days" in delta:
+        out["days"] = _apply_list(base.get("days") or [], delta["days"], "lines")
+    return out
+
+
+def version_storage(
+    snapshot: Dict[str, Any],
+    keyframe_interval: int,
+    base_snapshot: Optional[Dict[str, Any]] = None,
+    base_id: Optional[int] = None,
+    base_depth: int = 0,
+) -> Dict[str, Any]:
+    """
+    QuoteVersion storage columns for snapshot, given the previous version of the
+    quote (base_*; none for the first version): a delta against it, or the full
+    snapshot when the chain reaches keyframe_interval, when no delta can be
+    encoded, or when the delta would not be smaller.
+    """
+    keyframe = {"snapshot_json": snapshot, "snapshot_delta": None, "base_version_id": None, "delta_depth": 0}
+    if base_snapshot is None or base_depth + 1 >= keyframe_interval:
+        return keyframe
+    delta = snapshot_delta(base_snapshot, snapshot)
+    if delta is None or len(json.dumps(delta, default=str)) >= len(json.dumps(snapshot, default=str)):
+        return keyframe
+    return {"snapshot_json": None, "snapshot_delta": delta, "base_version_id": base_id, "delta_depth": base_depth + 1}
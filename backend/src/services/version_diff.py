@@ -0,0 +1,171 @@
+"""
+Structured diff between two quote snapshots (build_quote_snapshot format), for
+comparing versions without downloading both snapshots.
+
+The diff lists only what changed, so its size follows the change, not the quote:
+
+    {
+      "changed": bool,
+      "grand_total": {"old", "new", "delta"},
+      "fields": {field: {"old", "new"}},       # quote fields ("days" excluded)
+      "days_reordered": bool,
+      "days": [day entries],
+    }
+
+Days and lines are matched by id (by index if their ids are missing or
+repeated). An entry is {"id", "status": "added" | "removed" | "changed", ...}
+with what identifies it (day date/destination, line title/category): added
+ones carry the whole day or line ("day" / "line"), changed ones their "fields"
+and, for days, their changed "lines" and "lines_reordered". Nested objects
+(raw_json) are compared key by key ("raw_json.description"). Positions are not
+reported as field changes: inserting a line would otherwise change every line
+after it; a change of order shows as days_reordered / lines_reordered.
+
+Diffs depend only on the two contents: DiffCache keeps them by the content
+hashes of the two sides (quote_versioning.snapshot_hash).
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import VERSION_DIFF_CACHE_SIZE
+
+_IGNORED = ("position",)
+
+_DAY_SUMMARY = ("date", "destination")
+_LINE_SUMMARY = ("title", "category")
+
+
+def _field_changes(old: Dict[str, Any], new: Dict[str, Any], skip=()) -> Dict[str, Dict[str, Any]]:
+    changes: Dict[str, Dict[str, Any]] = {}
+    for key in list(old) + [k for k in new if k not in old]:
+        if key in skip or key in _IGNORED:
+            continue
+        a, b = old.get(key), new.get(key)
+        if a == b:
+            continue
+        if isinstance(a, dict) and isinstance(b, dict):
+            for sub, change in _field_changes(a, b).items():
+                changes[f"{key}.{sub}"] = change
+        else:
+            changes[key] = {"old": a, "new": b}
+    return changes
+
+
+def _index(items: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """Items by id, or by index if an id is missing or repeated (order kept)."""
+    ids = [item.get("id") for item in items]
+    if None in ids or len(set(ids)) != len(ids):
+        return {f"#{i}": item for i, item in enumerate(items)}
+    return dict(zip(ids, items))
+
+
+def _reordered(old_index: Dict[Any, Any], new_index: Dict[Any, Any]) -> bool:
+    """Whether the items present on both sides are in a different order."""
+    return [k for k in old_index if k in new_index] != [k for k in new_index if k in old_index]
+
+
+def _list_diff(
+    old_items: List[Dict[str, Any]],
+    new_items: List[Dict[str, Any]],
+    name: str,
+    summary: Tuple[str, ...],
+    children: Optional[Tuple[str, Tuple[str, ...]]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Entries of the changed items (new order, then removed ones) and whether the order changed."""
+    old_index, new_index = _index(old_items), _index(new_items)
+    entries = []
+    for key, item in new_index.items():
+        base = old_index.get(key)
+        head = {"id": item.get("id"), **{k: item.get(k) for k in summary}}
+        if base is None:
+            entries.append({**head, "status": "added", name: item})
+            continue
+        entry = {"fields": _field_changes(base, item, skip=(children[0],) if children else ())}
+        if children is not None:
+            child_name, child_summary = children
+            child_entries, child_reordered = _list_diff(
+                base.get(child_name) or [], item.get(child_name) or [], child_name[:-1], child_summary
+            )
+            if child_entries or child_reordered:
+                entry[child_name] = child_entries
+                entry[f"{child_name}_reordered"] = child_reordered
+        if entry["fields"] or len(entry) > 1:
+            entries.append({**head, "status": "changed", **entry})
+    for key, base in old_index.items():
+        if key not in new_index:
+            entries.append({"id": base.get("id"), **{k: base.get(k) for k in summary}, "status": "removed"})
+    return entries, _reordered(old_index, new_index)
+
+
+def _price_change(old: Any, new: Any) -> Dict[str, Any]:
+    delta = round(float(new) - float(old), 2) if old is not None and new is not None else None
+    return {"old": old, "new": new, "delta": delta}
+
+
+def diff_snapshots(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured diff from snapshot old to snapshot new (see module docstring)."""
+    fields = _field_changes(old, new, skip=("days", "version"))
+    days, days_reordered = _list_diff(
+        old.get("days") or [], new.get("days") or [], "day", _DAY_SUMMARY, children=("lines", _LINE_SUMMARY)
+    )
+    return {
+        "changed": bool(fields or days or days_reordered),
+        "grand_total": _price_change(old.get("grand_total"), new.get("grand_total")),
+        "fields": fields,
+        "days_reordered": days_reordered,
+        "days": days,
+    }
+
+
+class DiffCache:
+    """In-memory LRU of diffs, keyed by (old content hash, new content hash)."""
+
+    def __init__(self, max_entries: int = VERSION_DIFF_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_compute(self, key: Tuple[str, str], compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """The cached diff for key, else compute() (outside the lock), stored."""
+        with self._lock:
+            diff = self._entries.get(key)
+            if diff is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return diff
+            self._misses += 1
+        diff = compute()
+        with self._lock:
+            self._entries[key] = diff
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return diff
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "entries": len(self._entries),
+                    "max_entries": self.max_entries}
+
+
+_cache: Optional[DiffCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_diff_cache() -> DiffCache:
+    """Process-wide cache sized by VERSION_DIFF_CACHE_SIZE."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiffCache()
+        return _cache
+
+
+def set_diff_cache(cache: Optional[DiffCache]) -> None:
+    """Replace the process-wide cache (tests, scripts)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -1,11 +1,17 @@
 """
 Fixtures partagées pour tous les tests.
 """
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from PIL import Image
 
 # Base de données de test en mémoire SQLite
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -19,7 +25,39 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Importer Base après avoir créé le moteur de test
-from ..src.models.db import Base
+from src.models.db import Base
+# Importer l'application pour enregistrer tous les modèles sur Base.metadata
+import main  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def image_cache(tmp_path):
+    """Cache d'images de l'export dans un répertoire temporaire, vide pour chaque test."""
+    from src.exports.word.image_cache import ImageCache, set_image_cache
+    cache = ImageCache(tmp_path / "image_cache", max_bytes=64 * 1024 * 1024)
+    set_image_cache(cache)
+    yield cache
+    set_image_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def export_cache(tmp_path):
+    """Cache des exports rendus dans un répertoire temporaire, vide pour chaque test."""
+    from src.services.export_cache import ExportCache, set_export_cache
+    cache = ExportCache(tmp_path / "export_cache", max_bytes=64 * 1024 * 1024)
+    set_export_cache(cache)
+    yield cache
+    set_export_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def diff_cache():
+    """Cache des diffs de versions, vide pour chaque test."""
+    from src.services.version_diff import DiffCache, set_diff_cache
+    cache = DiffCache()
+    set_diff_cache(cache)
+    yield cache
+    set_diff_cache(None)
 
 
 @pytest.fixture(scope="function")
@@ -47,16 +85,16 @@ def client(db, monkeypatch):
     Remplace SessionLocal et get_db pour utiliser notre base de test.
     """
     # Remplacer SessionLocal dans src.models.db avant l'import de app
-    from ..src import models
+    from src import models
     monkeypatch.setattr(models.db, "SessionLocal", TestingSessionLocal)
     
     # Remplacer aussi dans src.db si nécessaire
-    from ..src import db as db_module
+    from src import db as db_module
     monkeypatch.setattr(db_module, "SessionLocal", TestingSessionLocal)
     
     # Maintenant importer app (qui utilisera notre SessionLocal de test)
-    from ..main import app
-    from ..src.db import get_db as original_get_db
+    from main import app
+    from src.db import get_db as original_get_db
     
     def override_get_db():
         """
@@ -77,3 +115,65 @@ def client(db, monkeypatch):
     # Nettoyer les overrides après le test
     app.dependency_overrides.clear()
 
+
+@pytest.fixture
+def image_server():
+    """
+    Serveur HTTP local d'images : /img/<n>.jpg répond après `delay` secondes avec
+    un ETag (et 304 si If-None-Match correspond), le reste en 404.
+    Garde les connexions vues et les requêtes reçues (chemin, If-None-Match).
+    """
+    bodies = {}
+
+    def body_for(path):
+        # Une image distincte par chemin (couleur dérivée du numéro)
+        if path not in bodies:
+            n = int("".join(c for c in path if c.isdigit()) or 0)
+            buf = BytesIO()
+            Image.new("RGB", (400, 300), (n * 37 % 256, 120, 40)).save(buf, format="JPEG")
+            bodies[path] = buf.getvalue()
+        return bodies[path]
+
+    etag = '"v1"'
+    connections = set()
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_GET(self):
+            connections.add(self.client_address)
+            requests.append((self.path, self.headers.get("If-None-Match")))
+            if not self.path.startswith("/img/"):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            time.sleep(server.delay)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = body_for(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.delay = 0.3
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.connections = connections
+    server.requests = requests
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,39 @@
+"""
+Tests pour les endpoints d'authentification (magic link).
+"""
+import threading
+import time
+
+
+def test_request_link_rejects_other_domains(client):
+    """Test que seules les adresses @eetvl.com peuvent demander un lien."""
+    response = client.post("/auth/request-link", json={"email": "agent@example.com"})
+    assert response.status_code == 400
+
+
+def test_slow_smtp_does_not_block_health(client, monkeypatch):
+    """Test qu'un envoi SMTP lent n'empêche pas /health de répondre."""
+    from src.auth import email as email_module
+
+    sent = []
+
+    def _slow_send(to_email, token):
+        time.sleep(1.0)
+        sent.append(to_email)
+
+    monkeypatch.setattr(email_module, "send_magic_link_email", _slow_send)
+
+    results = []
+    worker = threading.Thread(
+        target=lambda: results.append(client.post("/auth/request-link", json={"email": "jane.doe@eetvl.com"}))
+    )
+    worker.start()
+    time.sleep(0.2)  # la requête est en cours d'envoi SMTP
+
+    started = time.perf_counter()
+    assert client.get("/health").status_code == 200
+    assert time.perf_counter() - started < 0.5
+
+    worker.join()
+    assert results[0].status_code == 200
+    assert sent == ["jane.doe@eetvl.com"]
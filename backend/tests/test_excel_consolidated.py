@@ -0,0 +1,93 @@
+"""
+Tests du classeur Excel consolidé (feuille Summary + une feuille par devis).
+"""
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+from openpyxl import load_workbook
+from sqlalchemy import event
+
+from src.exports.excel import build_xlsx_for_quote, build_xlsx_for_quotes, sheet_title
+from src.models_quote import Quote, QuoteDay, QuoteLine
+
+
+def _add_quote(db, title, start, grand_total, agency="Globe Travel"):
+    q = Quote(title=title, pax=2, travel_agency=agency, start_date=start, fx_rate=Decimal("1.08"),
+              onspot_total=Decimal("10"), hassle_total=Decimal("5.50"), grand_total=grand_total)
+    day = QuoteDay(position=0, destination="Lisbon", decorative_images=[])
+    day.lines += [
+        QuoteLine(position=0, category="Activity", title="Tram 28", achat_eur=Decimal("33.33"),
+                  vente_usd=Decimal("7.5"), raw_json={"buff_pct": 10}),
+        QuoteLine(position=1, category="Hotel", title="Pestana", achat_eur=Decimal("200"),
+                  raw_json={"fields": {"provider_service_url": "hotel.example"}}),
+    ]
+    q.days.append(day)
+    db.add(q)
+    db.commit()
+    return q.id
+
+
+def _sheet_values(ws):
+    return [[c.value for c in row] for row in ws.iter_rows()]
+
+
+def test_consolidated_endpoint_filters_season(client, db):
+    """Les devis de la saison : une feuille chacun, identique à l'export seul, et le récapitulatif."""
+    ids = [
+        _add_quote(db, "Spring: Lisbon", date(2026, 4, 10), Decimal("1200.50")),
+        _add_quote(db, "Summer", date(2026, 6, 1), Decimal("800")),
+    ]
+    _add_quote(db, "Winter", date(2026, 12, 1), Decimal("99"))
+
+    response = client.post("/quotes/export-consolidated",
+                           json={"departure_from": "2026-03-01", "departure_to": "2026-08-31"})
+    assert response.status_code == 200
+    assert "quotes_consolidated_" in response.headers["content-disposition"]
+
+    wb = load_workbook(BytesIO(response.content))
+    assert wb.sheetnames == ["Summary", f"{ids[0]} Spring  Lisbon", f"{ids[1]} Summer"]
+
+    summary = _sheet_values(wb["Summary"])
+    assert summary[0][:2] == ["Quote", "Title"]
+    assert [row[0] for row in summary[1:3]] == ids
+    assert [row[10] for row in summary[1:3]] == [1200.5, 800]
+    assert summary[3][0] == "Total" and summary[3][10] == "=SUM(K2:K3)"
+    assert wb["Summary"]["B2"].hyperlink.location == f"'{ids[0]} Spring  Lisbon'!A1"
+
+    single = load_workbook(build_xlsx_for_quote(db, ids[1]))
+    assert _sheet_values(wb[f"{ids[1]} Summer"]) == _sheet_values(single["Quote"])
+
+    assert client.post("/quotes/export-consolidated", json={"travel_agency": "nobody"}).status_code == 404
+    assert client.post("/quotes/export-consolidated", json={"departure_from": "spring"}).status_code == 400
+
+
+def test_quotes_loaded_in_bulk_per_chunk(db):
+    """Le nombre de requêtes dépend du nombre de paquets, pas du nombre de devis."""
+    ids = [_add_quote(db, f"Quote {i}", date(2026, 5, i + 1), Decimal("100")) for i in range(7)]
+    db.expire_all()
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        out = build_xlsx_for_quotes(db, ids + [9999], chunk_size=3)
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
+
+    # 3 paquets : 1 requête de totaux + 3 (devis, jours, lignes) chacun
+    assert len(statements) == 3 * 4
+    wb = load_workbook(out)
+    assert len(wb.sheetnames) == 1 + 7
+    assert not any(isinstance(o, Quote) for o in db.identity_map.values())
+
+
+def test_sheet_title_follows_excel_rules():
+    """31 caractères au plus, sans []:*?/\\, unique grâce à l'identifiant."""
+    assert sheet_title(12, "Paris/Rome [VIP]: 2026") == "12 Paris Rome  VIP   2026"
+    assert len(sheet_title(123456, "x" * 80)) == 31
+    assert sheet_title(7, None) == "7"
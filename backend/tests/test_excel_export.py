@@ -0,0 +1,134 @@
+"""
+Tests de l'export Excel (classeur en écriture seule, styles nommés partagés).
+
+Le fichier de référence tests/golden/excel_quote.json décrit l'export du devis
+ci-dessous : valeurs et formules, formats numériques, polices, bordures,
+alignements, liens, hauteurs de lignes et largeurs de colonnes. Le régénérer
+(après un changement voulu du rendu) : python -m tests.test_excel_export
+"""
+import json
+import tracemalloc
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+
+from src.api.quotes import load_quote
+from src.exports.excel import QuoteSheetStyles, build_xlsx_for_quote, write_quote_sheet
+from src.models_quote import Quote, QuoteDay, QuoteLine
+
+GOLDEN = Path(__file__).parent / "golden" / "excel_quote.json"
+
+
+def _add_rich_quote(db):
+    """Devis couvrant tous les cas du rendu : buff, FX, liens, notes, lignes non payantes..."""
+    q = Quote(
+        title="Golden", pax=2, fx_rate=Decimal("1.08"), margin_pct=Decimal("0.15"),
+        onspot_total=Decimal("42.50"), hassle_total=Decimal("30.00"),
+    )
+    lisbon = QuoteDay(position=0, destination="Lisbon", decorative_images=[])
+    lisbon.lines += [
+        QuoteLine(position=0, category="Trip info", title="Welcome"),
+        QuoteLine(position=1, category="Hotel", title="Pestana", achat_eur=Decimal("200"),
+                  vente_usd=Decimal("25"), supplier_name="Pestana Group",
+                  raw_json={"hotel_name": "Pestana Palace", "buff_pct": 10, "internal_note": "Sea view"}),
+        QuoteLine(position=2, category="Activity", title="Tram 28", achat_eur=Decimal("33.33"),
+                  fx_rate=Decimal("1.1"), vente_usd=Decimal("7.5"),
+                  raw_json={"fields": {"provider_service_url": "tram.example/28"}}),
+        QuoteLine(position=3, category="Flight", title="LIS-OPO", vente_usd=Decimal("0"),
+                  raw_json={"from": "LIS", "to": "OPO", "internal_note": "Check bags",
+                            "provider_service_url": "https://air.example"}),
+    ]
+    porto = QuoteDay(position=1, destination="Porto", decorative_images=[])
+    porto.lines += [
+        QuoteLine(position=0, category="Cost", title="Guide " + "x" * 60, achat_eur=Decimal("100"),
+                  raw_json={"buff_pct": 8}),
+        QuoteLine(position=1, category="Internal", title="Hidden"),
+        QuoteLine(position=2, category="Car rental", title="Car", achat_eur=Decimal("216"),
+                  fx_rate=Decimal("1.08")),
+    ]
+    q.days += [lisbon, porto]
+    db.add(q)
+    db.commit()
+    return q.id
+
+
+def _color(color):
+    if color is None:
+        return None
+    return f"{color.type}:{getattr(color, color.type)}"
+
+
+def describe_workbook(data: bytes):
+    """Tout ce qui se voit dans Excel, cellule par cellule (cellules vides sans style ignorées)."""
+    wb = load_workbook(BytesIO(data))
+    sheets = []
+    for ws in wb.worksheets:
+        cells = {}
+        for row in ws.iter_rows():
+            for c in row:
+                if c.value is None and not c.has_style:
+                    continue
+                cells[c.coordinate] = {
+                    "value": c.value,
+                    "number_format": c.number_format,
+                    "font": [c.font.name, c.font.sz, c.font.b, c.font.u, _color(c.font.color)],
+                    "border": [s.style if s else None for s in (c.border.left, c.border.right, c.border.top, c.border.bottom)],
+                    "horizontal": c.alignment.horizontal,
+                    "hyperlink": c.hyperlink.target if c.hyperlink else None,
+                }
+        sheets.append({
+            "title": ws.title,
+            "columns": {k: d.width for k, d in sorted(ws.column_dimensions.items()) if d.customWidth},
+            "rows": {str(k): d.height for k, d in sorted(ws.row_dimensions.items()) if d.height is not None},
+            "cells": cells,
+        })
+    return sheets
+
+
+def test_excel_export_matches_golden_file(db):
+    """Formules, valeurs et formats identiques à la référence."""
+    out = build_xlsx_for_quote(db, _add_rich_quote(db))
+    assert describe_workbook(out.read()) == json.loads(GOLDEN.read_text(encoding="utf-8"))
+
+
+def _sheet_peak_bytes(db, n_lines):
+    """Pic mémoire de l'écriture de la feuille (devis déjà chargé) pour n_lines lignes."""
+    q = Quote(title=f"Big {n_lines}", pax=2, fx_rate=Decimal("1.08"))
+    day = QuoteDay(position=0, destination="Rome", decorative_images=[])
+    day.lines += [
+        QuoteLine(position=i, category="Activity", title=f"Visit {i}", achat_eur=Decimal("120.50"),
+                  vente_usd=Decimal("15"), supplier_name="Supplier", raw_json={"buff_pct": 5})
+        for i in range(n_lines)
+    ]
+    q.days.append(day)
+    db.add(q)
+    db.commit()
+    q = load_quote(db, q.id)
+
+    wb = Workbook(write_only=True)
+    tracemalloc.start()
+    try:
+        write_quote_sheet(wb.create_sheet("Quote"), q, QuoteSheetStyles(wb))
+        wb.save(BytesIO())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_sheet_memory_does_not_grow_with_lines(db):
+    """Écriture en flux : 20 fois plus de lignes, pas 20 fois plus de mémoire."""
+    small = _sheet_peak_bytes(db, 100)
+    large = _sheet_peak_bytes(db, 2000)
+    assert large < small * 2, f"{small / 1e6:.2f} Mo -> {large / 1e6:.2f} Mo"
+
+
+if __name__ == "__main__":
+    from benchmarks._fixtures import make_session
+
+    db = make_session()
+    sheets = describe_workbook(build_xlsx_for_quote(db, _add_rich_quote(db)).read())
+    GOLDEN.parent.mkdir(exist_ok=True)
+    GOLDEN.write_text(json.dumps(sheets, indent=1, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"wrote {GOLDEN}")
@@ -0,0 +1,84 @@
+"""
+Tests de l'export par lot dans un ZIP (/quotes/export-batch, CLI, pool de processus).
+"""
+import json
+import zipfile
+from io import BytesIO
+
+from openpyxl import load_workbook
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.db import Base
+from src.models_quote import Quote, QuoteDay, QuoteLine
+from src.services.export_batch import REPORT_NAME, ChunkSink, _main, export_batch
+
+
+def _add_quote(db, title, agency):
+    q = Quote(title=title, pax=2, travel_agency=agency)
+    day = QuoteDay(position=0, destination="Lisbon", decorative_images=[])
+    day.lines.append(QuoteLine(position=0, category="Activity", title="Tram 28", achat_usd=10, vente_usd=0))
+    q.days.append(day)
+    db.add(q)
+    db.commit()
+    return q.id
+
+
+def test_export_batch_endpoint_filters_and_zips(client, db):
+    """Les devis de l'agence sont tous dans le ZIP, chacun un .xlsx valide, avec le rapport."""
+    ids = [_add_quote(db, f"Season {i}", "Globe Travel") for i in range(3)]
+    _add_quote(db, "Other", "Elsewhere")
+
+    response = client.post("/quotes/export-batch", json={"kind": "excel", "travel_agency": "globe travel"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+
+    zf = zipfile.ZipFile(BytesIO(response.content))
+    names = sorted(n for n in zf.namelist() if n != REPORT_NAME)
+    assert names == [f"{i} - Season {n}.xlsx" for n, i in enumerate(ids)]
+    for name in names:
+        load_workbook(BytesIO(zf.read(name)))
+    report = json.loads(zf.read(REPORT_NAME))
+    assert report["exported"] == 3 and report["failed"] == []
+
+    assert client.post("/quotes/export-batch", json={"travel_agency": "nobody"}).status_code == 404
+    assert client.post("/quotes/export-batch", json={"updated_since": "soon"}).status_code == 400
+
+
+def test_export_batch_in_worker_processes(tmp_path, monkeypatch):
+    """Base sur fichier : rendu par des processus, ZIP écrit au fil de l'eau, échec isolé dans le rapport."""
+    monkeypatch.setenv("EXPORT_CACHE_DIR", str(tmp_path / "export_cache"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    ids = [_add_quote(db, f"Quote {i}", "Globe Travel") for i in range(5)]
+
+    sink = ChunkSink()
+    data = bytearray()
+    progress = []
+    for p in export_batch(db, "word", ids + [9999], sink, max_workers=2):
+        progress.append(p)
+        data += sink.drain()
+    data += sink.drain()
+    db.close()
+
+    assert [p.exported + p.failed for p in progress[:-1]] == list(range(1, 7))
+    assert progress[-1].done and progress[-1].exported == 5 and progress[-1].failed == 1
+    zf = zipfile.ZipFile(BytesIO(bytes(data)))
+    assert len([n for n in zf.namelist() if n.endswith(".docx")]) == 5
+    report = json.loads(zf.read(REPORT_NAME))
+    assert [f["quote_id"] for f in report["failed"]] == [9999]
+
+
+def test_export_batch_cli(db, tmp_path, monkeypatch, capsys):
+    """La CLI écrit le ZIP et affiche l'avancement."""
+    from src import models
+
+    monkeypatch.setattr(models.db, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    ids = [_add_quote(db, f"Cli {i}", "Globe Travel") for i in range(2)]
+    out = tmp_path / "season.zip"
+
+    _main(["--out", str(out), "--ids", ",".join(map(str, ids)), "--workers", "2"])
+
+    assert len(zipfile.ZipFile(out).namelist()) == 3
+    assert capsys.readouterr().out.splitlines()[-1] == "2/2 quotes, 0 failed (done)"
@@ -0,0 +1,140 @@
+"""
+Tests du cache des exports rendus (clé : contenu du devis + version du template).
+"""
+import os
+import time
+from io import BytesIO
+
+from src.exports import word
+from src.exports.word import template_cache
+from src.services.export_cache import ExportCache, export_cache_key
+
+
+def _create_quote(client):
+    payload = {
+        "title": "Cache",
+        "pax": 2,
+        "days": [{"position": 0, "destination": "Rome", "lines": [{"title": "Colosseum", "category": "Activity"}]}],
+    }
+    response = client.post("/quotes", json=payload)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _no_build(*args, **kwargs):
+    raise AssertionError("export reconstruit malgré le cache")
+
+
+def test_repeat_export_served_from_cache(client, export_cache, monkeypatch):
+    """Deuxième export du même devis : même fichier, sans reconstruction ; un changement invalide."""
+    quote = _create_quote(client)
+    first = client.get(f"/quotes/{quote['id']}/export/word")
+    assert first.status_code == 200
+
+    monkeypatch.setattr(word, "build_docx_for_quote", _no_build)
+    second = client.get(f"/quotes/{quote['id']}/export/word")
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert export_cache.stats()["hits"] == 1
+
+    # Devis modifié => nouvelle clé => reconstruction
+    monkeypatch.undo()
+    response = client.patch(f"/quotes/{quote['id']}", json={"version": quote["version"], "title": "Cache 2"})
+    assert response.status_code == 200
+    third = client.get(f"/quotes/{quote['id']}/export/word")
+    assert third.status_code == 200
+    stats = export_cache.stats()
+    assert stats["misses"] == 2 and stats["files"] == 2
+
+
+def test_export_missing_photos_is_not_cached(client, image_server, export_cache, monkeypatch):
+    """Photo du héros non téléchargée : le docx n'est pas mis en cache, l'export suivant l'inclut."""
+    from docx import Document
+
+    from src.exports.word import exporter
+    from src.services.image_prewarm import wait_for_prewarm
+
+    image_server.delay = 0
+    payload = {
+        "title": "Cache",
+        "pax": 2,
+        "hero_photo_1": f"{image_server.base_url}/img/1.jpg",
+        "hero_photo_2": f"{image_server.base_url}/img/2.jpg",
+        "days": [{"position": 0, "destination": "Rome", "lines": []}],
+    }
+    quote = client.post("/quotes", json=payload).json()
+    assert wait_for_prewarm(timeout=10)
+
+    prefetch = exporter.prefetch_images
+    monkeypatch.setattr(exporter, "prefetch_images", lambda urls, **kw: {url: None for url in urls})
+    first = client.get(f"/quotes/{quote['id']}/export/word")
+    assert first.status_code == 200
+    assert len(Document(BytesIO(first.content)).inline_shapes) == 0
+    assert export_cache.stats()["hits"] == 0
+
+    monkeypatch.setattr(exporter, "prefetch_images", prefetch)
+    second = client.get(f"/quotes/{quote['id']}/export/word")
+    assert len(Document(BytesIO(second.content)).inline_shapes) == 1
+    assert export_cache.stats()["hits"] == 0  # reconstruit, pas servi depuis le cache
+
+    third = client.get(f"/quotes/{quote['id']}/export/word")
+    assert third.content == second.content
+    assert export_cache.stats()["hits"] == 1
+
+
+def test_key_depends_on_content_kind_and_template(monkeypatch):
+    """Même contenu => même clé ; autre contenu, autre type ou autre template => autre clé."""
+    snapshot = {"title": "A", "days": [{"position": 0, "lines": []}]}
+    key = export_cache_key("word", snapshot)
+    assert export_cache_key("word", {"days": [{"lines": [], "position": 0}], "title": "A"}) == key
+    assert export_cache_key("word", {**snapshot, "title": "B"}) != key
+    assert export_cache_key("excel", snapshot) != key
+
+    template = template_cache.get_word_template()
+    monkeypatch.setattr(template, "digest", "0" * 64)
+    assert export_cache_key("word", snapshot) != key
+
+
+def test_version_refers_to_cached_artifact(client, export_cache):
+    """La version auto de l'export garde la clé du fichier, téléchargeable tant qu'il est en cache."""
+    quote = _create_quote(client)
+    export = client.get(f"/quotes/{quote['id']}/export/excel", params={"create_version": True})
+    assert export.status_code == 200
+
+    versions = client.get(f"/quotes/{quote['id']}/versions").json()["items"]
+    version = next(v for v in versions if v["export_type"] == "excel")
+    assert version["export_artifact"] and export_cache.has(version["export_artifact"])
+
+    url = f"/quotes/{quote['id']}/versions/{version['id']}/export"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == export.content
+
+    os.remove(export_cache.path(version["export_artifact"]))
+    assert client.get(url).status_code == 410
+    initial = next(v for v in versions if v["export_type"] is None)
+    assert client.get(f"/quotes/{quote['id']}/versions/{initial['id']}/export").status_code == 404
+
+
+def test_size_and_age_eviction(tmp_path):
+    """Au-delà du plafond, le moins récemment servi part ; au-delà de l'âge maximal, plus de hit."""
+    cache = ExportCache(tmp_path / "exports", max_bytes=2500)
+    for key in ("a" * 64, "b" * 64):
+        cache.put(key, BytesIO(bytes(1000)))
+    old = time.time() - 100
+    os.utime(cache.path("a" * 64), (old, old))
+    os.utime(cache.path("b" * 64), (old + 1, old + 1))
+
+    with cache.open("a" * 64):  # servi => le plus récent
+        pass
+    cache.put("c" * 64, BytesIO(bytes(1000)))
+    assert not cache.has("b" * 64)
+    assert cache.has("a" * 64) and cache.has("c" * 64)
+    assert cache.stats()["evictions"] == 1
+
+    aged = ExportCache(tmp_path / "exports", max_bytes=2500, max_age_s=50)
+    assert aged.open("a" * 64) is None  # stocké il y a 100 s
+    hit = aged.open("c" * 64)
+    assert hit is not None
+    hit.close()
+    assert aged.stats()["expired"] == 1
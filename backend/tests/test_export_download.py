@@ -0,0 +1,112 @@
+"""
+Tests du téléchargement des exports (fichier temporaire + réponse en streaming).
+"""
+import asyncio
+import hashlib
+import tracemalloc
+from io import BytesIO
+
+from docx import Document
+
+DOC_BYTES = 8 * 1024 * 1024
+CONCURRENT = 10
+
+
+def _fake_builder(db, quote_id, out=None, **kwargs):
+    """Export « lourd » (8 Mo, incompressible) écrit par morceaux comme le ferait un zip."""
+    rnd = hashlib.sha256(str(quote_id).encode())
+    for i in range(DOC_BYTES // 4096):
+        rnd.update(i.to_bytes(4, "little"))
+        out.write(rnd.digest() * 128)
+    out.seek(0)
+    return out
+
+
+def _expected_digest(quote_id):
+    out = BytesIO()
+    _fake_builder(None, quote_id, out=out)
+    return hashlib.sha256(out.getvalue()).hexdigest()
+
+
+async def _download(app, path):
+    """Requête ASGI dont le corps est consommé au fil de l'eau (pas gardé en mémoire)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 12345), "server": ("testserver", 80),
+    }
+    result = {"status": None, "headers": {}, "size": 0, "sha256": hashlib.sha256()}
+    done = asyncio.Event()
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            result["size"] += len(body)
+            result["sha256"].update(body)
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return result
+
+
+def test_concurrent_downloads_do_not_hold_whole_documents(client, monkeypatch):
+    """10 exports de 8 Mo en parallèle : mémoire Python par export bien en dessous de la taille du document."""
+    from src.exports import excel
+
+    monkeypatch.setattr(excel, "build_xlsx_for_quote", _fake_builder)
+    ids = []
+    for i in range(CONCURRENT):
+        response = client.post("/quotes", json={"title": f"Big {i}", "pax": 2, "days": []})
+        ids.append(response.json()["id"])
+
+    async def run_all():
+        return await asyncio.gather(*(_download(client.app, f"/quotes/{qid}/export/excel") for qid in ids))
+
+    tracemalloc.start()
+    try:
+        results = asyncio.run(run_all())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    for qid, result in zip(ids, results):
+        assert result["status"] == 200
+        assert result["headers"]["content-length"] == str(DOC_BYTES)
+        assert result["size"] == DOC_BYTES
+        assert result["sha256"].hexdigest() == _expected_digest(qid)
+    # Avant : BytesIO + copie getvalue() = au moins 2 x 8 Mo par export
+    per_export = peak / CONCURRENT
+    assert per_export < DOC_BYTES / 2, f"{per_export / 1e6:.1f} Mo par export"
+
+
+def test_word_download_is_streamed_and_temp_file_closed(client, monkeypatch):
+    """Le .docx arrive complet avec sa taille, et le fichier temporaire est fermé après l'envoi."""
+    from src.api import downloads
+
+    opened = []
+    real_spooled_file = downloads.spooled_file
+
+    def tracking_spooled_file():
+        f = real_spooled_file()
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr("src.api.quotes.spooled_file", tracking_spooled_file)
+    quote_id = client.post("/quotes", json={"title": "Stream", "pax": 2, "days": []}).json()["id"]
+
+    response = client.get(f"/quotes/{quote_id}/export/word")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(response.content))
+    assert 'filename="Stream.docx"' in response.headers["content-disposition"]
+    Document(BytesIO(response.content))
+    assert len(opened) == 1 and opened[0].closed
@@ -0,0 +1,117 @@
+"""
+Tests des exports en tâche de fond (/quotes/{id}/export-jobs).
+"""
+import time
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src.models_export import ExportJob
+from src.services import export_jobs
+
+
+@pytest.fixture(autouse=True)
+def jobs_dir(tmp_path, monkeypatch):
+    """Les fichiers produits vont dans un répertoire temporaire."""
+    monkeypatch.setattr(export_jobs, "EXPORT_JOBS_DIR", tmp_path)
+    return tmp_path
+
+
+def _create_quote(client, n_days=3):
+    payload = {
+        "title": "Export / async",
+        "pax": 2,
+        "days": [
+            {
+                "position": i,
+                "destination": "Paris",
+                "lines": [{"title": f"Service {i}", "category": "Activity", "achat_usd": 10, "vente_usd": 0}],
+            }
+            for i in range(n_days)
+        ],
+    }
+    response = client.post("/quotes", json=payload)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _wait_for(client, quote_id, job_id, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/quotes/{quote_id}/export-jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"export job {job_id} still {job['status']}")
+
+
+@pytest.mark.parametrize("kind", ["word", "excel"])
+def test_export_job_builds_file_and_version(client, kind):
+    """Le job est accepté tout de suite, avance jusqu'à done, puis le fichier se télécharge."""
+    quote_id = _create_quote(client)
+
+    response = client.post(f"/quotes/{quote_id}/export-jobs", json={"kind": kind})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("queued", "running", "done")
+
+    job = _wait_for(client, quote_id, job["id"])
+    assert job["status"] == "done", job["error"]
+    if kind == "word":
+        assert job["progress"]["days_total"] == 3
+        assert job["progress"]["days_rendered"] == 3
+
+    result = client.get(f"/quotes/{quote_id}/export-jobs/{job['id']}/result")
+    assert result.status_code == 200
+    assert result.content[:2] == b"PK"  # docx/xlsx = zip
+    assert job["file_name"] == f"Export _ async.{'docx' if kind == 'word' else 'xlsx'}"
+    assert "attachment" in result.headers["content-disposition"]
+
+    versions = client.get(f"/quotes/{quote_id}/versions").json()["items"]
+    assert [v["export_file_name"] for v in versions if v["export_type"] == kind] == [job["file_name"]]
+
+
+def test_export_job_errors(client):
+    """Devis inconnu, type inconnu, job d'un autre devis, résultat d'un job non terminé."""
+    quote_id = _create_quote(client)
+    assert client.post("/quotes/9999/export-jobs", json={"kind": "word"}).status_code == 404
+    assert client.post(f"/quotes/{quote_id}/export-jobs", json={"kind": "pdf"}).status_code == 422
+    assert client.get(f"/quotes/{quote_id}/export-jobs/nope").status_code == 404
+
+
+def test_pending_jobs_are_resumed(client, db):
+    """Un job resté en file (redémarrage) est repris au démarrage."""
+    quote_id = _create_quote(client)
+    job = ExportJob(id="a" * 32, quote_id=quote_id, kind="excel", status="running", progress={})
+    db.add(job)
+    db.commit()
+
+    assert client.get(f"/quotes/{quote_id}/export-jobs/{job.id}/result").status_code == 409
+
+    resumed = export_jobs.resume_pending_jobs(sessionmaker(bind=db.get_bind()))
+    assert resumed == 1
+    assert _wait_for(client, quote_id, job.id)["status"] == "done"
+
+
+def test_resumed_job_is_rendered_once(client, db, monkeypatch):
+    """Deux processus reprennent le même job au démarrage : un seul le réclame et le construit."""
+    quote_id = _create_quote(client)
+    job = ExportJob(id="b" * 32, quote_id=quote_id, kind="excel", status="running", progress={})
+    db.add(job)
+    db.commit()
+
+    builds = []
+    original_build = export_jobs._build
+
+    def counting_build(*args):
+        builds.append(args[1].id)
+        time.sleep(0.2)  # le second processus reprend pendant le rendu
+        original_build(*args)
+
+    monkeypatch.setattr(export_jobs, "_build", counting_build)
+    factory = sessionmaker(bind=db.get_bind())
+    export_jobs.resume_pending_jobs(factory)
+    export_jobs.resume_pending_jobs(factory)
+    assert _wait_for(client, quote_id, job.id)["status"] == "done"
+    time.sleep(0.3)
+    assert builds == [job.id]
@@ -0,0 +1,120 @@
+"""
+Tests du cache disque des images de l'export.
+"""
+import os
+import random
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from src.exports.word.image_cache import ImageCache
+from src.exports.word.image_utils import prefetch_images, stitch_side_by_side_to_cm, warm_image_derivatives
+
+
+def test_fresh_download_skips_network(image_server, image_cache):
+    """Une image déjà téléchargée et fraîche ne refait aucune requête."""
+    image_server.delay = 0
+    url = f"{image_server.base_url}/img/1.jpg"
+    first = prefetch_images([url])[url]
+    second = prefetch_images([url])[url]
+
+    assert first == second
+    assert len(image_server.requests) == 1
+    stats = image_cache.stats()
+    assert stats["raw_hits"] == 1
+    assert stats["raw_misses"] == 1
+
+
+def test_stale_download_is_revalidated(image_server, tmp_path):
+    """Passé max_age_s, la requête est conditionnelle et un 304 réutilise les octets en cache."""
+    image_server.delay = 0
+    cache = ImageCache(tmp_path / "stale", max_bytes=10_000_000, max_age_s=0)
+    url = f"{image_server.base_url}/img/1.jpg"
+    first = prefetch_images([url], cache=cache)[url]
+    second = prefetch_images([url], cache=cache)[url]
+
+    assert first == second
+    assert image_server.requests == [("/img/1.jpg", None), ("/img/1.jpg", '"v1"')]
+    assert cache.stats()["raw_revalidated"] == 1
+
+
+def test_stitched_hero_is_cached(image_server, image_cache, monkeypatch):
+    """Le JPEG assemblé est réutilisé sans retravailler les images (clé : contenu + taille/DPI/qualité)."""
+    image_server.delay = 0
+    urls = [f"{image_server.base_url}/img/{i}.jpg" for i in range(2)]
+    images = prefetch_images(urls)
+    first = stitch_side_by_side_to_cm(urls[0], urls[1], images=images)
+
+    from src.exports.word import image_utils
+
+    def no_pil(buf):
+        raise AssertionError("image retravaillée malgré le cache")
+
+    monkeypatch.setattr(image_utils, "ensure_jpeg", no_pil)
+    before = image_cache.stats()
+    assert stitch_side_by_side_to_cm(urls[0], urls[1], images=images) == first
+    after = image_cache.stats()
+    assert after["derived_hits"] == before["derived_hits"] + 1
+    assert after["derived_misses"] == before["derived_misses"]
+
+    # Autre taille => autre dérivé
+    monkeypatch.undo()
+    other = stitch_side_by_side_to_cm(urls[0], urls[1], width_cm=10, images=images)
+    assert other != first
+
+
+def _textured_jpeg(seed):
+    rng = random.Random(seed)
+    buf = BytesIO()
+    Image.frombytes("RGB", (400, 300), rng.randbytes(400 * 300 * 3)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def test_stitched_hero_same_with_warm_halves(tmp_path):
+    """Moitiés préparées à l'avance (cache sans perte) : même JPEG qu'à froid, encodé une seule fois."""
+    images = {f"http://photos/{i}.jpg": _textured_jpeg(i) for i in range(2)}
+    left, right = images
+
+    cold = stitch_side_by_side_to_cm(left, right, images=images,
+                                     cache=ImageCache(tmp_path / "cold", max_bytes=50_000_000))
+    warm_cache = ImageCache(tmp_path / "warm", max_bytes=50_000_000)
+    for data in images.values():
+        warm_image_derivatives(data, cache=warm_cache)
+    derived = lambda: sorted(p.suffix for p in (tmp_path / "warm" / "derived").rglob("*") if p.is_file())
+    assert derived() == [".png", ".png"]  # seulement les moitiés, au format réellement écrit
+    before = warm_cache.stats()["derived_hits"]
+    warm = stitch_side_by_side_to_cm(left, right, images=images, cache=warm_cache)
+
+    assert warm_cache.stats()["derived_hits"] == before + 2  # les deux moitiés
+    assert warm == cold
+    assert derived() == [".jpg", ".png", ".png"]
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    """Au-delà du plafond, les entrées les moins récemment utilisées partent en premier."""
+    cache = ImageCache(tmp_path / "lru", max_bytes=3500)
+    for i in range(3):
+        cache.put_derived(("k", i), bytes(1000))
+        # mtime distincts
+        path = cache._derived_path(("k", i))
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+
+    assert cache.get_derived(("k", 0)) is not None  # devient la plus récente
+    cache.put_derived(("k", 3), bytes(1000))
+
+    assert cache.get_derived(("k", 1)) is None
+    assert cache.get_derived(("k", 0)) is not None
+    assert cache.get_derived(("k", 3)) is not None
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["size_bytes"] <= 3500
+
+
+def test_image_cache_stats_endpoint(client):
+    """Les compteurs sont exposés pour le monitoring."""
+    response = client.get("/health/image-cache")
+    assert response.status_code == 200
+    data = response.json()
+    for key in ("raw_hits", "raw_misses", "derived_hits", "derived_misses", "evictions", "size_bytes"):
+        assert key in data
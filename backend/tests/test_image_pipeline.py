@@ -0,0 +1,69 @@
+"""
+Tests du redimensionnement des images de l'export (draft JPEG, reduce(), recherche de qualité).
+"""
+import random
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageStat
+
+from src.exports.word.image_utils import _compress_to_jpeg_bytes, _cover_to_px, cover_crop_to_cm
+
+
+def _photo(w, h, seed=1) -> Image.Image:
+    """Image « photo » : dégradé + bruit, pour que la taille JPEG dépende de la qualité."""
+    rnd = random.Random(seed)
+    img = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    noise = Image.frombytes("RGB", (w, h), bytes(rnd.getrandbits(8) for _ in range(w * h * 3)))
+    return Image.blend(img, noise, 0.35)
+
+
+def _jpeg(img, quality=92) -> BytesIO:
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf
+
+
+def _legacy_compress(img, quality, max_bytes):
+    """Ancienne boucle : qualité -5 jusqu'à ce que ça tienne (ou 50)."""
+    q = quality
+    while True:
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=q, optimize=True, progressive=True)
+        if out.tell() <= max_bytes or q <= 50:
+            return out.getvalue()
+        q -= 5
+
+
+def test_quality_search_matches_step_loop():
+    """La recherche choisit la même qualité que la boucle pas à pas, quel que soit le plafond."""
+    img = _photo(300, 200)
+    sizes = [len(_legacy_compress(img, q, 0)) for q in (80, 50)]
+    for max_bytes in (10**9, sizes[0] - 1, (sizes[0] + sizes[1]) // 2, sizes[1] + 1, 100):
+        assert _compress_to_jpeg_bytes(img, 80, max_bytes).getvalue() == _legacy_compress(img, 80, max_bytes)
+
+
+def test_cover_of_large_jpeg_is_exact_and_faithful():
+    """Une grande photo décodée en draft puis réduite donne la bonne taille et le même rendu."""
+    src = Image.linear_gradient("L").resize((4000, 3000)).convert("RGB")
+    buf = _jpeg(src)
+
+    out = _cover_to_px(buf, 869, 531)
+    assert out.size == (869, 531)
+
+    # Référence : LANCZOS direct sur l'image pleine résolution
+    ref_w = 869
+    ref_h = round(3000 * 869 / 4000)
+    ref = src.resize((ref_w, ref_h), Image.LANCZOS)
+    top = (ref_h - 531) // 2
+    ref = ref.crop((0, top, 869, top + 531))
+    diff = ImageStat.Stat(ImageChops.difference(out.convert("RGB"), ref)).mean
+    assert max(diff) < 2.0
+
+
+def test_cover_crop_to_cm_handles_small_and_grey_images():
+    """Petite image (agrandie) et image en niveaux de gris passent toujours."""
+    small = _jpeg(Image.new("RGB", (50, 40), (10, 20, 30)))
+    grey = _jpeg(_photo(1200, 900).convert("L"))
+    for buf in (small, grey):
+        out = cover_crop_to_cm(buf, 7.3, 5.14, 150)
+        assert Image.open(out).size == (431, 304)
@@ -0,0 +1,60 @@
+"""
+Tests de la préparation en tâche de fond des images de l'export.
+"""
+from src.exports.word import build_docx_for_quote
+from src.exports.word.image_utils import prefetch_images
+from src.services.image_prewarm import wait_for_prewarm
+
+
+def test_destination_photo_is_prewarmed(client, image_server, image_cache):
+    """POST /destinations/photos télécharge la photo en arrière-plan."""
+    image_server.delay = 0
+    dest = client.post("/destinations", json={"name": "Paris"}).json()
+    url = f"{image_server.base_url}/img/7.jpg"
+    response = client.post("/destinations/photos", json={"dest_id": dest["id"], "photo_url": url})
+    assert response.status_code == 200
+    assert wait_for_prewarm(timeout=10)
+
+    assert len(image_server.requests) == 1
+    prefetch_images([url])
+    assert len(image_server.requests) == 1  # servie par le cache
+    assert image_cache.stats()["raw_hits"] >= 1
+
+
+def test_quote_save_prewarms_heroes(client, db, image_server, image_cache):
+    """Après une sauvegarde, l'export ne fait plus ni réseau ni traitement d'image."""
+    image_server.delay = 0
+    img = lambda n: f"{image_server.base_url}/img/{n}.jpg"
+    payload = {
+        "title": "Prewarm",
+        "pax": 2,
+        "hero_photo_1": img(1),
+        "hero_photo_2": img(2),
+        "days": [
+            {"position": i, "destination": "Paris", "decorative_images": [img(10 + 2 * i), img(11 + 2 * i)], "lines": []}
+            for i in range(3)
+        ],
+    }
+    created = client.post("/quotes", json=payload).json()
+    assert wait_for_prewarm(timeout=10)
+
+    requests_before = len(image_server.requests)
+    misses_before = image_cache.stats()["derived_misses"]
+    build_docx_for_quote(db, created["id"])
+    assert len(image_server.requests) == requests_before
+    assert image_cache.stats()["derived_misses"] == misses_before
+
+    # Nouvelles images décoratives d'un jour : la nouvelle paire est préparée
+    day = created["days"][1]
+    response = client.patch(
+        f"/quotes/{created['id']}/days/{day['id']}",
+        json={"version": created["version"], "decorative_images": [img(40), img(41)]},
+    )
+    assert response.status_code == 200
+    assert wait_for_prewarm(timeout=10)
+    paths = [path for path, _ in image_server.requests[requests_before:]]
+    assert sorted(paths) == ["/img/40.jpg", "/img/41.jpg"]
+
+    misses_before = image_cache.stats()["derived_misses"]
+    build_docx_for_quote(db, created["id"])
+    assert image_cache.stats()["derived_misses"] == misses_before
@@ -2,6 +2,7 @@
 Tests pour les endpoints de quotes (devis).
 """
 import pytest
+from decimal import Decimal
 from datetime import date, timedelta
 
 
@@ -220,3 +221,377 @@ def test_create_quote_with_metadata(client):
     assert data["fx_rate"] == 1.1
     assert data["internal_note"] == "Note interne"
 
+
+
+def _quote_payload_with_lines():
+    """Payload de devis avec deux jours et trois lignes."""
+    return {
+        "title": "Quote incrémentale",
+        "pax": 2,
+        "days": [
+            {
+                "date": "2024-06-01",
+                "destination": "Paris",
+                "lines": [
+                    {"category": "Hotel", "title": "Hôtel A", "achat_usd": 100.0, "vente_usd": 10.0},
+                    {"category": "Activity", "title": "Visite", "achat_usd": 50.0},
+                ]
+            },
+            {
+                "date": "2024-06-02",
+                "destination": "Londres",
+                "lines": [
+                    {"category": "Flight", "title": "Vol", "achat_usd": 200.0},
+                ]
+            }
+        ]
+    }
+
+
+def test_update_quote_keeps_row_ids(client):
+    """Test qu'une sauvegarde réutilise les lignes existantes au lieu de les recréer."""
+    payload = _quote_payload_with_lines()
+    created = client.post("/quotes", json=payload).json()
+    day_ids = [d["id"] for d in created["days"]]
+    line_ids = [l["id"] for d in created["days"] for l in d["lines"]]
+
+    # Modifier un seul prix
+    payload["days"][0]["lines"][1]["achat_usd"] = 75.0
+    response = client.put(f"/quotes/{created['id']}", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert [d["id"] for d in data["days"]] == day_ids
+    assert [l["id"] for d in data["days"] for l in d["lines"]] == line_ids
+    assert data["days"][0]["lines"][1]["achat_usd"] == 75.0
+
+
+def test_update_quote_adds_and_removes_rows(client):
+    """Test que les jours/lignes retirés sont supprimés et les nouveaux insérés."""
+    payload = _quote_payload_with_lines()
+    created = client.post("/quotes", json=payload).json()
+    kept_line_id = created["days"][0]["lines"][0]["id"]
+
+    payload["days"] = payload["days"][:1]
+    payload["days"][0]["lines"] = [
+        payload["days"][0]["lines"][0],
+        {"category": "Activity", "title": "Croisière", "achat_usd": 30.0},
+    ]
+    response = client.put(f"/quotes/{created['id']}", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["days"]) == 1
+    lines = data["days"][0]["lines"]
+    assert [l["title"] for l in lines] == ["Hôtel A", "Croisière"]
+    assert lines[0]["id"] == kept_line_id
+
+
+def test_update_quote_matches_lines_by_id(client):
+    """Test qu'une ligne envoyée avec son id est réutilisée même si elle change de jour."""
+    payload = _quote_payload_with_lines()
+    created = client.post("/quotes", json=payload).json()
+    moved = created["days"][0]["lines"][1]
+    flight = created["days"][1]["lines"][0]
+
+    payload["days"][0]["lines"] = payload["days"][0]["lines"][:1]
+    payload["days"][1]["lines"] = [
+        {"id": moved["id"], "category": "Activity", "title": "Visite", "achat_usd": 50.0},
+        {"id": flight["id"], "category": "Flight", "title": "Vol", "achat_usd": 200.0},
+    ]
+    response = client.put(f"/quotes/{created['id']}", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["days"][0]["lines"]) == 1
+    assert [l["id"] for l in data["days"][1]["lines"]] == [moved["id"], flight["id"]]
+
+
+def test_update_quote_unchanged_writes_nothing(client, db):
+    """Test qu'une sauvegarde sans modification n'émet aucune écriture SQL."""
+    from sqlalchemy import event
+
+    payload = _quote_payload_with_lines()
+    created = client.post("/quotes", json=payload).json()
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        response = client.put(f"/quotes/{created['id']}", json=payload)
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
+
+    assert response.status_code == 200
+    assert not {"INSERT", "UPDATE", "DELETE"} & set(statements)
+
+
+def test_patch_line_returns_only_changed_line(client):
+    """Test de modification d'une seule ligne via PATCH."""
+    created = client.post("/quotes", json=_quote_payload_with_lines()).json()
+    line = created["days"][0]["lines"][1]
+
+    response = client.patch(
+        f"/quotes/{created['id']}/lines/{line['id']}",
+        json={"version": created["version"], "vente_usd": 99.5}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["version"] != created["version"]
+    assert len(data["lines"]) == 1
+    assert data["lines"][0]["id"] == line["id"]
+    assert data["lines"][0]["vente_usd"] == 99.5
+    assert data["lines"][0]["achat_usd"] == 50.0
+    assert data["days"] == []
+
+    quote = client.get(f"/quotes/{created['id']}").json()
+    assert quote["days"][0]["lines"][1]["vente_usd"] == 99.5
+    assert quote["version"] == data["version"]
+
+
+def test_patch_rejects_stale_version(client):
+    """Test qu'un PATCH avec un jeton périmé est rejeté (deux onglets ouverts)."""
+    created = client.post("/quotes", json=_quote_payload_with_lines()).json()
+    line_id = created["days"][0]["lines"][0]["id"]
+    stale = created["version"]
+
+    first = client.patch(f"/quotes/{created['id']}/lines/{line_id}", json={"version": stale, "title": "Onglet 1"})
+    assert first.status_code == 200
+
+    second = client.patch(f"/quotes/{created['id']}/lines/{line_id}", json={"version": stale, "title": "Onglet 2"})
+    assert second.status_code == 409
+
+    quote = client.get(f"/quotes/{created['id']}").json()
+    assert quote["days"][0]["lines"][0]["title"] == "Onglet 1"
+
+
+def test_patch_line_rejects_null_title(client):
+    """Test qu'un titre de ligne explicitement nul est refusé (422) au lieu d'échouer en base."""
+    created = client.post("/quotes", json=_quote_payload_with_lines()).json()
+    line_id = created["days"][0]["lines"][0]["id"]
+    response = client.patch(
+        f"/quotes/{created['id']}/lines/{line_id}",
+        json={"version": created["version"], "title": None}
+    )
+    assert response.status_code == 422
+    line = client.get(f"/quotes/{created['id']}").json()["days"][0]["lines"][0]
+    assert line["title"] == "Hôtel A"
+
+
+def test_patch_requires_version(client):
+    """Test qu'un PATCH sans jeton de version est refusé."""
+    created = client.post("/quotes", json=_quote_payload_with_lines()).json()
+    response = client.patch(f"/quotes/{created['id']}", json={"title": "Sans version"})
+    assert response.status_code == 428
+
+
+def test_patch_header_and_day_with_if_match(client):
+    """Test de PATCH de l'en-tête et d'un jour avec l'en-tête If-Match."""
+    created = client.post("/quotes", json=_quote_payload_with_lines()).json()
+
+    response = client.patch(
+        f"/quotes/{created['id']}",
+        json={"pax": 6, "title": created["title"]},
+        headers={"If-Match": f'"{created["version"]}"'}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["quote"] == {"pax": 6}
+
+    day = created["days"][1]
+    response = client.patch(
+        f"/quotes/{created['id']}/days/{day['id']}",
+        json={"version": data["version"], "destination": "Édimbourg"}
+    )
+    assert response.status_code == 200
+    days = response.json()["days"]
+    assert [d["destination"] for d in days] == ["Édimbourg"]
+    assert response.json()["lines"] == []
+
+
+def _count_statements(db, fn):
+    """Compte les requêtes SQL émises pendant l'appel de fn."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        fn()
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
+    return len(statements)
+
+
+@pytest.mark.parametrize("include_first_image", [False, True])
+def test_load_quote_query_count_is_constant(client, db, include_first_image):
+    """Test que le chargement d'un devis émet le même nombre de requêtes quel que soit le nombre de jours."""
+    from src.api.quotes import load_quote, _to_out
+
+    counts = []
+    for n_days in (2, 20):
+        payload = {
+            "title": f"Devis {n_days} jours",
+            "pax": 2,
+            "days": [
+                {
+                    "date": (date(2024, 6, 1) + timedelta(days=i)).isoformat(),
+                    "destination": "Paris",
+                    "lines": [
+                        {"category": "Activity", "title": f"Service {i}-{j}", "service_id": 1000 + j, "achat_usd": 10.0}
+                        for j in range(3)
+                    ]
+                }
+                for i in range(n_days)
+            ]
+        }
+        quote_id = client.post("/quotes", json=payload).json()["id"]
+        db.expire_all()
+
+        def _load():
+            q = load_quote(db, quote_id, include_first_image=include_first_image)
+            _to_out(q, db=db, include_first_image=include_first_image)
+
+        counts.append(_count_statements(db, _load))
+
+    assert counts[0] == counts[1]
+    assert counts[0] <= 4
+
+
+def test_fast_serializer_matches_quote_out(client, db):
+    """Test que la sérialisation directe en JSON produit le même document que QuoteOut."""
+    import json
+    from src.api.quotes import load_quote, _to_out, _to_json_bytes
+
+    payload = _quote_payload_with_lines()
+    payload["days"][0]["lines"][0].update({"achat_eur": 120.5, "achat_usd": 130.14, "raw_json": {"buff_pct": 5}})
+    quote_id = client.post("/quotes", json=payload).json()["id"]
+
+    q = load_quote(db, quote_id)
+    assert json.loads(_to_json_bytes(q)) == _to_out(q).model_dump(mode="json")
+
+    response = client.get(f"/quotes/{quote_id}")
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == _to_out(q).model_dump(mode="json")
+
+
+def test_get_quote_conditional_304(client):
+    """Test que GET /quotes/{id} renvoie un ETag et 304 tant que le devis n'a pas changé."""
+    quote_id = client.post("/quotes", json=_quote_payload_with_lines()).json()["id"]
+
+    first = client.get(f"/quotes/{quote_id}")
+    etag = first.headers["etag"]
+    assert etag == f'"{first.json()["version"]}"'
+
+    cached = client.get(f"/quotes/{quote_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    # Une modification change l'ETag : le client reçoit de nouveau le corps
+    line_id = first.json()["days"][0]["lines"][0]["id"]
+    client.patch(f"/quotes/{quote_id}/lines/{line_id}", json={"title": "Nouveau titre"}, headers={"If-Match": etag})
+    fresh = client.get(f"/quotes/{quote_id}", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+
+
+def test_list_versions_conditional_304(client):
+    """Test que la liste des versions est revalidée par ETag et change avec les versions."""
+    quote_id = client.post("/quotes", json={"title": "Versions", "pax": 2, "days": []}).json()["id"]
+
+    first = client.get(f"/quotes/{quote_id}/versions")
+    etag = first.headers["etag"]
+    assert client.get(f"/quotes/{quote_id}/versions", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/quotes/{quote_id}/versions", json={"comment": "Manuelle"})
+    again = client.get(f"/quotes/{quote_id}/versions", headers={"If-None-Match": etag})
+    assert again.status_code == 200
+    assert again.headers["etag"] != etag
+
+
+def test_list_versions_etag_covers_export_artifact(client, db):
+    """Fichier d'export d'une version remplacé (nouvel export) : la liste n'est plus 304."""
+    from src.models_quote import QuoteVersion
+
+    quote_id = client.post("/quotes", json={"title": "Versions", "pax": 2, "days": []}).json()["id"]
+    etag = client.get(f"/quotes/{quote_id}/versions").headers["etag"]
+
+    version = db.query(QuoteVersion).filter(QuoteVersion.quote_id == quote_id).one()
+    version.export_artifact = "a" * 64
+    db.commit()
+    response = client.get(f"/quotes/{quote_id}/versions", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["items"][0]["export_artifact"] == "a" * 64
+
+
+def test_totals_are_persisted_on_save(client):
+    """Test que les totaux sont calculés (Decimal) et stockés sur le devis à l'enregistrement."""
+    data = client.post("/quotes", json=_quote_payload_with_lines()).json()
+
+    # 2 pax -> 1 carte Onspot, 2 jours -> minimum 3 jours : 27 ; Hassle 2 x 150
+    assert data["onspot_total"] == 27.0
+    assert data["hassle_total"] == 300.0
+    assert data["commissionable_net"] == 377.0
+    assert data["commission_total"] == 61.34
+    assert data["sell_total"] == 310.0
+    assert data["grand_total"] == 748.34
+
+    reprice = client.post(f"/quotes/{data['id']}/reprice").json()
+    assert reprice["achats_total"] == 377.0
+    assert reprice["grand_total"] == 748.34
+
+
+def test_totals_follow_line_and_header_patches(client, db):
+    """Test que les PATCH ligne (delta) et en-tête maintiennent les totaux stockés."""
+    from src.api.quotes import load_quote
+    from src.services.quote_pricing import compute_totals, stored_totals
+
+    data = client.post("/quotes", json=_quote_payload_with_lines()).json()
+    quote_id = data["id"]
+    line_id = data["days"][0]["lines"][1]["id"]
+
+    patched = client.patch(f"/quotes/{quote_id}/lines/{line_id}", json={"achat_usd": 80.5, "version": data["version"]})
+    reprice = client.post(f"/quotes/{quote_id}/reprice").json()
+    assert reprice["achats_total"] == 407.5
+    assert reprice["grand_total"] == 783.8
+
+    client.patch(f"/quotes/{quote_id}", json={"hassle_manual": 0, "version": patched.json()["version"]})
+    db.expire_all()
+    q = load_quote(db, quote_id)
+    assert stored_totals(q) == compute_totals(q)
+    assert q.sell_total == Decimal("10.00")
+
+
+def test_reprice_batch_updates_stale_totals(client, db):
+    """Test que /quotes/reprice-batch recalcule en SQL les totaux des devis filtrés et diffuse la progression."""
+    import json
+    from sqlalchemy import update
+    from src.models_quote import Quote
+
+    ids = [client.post("/quotes", json=dict(_quote_payload_with_lines(), travel_agency=agency)).json()["id"]
+           for agency in ("Agence A", "Agence A", "Agence B")]
+
+    # Changement de politique de marge appliqué directement en base
+    db.execute(update(Quote).values(margin_pct=Decimal("0.20")))
+    db.commit()
+
+    response = client.post("/quotes/reprice-batch", json={"travel_agency": "agence a"})
+    assert response.status_code == 200
+    progress = [json.loads(line) for line in response.text.splitlines()]
+    assert progress[-1] == {"total": 2, "processed": 2, "updated": 2, "done": True}
+
+    # 377 d'achats : commission 75.40 ; Agence B reste sur l'ancien total
+    totals = {qid: client.get(f"/quotes/{qid}").json()["grand_total"] for qid in ids}
+    assert totals == {ids[0]: 762.4, ids[1]: 762.4, ids[2]: 748.34}
+
+    # Relancé sans changement : rien n'est réécrit
+    progress = [json.loads(line) for line in client.post("/quotes/reprice-batch", json={"ids": ids[:2]}).text.splitlines()]
+    assert progress[-1]["updated"] == 0
+
+    assert client.post("/quotes/reprice-batch", json={"updated_since": "hier"}).status_code == 400
@@ -0,0 +1,26 @@
+"""
+Tests pour les endpoints du catalogue de services.
+"""
+from src.models.prod_models import ServiceCatalog
+
+
+def test_get_service_conditional_304(client, db):
+    """Test que le détail d'un service est revalidé par ETag (hash du contenu)."""
+    svc = ServiceCatalog(name="Louvre", company="Paris Tours", start_destination="Paris", category="Tickets")
+    db.add(svc)
+    db.commit()
+
+    first = client.get(f"/services/{svc.id}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.get(f"/services/{svc.id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    svc.brief_description = "Billets coupe-file"
+    db.commit()
+    fresh = client.get(f"/services/{svc.id}", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+    assert fresh.json()["brief_description"] == "Billets coupe-file"
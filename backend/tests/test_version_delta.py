@@ -0,0 +1,146 @@
+"""
+Tests du stockage des versions : images clés + deltas (services/version_delta.py),
+compressés (models/types.py).
+"""
+import json
+
+import pytest
+from sqlalchemy import event, text
+
+from src.config import VERSION_KEYFRAME_INTERVAL
+from src.models.types import decode_snapshot, encode_snapshot
+from src.models_quote import QuoteVersion
+from src.services.quote_versioning import build_quote_snapshot, load_version_snapshot
+from src.services.version_delta import apply_snapshot_delta, snapshot_delta
+
+
+def _line(line_id, title, price=10.0):
+    return {"id": line_id, "title": title, "achat_usd": price}
+
+
+def test_snapshot_delta_round_trip():
+    """Champs modifiés/supprimés, jours réordonnés, lignes ajoutées/modifiées/supprimées."""
+    base = {
+        "title": "Base", "pax": 2, "notes": "x",
+        "days": [
+            {"id": 1, "destination": "Paris", "lines": [_line(10, "A"), _line(11, "B")]},
+            {"id": 2, "destination": "Rome", "lines": [_line(20, "C")]},
+            {"id": 3, "destination": "Nice", "lines": []},
+        ],
+    }
+    new = {
+        "title": "Base", "pax": 4,
+        "days": [
+            {"id": 2, "destination": "Rome", "lines": [_line(20, "C")]},
+            {"id": 1, "destination": "Lyon", "lines": [_line(11, "B", 12.5), _line(12, "D")]},
+            {"id": 4, "destination": "Nîmes", "lines": [_line(40, "E")]},
+        ],
+    }
+    delta = snapshot_delta(base, new)
+    assert delta["set"] == {"pax": 4} and delta["unset"] == ["notes"]
+    assert delta["days"][0] == 2  # jour inchangé : son id seulement
+    assert apply_snapshot_delta(base, delta) == new
+    assert base["days"][0]["destination"] == "Paris"  # base intacte
+
+    assert snapshot_delta(new, new) == {}
+    # Ids manquants ou répétés : pas de delta, la version sera une image clé
+    assert snapshot_delta(base, {"days": [{"destination": "Sans id"}]}) is None
+    assert snapshot_delta(base, {"days": [{"id": 1}, {"id": 1}]}) is None
+
+
+def _create_quote(client):
+    payload = {
+        "title": "Versions",
+        "pax": 2,
+        "days": [
+            {"date": "2024-06-01", "destination": "Paris",
+             "lines": [{"category": "Activity", "title": f"Visite {i}", "achat_usd": 50.0} for i in range(20)]},
+            {"date": "2024-06-02", "destination": "Londres",
+             "lines": [{"category": "Flight", "title": "Vol", "achat_usd": 200.0}]},
+        ],
+    }
+    return client.post("/quotes", json=payload).json()
+
+
+def _edit_and_version(client, quote, i):
+    """Une ligne modifiée, puis une version manuelle ; renvoie le devis à jour."""
+    quote["days"][0]["lines"][i % 20]["title"] = f"Visite modifiée {i}"
+    quote["pax"] = 2 + i % 3
+    quote = client.put(f"/quotes/{quote['id']}", json=quote).json()
+    response = client.post(f"/quotes/{quote['id']}/versions", json={"comment": f"Étape {i}"})
+    assert response.status_code == 200
+    return quote
+
+
+def test_versions_are_keyframes_and_bounded_deltas(client, db):
+    """Chaîne de deltas bornée, snapshots reconstruits identiques, stockage réduit."""
+    quote = _create_quote(client)
+    expected = {}
+    for i in range(2 * VERSION_KEYFRAME_INTERVAL + 3):
+        quote = _edit_and_version(client, quote, i)
+        version = db.query(QuoteVersion).order_by(QuoteVersion.id.desc()).first()
+        expected[version.id] = json.loads(json.dumps(build_quote_snapshot(version.quote, db=db)))
+
+    versions = db.query(QuoteVersion).filter(QuoteVersion.id.in_(expected)).all()
+    assert max(v.delta_depth for v in versions) == VERSION_KEYFRAME_INTERVAL - 1
+    assert sum(v.snapshot_json is not None for v in versions) <= 3
+    for v in versions:
+        assert load_version_snapshot(db, v) == expected[v.id]
+        detail = client.get(f"/quotes/{quote['id']}/versions/{v.id}").json()
+        assert detail["snapshot_json"] == expected[v.id]
+
+    stored = sum(len(json.dumps(v.snapshot_json if v.snapshot_json is not None else v.snapshot_delta))
+                 for v in versions)
+    full = sum(len(json.dumps(s)) for s in expected.values())
+    assert stored * 3 < full, f"{stored} octets stockés pour {full} en snapshots complets"
+
+
+def test_restore_delta_version(client, db):
+    """Restaurer une version stockée en delta rend le devis de l'époque."""
+    quote = _create_quote(client)
+    for i in range(3):
+        quote = _edit_and_version(client, quote, i)
+    versions = client.get(f"/quotes/{quote['id']}/versions").json()["items"]
+    target = next(v for v in versions if v["comment"] == "Étape 1")
+    assert db.get(QuoteVersion, target["id"]).snapshot_json is None
+
+    restored = client.post(f"/quotes/{quote['id']}/versions/{target['id']}/restore")
+    assert restored.status_code == 200
+    lines = restored.json()["days"][0]["lines"]
+    assert [l["title"] for l in lines[:3]] == ["Visite modifiée 0", "Visite modifiée 1", "Visite 2"]
+    assert restored.json()["pax"] == 3
+
+
+def test_snapshot_codec_round_trip():
+    """Compression sans perte, plus petite que le JSON ; format inconnu refusé."""
+    snapshot = {"id": 1, "title": "Été à Lisbonne", "pax": 2, "fx_rate": 1.08, "days": [
+        {"id": 1, "destination": "Lisbon", "lines": [_line(i, f"Visite {i}") for i in range(10)]},
+    ]}
+    data = encode_snapshot(snapshot)
+    assert decode_snapshot(data) == snapshot
+    assert len(data) < len(json.dumps(snapshot)) / 3
+    with pytest.raises(ValueError):
+        decode_snapshot(b"\x00" + data[1:])
+
+
+def test_list_versions_does_not_read_snapshots(client, db):
+    """Snapshots stockés compressés ; la liste des versions ne lit jamais ces colonnes."""
+    quote = _create_quote(client)
+    for i in range(3):
+        quote = _edit_and_version(client, quote, i)
+    blob = db.execute(text("SELECT snapshot_json FROM quote_versions ORDER BY id LIMIT 1")).scalar()
+    assert isinstance(blob, bytes) and not blob.startswith(b"{")
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.expunge_all()
+    event.listen(db.get_bind(), "before_cursor_execute", _record)
+    try:
+        response = client.get(f"/quotes/{quote['id']}/versions")
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", _record)
+    assert response.status_code == 200 and len(response.json()["items"]) == 4
+    assert statements and not any("snapshot_json" in s or "snapshot_delta" in s for s in statements)
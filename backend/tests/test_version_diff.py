@@ -0,0 +1,128 @@
+"""
+Tests du diff entre versions (/quotes/{id}/versions/{a}/diff/{b} et /diff/current).
+"""
+import json
+
+from src.services.version_diff import diff_snapshots
+
+
+def _line(line_id, position, title, **fields):
+    return {"id": line_id, "position": position, "title": title, "category": "Activity", **fields}
+
+
+def _snapshot(lines, grand_total=100.0, **fields):
+    return {
+        "title": "Diff", "pax": 2, "grand_total": grand_total, **fields,
+        "days": [
+            {"id": 1, "position": 0, "date": "2024-06-01", "destination": "Paris", "lines": lines},
+            {"id": 2, "position": 1, "date": "2024-06-02", "destination": "Rome", "lines": []},
+        ],
+    }
+
+
+def test_diff_snapshots_lists_changes_only():
+    """Champs, lignes ajoutées/supprimées/modifiées, raw_json clé par clé, écart du grand total."""
+    old = _snapshot([
+        _line(10, 0, "A", vente_usd=10.0, raw_json={"description": "x", "start_time": "09:00"}),
+        _line(11, 1, "B"),
+        _line(12, 2, "C"),
+    ])
+    new = _snapshot([
+        _line(13, 0, "New"),  # insertion en tête : les positions des autres changent
+        _line(10, 1, "A", vente_usd=12.5, raw_json={"description": "y", "start_time": "09:00"}),
+        _line(11, 2, "B"),
+    ], grand_total=112.5, pax=3)
+
+    diff = diff_snapshots(old, new)
+    assert diff["changed"] is True
+    assert diff["grand_total"] == {"old": 100.0, "new": 112.5, "delta": 12.5}
+    assert diff["fields"] == {"pax": {"old": 2, "new": 3}, "grand_total": {"old": 100.0, "new": 112.5}}
+    assert [d["id"] for d in diff["days"]] == [1]  # jour 2 inchangé : absent
+    day = diff["days"][0]
+    assert day["lines_reordered"] is False
+    assert [(l["id"], l["status"]) for l in day["lines"]] == [(13, "added"), (10, "changed"), (12, "removed")]
+    assert day["lines"][0]["line"]["title"] == "New"
+    assert day["lines"][1]["fields"] == {
+        "vente_usd": {"old": 10.0, "new": 12.5},
+        "raw_json.description": {"old": "x", "new": "y"},
+    }
+    assert day["lines"][2] == {"id": 12, "title": "C", "category": "Activity", "status": "removed"}
+
+    assert diff_snapshots(old, old) == {
+        "changed": False, "grand_total": {"old": 100.0, "new": 100.0, "delta": 0.0},
+        "fields": {}, "days_reordered": False, "days": [],
+    }
+    swapped = _snapshot([_line(11, 0, "B"), _line(10, 1, "A", vente_usd=10.0,
+                                                   raw_json={"description": "x", "start_time": "09:00"}),
+                         _line(12, 2, "C")])
+    day = diff_snapshots(old, swapped)["days"][0]
+    assert day["lines_reordered"] is True and day["lines"] == []
+
+
+def _create_quote(client, n_lines=40):
+    payload = {
+        "title": "Diff",
+        "pax": 2,
+        "days": [
+            {"date": "2024-06-01", "destination": "Paris",
+             "lines": [{"category": "Activity", "title": f"Visite {i}", "achat_usd": 50.0, "vente_usd": 5.0}
+                       for i in range(n_lines)]},
+        ],
+    }
+    return client.post("/quotes", json=payload).json()
+
+
+def _save_version(client, quote_id, comment):
+    response = client.post(f"/quotes/{quote_id}/versions", json={"comment": comment})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_diff_between_versions(client, diff_cache):
+    """Une ligne modifiée : le diff ne porte que sur elle, avec l'écart de prix ; mis en cache."""
+    quote = _create_quote(client)
+    before = _save_version(client, quote["id"], "Avant")
+    quote["days"][0]["lines"][3]["vente_usd"] = 25.0
+    quote = client.put(f"/quotes/{quote['id']}", json=quote).json()
+    after = _save_version(client, quote["id"], "Après")
+
+    url = f"/quotes/{quote['id']}/versions/{before}/diff/{after}"
+    response = client.get(url)
+    assert response.status_code == 200
+    diff = response.json()
+    assert diff["from_version_id"] == before and diff["to_version_id"] == after
+    assert diff["changed"] is True
+    assert diff["grand_total"]["delta"] > 0
+    [day] = diff["days"]
+    [line] = day["lines"]
+    assert line["title"] == "Visite 3" and line["fields"]["vente_usd"] == {"old": 5.0, "new": 25.0}
+    # Proportionnel au changement, pas au devis
+    detail = client.get(f"/quotes/{quote['id']}/versions/{after}").json()
+    assert len(response.content) * 5 < len(json.dumps(detail["snapshot_json"]))
+
+    assert client.get(url).json() == diff
+    assert diff_cache.stats()["hits"] == 1
+
+    back = client.get(f"/quotes/{quote['id']}/versions/{after}/diff/{before}").json()
+    assert back["grand_total"]["delta"] == -diff["grand_total"]["delta"]
+
+
+def test_diff_with_current_quote(client):
+    """Diff vers l'état courant : vide juste après la version, puis la ligne ajoutée ; 404 sinon."""
+    quote = _create_quote(client, n_lines=3)
+    version = _save_version(client, quote["id"], "Base")
+    url = f"/quotes/{quote['id']}/versions/{version}/diff/current"
+
+    diff = client.get(url).json()
+    assert diff["changed"] is False and diff["to_version_id"] is None and diff["days"] == []
+
+    quote["days"][0]["lines"].append({"category": "Hotel", "title": "Hôtel", "achat_usd": 300.0})
+    client.put(f"/quotes/{quote['id']}", json=quote)
+    diff = client.get(url).json()
+    [day] = diff["days"]
+    assert [(l["status"], l["title"]) for l in day["lines"]] == [("added", "Hôtel")]
+    assert day["lines"][0]["line"]["achat_usd"] == 300.0
+
+    assert client.get(f"/quotes/{quote['id']}/versions/9999/diff/current").status_code == 404
+    assert client.get(f"/quotes/{quote['id']}/versions/{version}/diff/9999").status_code == 404
+    assert client.get(f"/quotes/9999/versions/{version}/diff/{version}").status_code == 404
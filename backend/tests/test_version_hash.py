@@ -0,0 +1,95 @@
+"""
+Tests du hash de contenu des versions : déduplication des versions auto et
+"le devis a-t-il changé depuis la version X".
+"""
+from datetime import timedelta
+
+from src.models_quote import QuoteVersion
+from src.services.quote_versioning import snapshot_hash
+
+
+def _create_quote(client):
+    payload = {
+        "title": "Hash",
+        "pax": 2,
+        "days": [{"position": 0, "destination": "Rome", "lines": [{"title": "Colosseum", "category": "Activity"}]}],
+    }
+    response = client.post("/quotes", json=payload)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _versions(client, quote_id):
+    return client.get(f"/quotes/{quote_id}/versions").json()["items"]
+
+
+def _patch_title(client, quote_id, title):
+    quote = client.get(f"/quotes/{quote_id}").json()
+    response = client.patch(f"/quotes/{quote_id}", json={"version": quote["version"], "title": title})
+    assert response.status_code == 200
+
+
+def test_snapshot_hash_is_canonical():
+    """Ordre des clés et jeton de concurrence sans effet ; tout changement de contenu compte."""
+    snapshot = {"title": "A", "pax": 2, "days": [{"id": 1, "lines": []}]}
+    h = snapshot_hash(snapshot)
+    assert snapshot_hash({"days": [{"lines": [], "id": 1}], "pax": 2, "title": "A", "version": "x"}) == h
+    assert snapshot_hash({**snapshot, "pax": 3}) != h
+    assert snapshot_hash({**snapshot, "days": [{"id": 1, "lines": [{"id": 2}]}]}) != h
+
+
+def _age_versions(db, hours=2):
+    """Versions plus anciennes que la fenêtre de limitation des versions auto (1 h)."""
+    for version in db.query(QuoteVersion):
+        version.created_at = version.created_at - timedelta(hours=hours)
+    db.commit()
+
+
+def test_unchanged_export_keeps_its_file(client, db):
+    """Devis inchangé : l'export crée quand même sa version (fichier téléchargeable), puis la réutilise."""
+    quote_id = _create_quote(client)["id"]
+    export = client.get(f"/quotes/{quote_id}/export/word")
+    assert export.status_code == 200
+    versions = _versions(client, quote_id)
+    assert [v["export_type"] for v in versions] == ["word", None]
+    url = f"/quotes/{quote_id}/versions/{versions[0]['id']}/export"
+    download = client.get(url)
+    assert download.status_code == 200 and download.content == export.content
+
+    # Même export, même contenu : la version Word est réutilisée et pointe vers le nouveau fichier
+    _age_versions(db)
+    again = client.get(f"/quotes/{quote_id}/export/word")
+    assert [v["id"] for v in _versions(client, quote_id)] == [v["id"] for v in versions]
+    assert client.get(url).content == again.content
+
+    assert client.get(f"/quotes/{quote_id}/export/excel", params={"create_version": True}).status_code == 200
+    assert [v["export_type"] for v in _versions(client, quote_id)] == ["excel", "word", None]
+
+
+def test_restore_does_not_duplicate_saved_state(client):
+    """État courant déjà enregistré : la restauration ne crée pas de version "avant restauration"."""
+    quote_id = _create_quote(client)["id"]
+    initial = _versions(client, quote_id)[0]
+    _patch_title(client, quote_id, "Hash 2")
+    assert client.post(f"/quotes/{quote_id}/versions", json={"comment": "Saved"}).status_code == 200
+
+    restored = client.post(f"/quotes/{quote_id}/versions/{initial['id']}/restore")
+    assert restored.status_code == 200 and restored.json()["title"] == "Hash"
+    assert [v["comment"] for v in _versions(client, quote_id)] == ["Saved", initial["comment"]]
+
+
+def test_changed_since_version(client):
+    """Faux tant que le contenu est celui de la version, vrai après une modification ; 404 sinon."""
+    quote_id = _create_quote(client)["id"]
+    version = _versions(client, quote_id)[0]
+    url = f"/quotes/{quote_id}/versions/{version['id']}/changed"
+
+    first = client.get(url).json()
+    assert first["changed"] is False and first["current_hash"] == first["version_hash"]
+
+    _patch_title(client, quote_id, "Hash 2")
+    second = client.get(url).json()
+    assert second["changed"] is True and second["version_hash"] == first["version_hash"]
+
+    assert client.get(f"/quotes/{quote_id}/versions/9999/changed").status_code == 404
+    assert client.get(f"/quotes/9999/versions/{version['id']}/changed").status_code == 404
@@ -0,0 +1,117 @@
+"""
+Tests de l'attribution des libellés de version (compteur par devis, unicité quote_id + libellé).
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.db import Base
+from src.models_quote import QuoteVersion
+
+
+def _create_quote(client):
+    payload = {
+        "title": "Labels",
+        "pax": 2,
+        "days": [{"position": 0, "destination": "Rome", "lines": [{"title": "Colosseum", "category": "Activity"}]}],
+    }
+    response = client.post("/quotes", json=payload)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+def file_db(tmp_path, monkeypatch):
+    """Application sur une base fichier, une connexion par requête (accès réellement concurrents)."""
+    from main import app
+    from src import db as db_module, models
+    from src.db import get_db
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'labels.db'}",
+                           connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    monkeypatch.setattr(models.db, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(db_module, "SessionLocal", SessionLocal)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            yield client, SessionLocal
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+def _run_parallel(calls):
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        responses = list(pool.map(lambda call: call(), calls))
+    assert [r.status_code for r in responses] == [200] * len(calls)
+
+
+def _labels(SessionLocal, quote_id):
+    db = SessionLocal()
+    try:
+        return [(v.label, v.export_type)
+                for v in db.query(QuoteVersion).filter(QuoteVersion.quote_id == quote_id)]
+    finally:
+        db.close()
+
+
+def test_parallel_exports_and_versions_get_distinct_labels(file_db):
+    """Exports et versions manuelles simultanés (base sur fichier, connexions séparées) : libellés distincts."""
+    client, SessionLocal = file_db
+    quote = _create_quote(client)
+    quote_id = quote["id"]
+    # Devis modifié depuis la version initiale : chaque export veut créer sa version
+    client.patch(f"/quotes/{quote_id}", json={"version": quote["version"], "pax": 3})
+
+    calls = [lambda: client.get(f"/quotes/{quote_id}/export/word") for _ in range(4)]
+    calls += [lambda: client.get(f"/quotes/{quote_id}/export/excel", params={"create_version": True})
+              for _ in range(4)]
+    calls += [lambda i=i: client.post(f"/quotes/{quote_id}/versions", json={"comment": f"Parallel {i}"})
+              for i in range(8)]
+    _run_parallel(calls)
+
+    labels = [label for label, _ in _labels(SessionLocal, quote_id)]
+    numbers = sorted(int(re.fullmatch(r"v(\d+)", label).group(1)) for label in labels)
+    assert len(labels) >= 9  # initiale + 8 manuelles (+ exports non dédupliqués)
+    assert numbers == list(range(1, len(labels) + 1))
+
+
+def test_parallel_identical_exports_create_one_version(file_db):
+    """Exports Word simultanés d'un même contenu : une seule version Word (vérification sous verrou)."""
+    client, SessionLocal = file_db
+    quote_id = _create_quote(client)["id"]
+    _run_parallel([lambda: client.get(f"/quotes/{quote_id}/export/word") for _ in range(6)])
+    assert sorted(_labels(SessionLocal, quote_id)) == [("v1", None), ("v2", "word")]
+
+
+def test_labels_are_never_reused(client):
+    """Version archivée ou renommée : le compteur continue ; un libellé déjà pris est refusé (409)."""
+    quote = _create_quote(client)
+    quote_id = quote["id"]
+    base = f"/quotes/{quote_id}/versions"
+    first = client.post(base, json={"comment": "A"}).json()
+    assert first["label"] == "v2"
+    assert client.post(f"{base}/{first['id']}/archive").status_code == 200
+    assert client.post(base, json={"comment": "B"}).json()["label"] == "v3"
+
+    renamed = client.post(base, json={"comment": "C"}).json()
+    assert client.patch(f"{base}/{renamed['id']}", json={"label": "v5"}).status_code == 200
+    assert client.post(base, json={"comment": "D"}).json()["label"] == "v6"  # v5 pris : sauté
+    assert client.patch(f"{base}/{renamed['id']}", json={"label": "v3"}).status_code == 409
+
+    # Créer une version ne modifie pas le devis (jeton de concurrence inchangé)
+    assert client.get(f"/quotes/{quote_id}").json()["version"] == quote["version"]
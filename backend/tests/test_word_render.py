@@ -0,0 +1,40 @@
+"""
+Tests du rendu des services dans l'export Word (paragraphes suivis sans doc.paragraphs).
+"""
+from docx import Document
+
+from src.exports.word import append_sanitized_html_to_docx
+from src.exports.word.exporter import _render_service
+
+
+def test_sanitized_html_returns_written_paragraphs():
+    """Tous les paragraphes écrits sont renvoyés, dans l'ordre du document."""
+    doc = Document()
+    doc.add_paragraph("avant")
+    p = doc.add_paragraph()
+    written = append_sanitized_html_to_docx(p, "<ul><li>un</li><li>deux</li></ul><p>a</p><p>b</p>")
+
+    assert written[0] is p
+    assert [w._p for w in written] == [x._p for x in doc.paragraphs[1:]]
+    assert [w.text for w in written] == ["a", "• un", "• deux", "b"]
+
+
+def test_render_service_keeps_title_with_description():
+    """Titre et premier paragraphe de description restent liés ; la suite peut changer de page."""
+    doc = Document()
+    line = {
+        "category": "Hotel",
+        "title": "Grand Hotel",
+        "raw_json": {"hotel_url": "https://hotel.example", "description": "<p>Un</p><p>Deux</p><p>Trois</p>"},
+    }
+    _render_service(doc, line, usable_width_cm=16)
+
+    paras = doc.paragraphs
+    texts = [p.text for p in paras]
+    assert texts[0].startswith("Grand Hotel")
+    assert texts[1:5] == ["Un", "Deux", "Trois", "https://hotel.example"]
+    keep = [p.paragraph_format.keep_with_next for p in paras[:5]]
+    assert keep == [True, True, False, False, True]
+    assert all(p.paragraph_format.keep_together for p in paras[:5])
+    # La ligne vide de séparation n'est pas liée au service suivant
+    assert paras[5].text == "" and paras[5].paragraph_format.keep_with_next is None
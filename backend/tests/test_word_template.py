@@ -0,0 +1,74 @@
+"""
+Tests du cache du template Word (analysé une fois, rechargé si le fichier change).
+"""
+import os
+import shutil
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Pt
+
+from src.exports.word import WORD_TEMPLATE_PATH
+from src.exports.word import template_cache
+from src.exports.word.template_cache import get_word_template
+
+
+def _quote(client):
+    response = client.post("/quotes", json={"title": "Template", "pax": 2, "days": []})
+    assert response.status_code in (200, 201)
+    return response.json()["id"]
+
+
+def test_template_parsed_once_across_exports(client, monkeypatch):
+    """Deux exports n'analysent pas le template : le fragment T&C est copié tel quel."""
+    quote_id = _quote(client)
+    get_word_template()
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("template analysé à nouveau")
+
+    monkeypatch.setattr(template_cache, "WordTemplate", no_parse)
+    docs = []
+    for _ in range(2):
+        response = client.get(f"/quotes/{quote_id}/export/word")
+        assert response.status_code == 200
+        docs.append(Document(BytesIO(response.content)))
+
+    for doc in docs:
+        texts = [p.text.strip().lower() for p in doc.paragraphs]
+        idx = texts.index("essential travel terms and conditions")
+        terms = doc.paragraphs[idx:]
+        assert len(terms) == len(get_word_template().terms_fragment)
+        assert all(r.font.size == Pt(8) for p in terms for r in p.runs)
+    # Le fragment partagé n'a pas été déplacé dans les documents exportés
+    assert all(p.getparent() is not None for p in get_word_template().terms_fragment)
+
+
+def test_template_reloaded_when_file_changes(tmp_path):
+    """Un nouveau mtime (template remplacé) provoque une nouvelle analyse."""
+    path = tmp_path / "template.docx"
+    shutil.copy(WORD_TEMPLATE_PATH, path)
+    first = get_word_template(path)
+    assert get_word_template(path) is first
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = get_word_template(path)
+    assert second is not first
+    assert second.section == first.section
+
+
+def test_template_without_terms_is_used_as_is(tmp_path):
+    """Sans titre T&C, l'export part d'une copie du template lui-même."""
+    path = tmp_path / "plain.docx"
+    doc = Document()
+    doc.add_paragraph("En-tête maison")
+    doc.save(path)
+
+    template = get_word_template(path)
+    assert not template.has_terms
+    out = template.new_document()
+    out.add_paragraph("contenu")
+    assert [p.text for p in out.paragraphs] == ["En-tête maison", "contenu"]
+    # Chaque export a sa propre copie
+    assert [p.text for p in template.new_document().paragraphs] == ["En-tête maison"]
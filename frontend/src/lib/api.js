@@ -112,6 +112,19 @@ export const api = {
     return apiCall("PATCH", `/quotes/${quoteId}/days`, payload);
   },
 
+  // Field-targeted edits: `version` is the token from the last quote/patch response
+  async patchQuoteHeader(quoteId, version, fields) {
+    return apiCall("PATCH", `/quotes/${quoteId}`, { ...fields, version });
+  },
+
+  async patchQuoteDay(quoteId, dayId, version, fields) {
+    return apiCall("PATCH", `/quotes/${quoteId}/days/${dayId}`, { ...fields, version });
+  },
+
+  async patchQuoteLine(quoteId, lineId, version, fields) {
+    return apiCall("PATCH", `/quotes/${quoteId}/lines/${lineId}`, { ...fields, version });
+  },
+
   async repriceQuote(quoteId) {
     return apiCall("POST", `/quotes/${quoteId}/reprice`);
   },
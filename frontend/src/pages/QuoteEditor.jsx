@@ -1999,6 +1999,8 @@ export default function QuoteEditor(){
         }
         
         return {
+          // Persisted rows keep their id so the backend updates them in place
+          id: Number.isInteger(d.id) ? d.id : undefined,
           position: idx,
           date: d.date,
           destination: d.destination,
@@ -2015,6 +2017,7 @@ export default function QuoteEditor(){
               : { ...rawJson, fx: (l.fx_rate ?? fxEuroToUsd ?? DEFAULT_FX) };  // For existing lines, add fx
             
             return {
+              id: Number.isInteger(l.id) ? l.id : undefined,
               position: liIdx,
               service_id: l.service_id,
               category: l.category,